@@ -1,4 +1,5 @@
 import { createClient } from '@/lib/supabase-server';
+import { getCreditBalance } from '@/lib/credit-manager';
 import { NextRequest, NextResponse } from 'next/server';
 
 export const runtime = 'nodejs';
@@ -7,7 +8,7 @@ export const dynamic = 'force-dynamic';
 /**
  * Send task to VPS for execution
  */
-async function sendTaskToVPS(task: any) {
+async function sendTaskToVPS(task: any, plan: string | null) {
   const vpsApiUrl = process.env.VPS_API_URL;
   const vpsApiSecret = process.env.VPS_API_SECRET;
 
@@ -29,6 +30,7 @@ async function sendTaskToVPS(task: any) {
       priority: task.priority,
       user_id: task.user_id,
       project_id: task.project_id,
+      plan, // Subscription tier: fair-share weight on the VPS queue
     }),
   });
 
@@ -166,7 +168,8 @@ export async function POST(request: NextRequest) {
     const vpsEnabled = process.env.VPS_ENABLED === 'true';
     if (vpsEnabled) {
       try {
-        await sendTaskToVPS(task);
+        const balance = await getCreditBalance(user.id);
+        await sendTaskToVPS(task, balance?.subscription_tier || null);
       } catch (vpsError) {
         console.error('VPS execution error:', vpsError);
         // Task is still created in DB, mark as failed
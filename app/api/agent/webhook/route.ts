@@ -1,9 +1,71 @@
 import { createClient } from '@/lib/supabase/service-role';
 import { NextRequest, NextResponse } from 'next/server';
+import { createHash } from 'crypto';
+import { gunzipSync } from 'zlib';
 
 export const runtime = 'nodejs';
 export const dynamic = 'force-dynamic';
 
+// Private bucket holding result file chunks uploaded via /api/agent/webhook/upload
+const AGENT_RESULTS_BUCKET = 'agent-results';
+
+interface UploadedFile {
+  filename: string;
+  upload_id: string;
+  chunks: number;
+  size: number;
+  gzip_size: number;
+  sha256: string;
+}
+
+/**
+ * A manifest whose chunks cannot be assembled. Missing chunks may still be
+ * on their way (409, the VPS retries); a checksum mismatch is permanent (422)
+ */
+class ChunkAssemblyError extends Error {
+  constructor(message: string, public status: number) {
+    super(message);
+  }
+}
+
+/**
+ * Download the chunks of each uploaded result file, verify them and
+ * put the contents back into result_data.result_data
+ */
+async function assembleUploadedFiles(
+  supabase: ReturnType<typeof createClient>,
+  taskId: string,
+  resultData: any
+) {
+  const uploaded: UploadedFile[] = resultData.uploaded_files || [];
+  const files: Record<string, string> = { ...(resultData.result_data || {}) };
+  const chunkPaths: string[] = [];
+
+  for (const file of uploaded) {
+    const prefix = `${taskId}/${file.upload_id}/${createHash('sha256').update(file.filename).digest('hex')}`;
+    const parts: Buffer[] = [];
+
+    for (let index = 0; index < file.chunks; index++) {
+      const path = `${prefix}/${index}`;
+      const { data, error } = await supabase.storage.from(AGENT_RESULTS_BUCKET).download(path);
+      if (error || !data) {
+        throw new ChunkAssemblyError(`Missing chunk ${index} of ${file.filename}`, 409);
+      }
+      parts.push(Buffer.from(await data.arrayBuffer()));
+      chunkPaths.push(path);
+    }
+
+    const compressed = Buffer.concat(parts);
+    if (createHash('sha256').update(compressed).digest('hex') !== file.sha256) {
+      throw new ChunkAssemblyError(`Checksum mismatch for ${file.filename}`, 422);
+    }
+    files[file.filename] = gunzipSync(compressed).toString('utf-8');
+  }
+
+  const { uploaded_files, ...rest } = resultData;
+  return { resultData: { ...rest, result_data: files }, chunkPaths };
+}
+
 /**
  * POST /api/agent/webhook
  * Receive updates from VPS (task status, results, screenshots, etc.)
@@ -20,11 +82,19 @@ export async function POST(request: NextRequest) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
     }
 
-    const body = await request.json();
+    // Large bodies are sent gzip-encoded
+    const raw = Buffer.from(await request.arrayBuffer());
+    const text = request.headers.get('content-encoding') === 'gzip'
+      ? gunzipSync(raw).toString('utf-8')
+      : raw.toString('utf-8');
+
+    const body = JSON.parse(text);
+    let {
+      result_data,
+    } = body;
     const {
       task_id,
       status,
-      result_data,
       result_files,
       error_message,
       session_data,
@@ -49,6 +119,22 @@ export async function POST(request: NextRequest) {
       return NextResponse.json({ error: 'Task not found' }, { status: 404 });
     }
 
+    // Chunked results: file contents were uploaded separately before this manifest
+    let chunkPaths: string[] = [];
+    if (result_data?.uploaded_files?.length) {
+      try {
+        ({ resultData: result_data, chunkPaths } = await assembleUploadedFiles(
+          supabase,
+          task_id,
+          result_data
+        ));
+      } catch (error: any) {
+        console.error('Error assembling uploaded result files:', error);
+        const status = error instanceof ChunkAssemblyError ? error.status : 422;
+        return NextResponse.json({ error: error.message }, { status });
+      }
+    }
+
     // Update task
     const updates: any = {};
 
@@ -94,6 +180,10 @@ export async function POST(request: NextRequest) {
       return NextResponse.json({ error: updateError.message }, { status: 500 });
     }
 
+    if (chunkPaths.length) {
+      await supabase.storage.from(AGENT_RESULTS_BUCKET).remove(chunkPaths);
+    }
+
     // Update or create session
     if (session_data || screenshots || activity_log) {
       // Check if session exists
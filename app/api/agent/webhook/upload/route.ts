@@ -0,0 +1,79 @@
+import { createClient } from '@/lib/supabase/service-role';
+import { NextRequest, NextResponse } from 'next/server';
+import { createHash } from 'crypto';
+
+export const runtime = 'nodejs';
+export const dynamic = 'force-dynamic';
+
+const AGENT_RESULTS_BUCKET = 'agent-results';
+
+/**
+ * POST /api/agent/webhook/upload
+ * Receive one gzip chunk of a large task result file from the VPS
+ *
+ * Chunks are stored under {task_id}/{upload_id}/{sha256(filename)}/{index}
+ * with upsert, so a retried chunk simply overwrites the earlier copy.
+ * The result webhook sent afterwards lists the files and assembles them.
+ */
+export async function POST(request: NextRequest) {
+  try {
+    // Verify webhook secret
+    const authHeader = request.headers.get('authorization');
+    const webhookSecret = process.env.AGENT_WEBHOOK_SECRET || 'your-secret-key';
+
+    if (authHeader !== `Bearer ${webhookSecret}`) {
+      return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+    }
+
+    const taskId = request.headers.get('x-task-id') || '';
+    const uploadId = request.headers.get('x-upload-id') || '';
+    const fileName = decodeURIComponent(request.headers.get('x-file-name') || '');
+    const chunkIndex = Number(request.headers.get('x-chunk-index'));
+    const chunkCount = Number(request.headers.get('x-chunk-count'));
+
+    if (
+      !/^[\w-]+$/.test(taskId) ||
+      !/^[a-f0-9]{32}$/.test(uploadId) ||
+      !fileName ||
+      !Number.isInteger(chunkIndex) ||
+      !Number.isInteger(chunkCount) ||
+      chunkIndex < 0 ||
+      chunkIndex >= chunkCount
+    ) {
+      return NextResponse.json({ error: 'Invalid chunk headers' }, { status: 400 });
+    }
+
+    const supabase = createClient();
+
+    const { data: task } = await supabase
+      .from('agent_tasks')
+      .select('id')
+      .eq('id', taskId)
+      .single();
+
+    if (!task) {
+      return NextResponse.json({ error: 'Task not found' }, { status: 404 });
+    }
+
+    const buffer = Buffer.from(await request.arrayBuffer());
+    const fileKey = createHash('sha256').update(fileName).digest('hex');
+    const path = `${taskId}/${uploadId}/${fileKey}/${chunkIndex}`;
+
+    const { error: uploadError } = await supabase.storage
+      .from(AGENT_RESULTS_BUCKET)
+      .upload(path, buffer, {
+        contentType: 'application/gzip',
+        upsert: true,
+      });
+
+    if (uploadError) {
+      console.error('Error storing result chunk:', uploadError);
+      return NextResponse.json({ error: uploadError.message }, { status: 500 });
+    }
+
+    return NextResponse.json({ success: true, chunk: chunkIndex, chunks: chunkCount });
+  } catch (error: any) {
+    console.error('Error in POST /api/agent/webhook/upload:', error);
+    return NextResponse.json({ error: error.message }, { status: 500 });
+  }
+}
@@ -0,0 +1,7 @@
+-- AI Agent Result Uploads
+-- Private bucket for large task result files, uploaded by the VPS agent in gzip chunks
+-- Only the service role (webhook routes) reads and writes it, so no RLS policies are added
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('agent-results', 'agent-results', false)
+ON CONFLICT (id) DO NOTHING;
@@ -4,20 +4,41 @@ Receives tasks from WritGo.nl and sends results back via webhook
 """
 
 import asyncio
+import json
 import logging
 import os
-from typing import Dict, Optional, Any
-from datetime import datetime
+import time
+import uuid
+from typing import Dict, List, Optional, Any
 
-from fastapi import FastAPI, HTTPException, Header, BackgroundTasks
+import uvicorn
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import httpx
-
 from ..core.agent import AgentLoop
+from ..core.dag import DagExecutor
+from ..core.errors import ErrorClassifier
+from ..core.memo import ActionMemo
 from ..core.llm import create_llm_setup
+from ..core.planner import Planner, SharedPlanner
+from ..core.trace import COMPONENTS as TRACE_COMPONENTS, TraceRecorder
 from ..tools.sandbox import DockerSandbox
 from ..memory.event_stream import EventStream
 from ..memory.file_storage import FileStorage
+from ..runtime.admission import AdmissionController
+from ..runtime.checkpoints import CheckpointStore
+from ..runtime.fairshare import parse_tier_map
+from ..runtime.health import HealthProber
+from ..runtime.metrics import (
+    QUEUE_DEPTH, RESULT_CACHE_LOOKUPS, TASKS_RUNNING, TASK_DURATION, TASK_ITERATIONS, WEBHOOK_OUTBOX_PENDING, render_metrics
+)
+from ..runtime.queue import create_task_queue
+from ..runtime.registry import TaskRegistry
+from ..runtime.result_cache import ResultCache
+from ..runtime.result_delivery import build_result_deliveries
+from ..runtime.sandbox_pool import SandboxPool
+from ..runtime.scheduler import TaskScheduler
+from ..runtime.webhooks import WebhookDispatcher
 
 logging.basicConfig(
     level=logging.INFO,
@@ -34,11 +55,45 @@ CONFIG = {
     "WRITGO_API_URL": os.getenv("WRITGO_API_URL", "https://writgo.nl"),
     "WRITGO_WEBHOOK_SECRET": os.getenv("WRITGO_WEBHOOK_SECRET"),
     "MAX_ITERATIONS": int(os.getenv("MAX_ITERATIONS", "50")),
+    "MAX_PARALLEL_TOOLS": int(os.getenv("MAX_PARALLEL_TOOLS", "4")),
+    "MAX_PARALLEL_AGENTS": int(os.getenv("MAX_PARALLEL_AGENTS", "3")),
+    "STALL_WINDOW": int(os.getenv("STALL_WINDOW", "12")),
+    "STALL_MAX_REPEATS": int(os.getenv("STALL_MAX_REPEATS", "3")),
+    "MAX_REPLANS": int(os.getenv("MAX_REPLANS", "1")),
+    "CONTEXT_TOKEN_BUDGETS": os.getenv("CONTEXT_TOKEN_BUDGETS", "default:8000,haiku:4000"),
+    "ACTION_MEMO_TTLS": os.getenv("ACTION_MEMO_TTLS", ""),
+    "ACTION_MEMO_MAX_ENTRIES": int(os.getenv("ACTION_MEMO_MAX_ENTRIES", "1000")),
     "SANDBOX_TIMEOUT": int(os.getenv("SANDBOX_TIMEOUT", "300")),
+    "SANDBOX_IMAGE": os.getenv("SANDBOX_IMAGE", "writgo-agent-sandbox:latest"),
+    "HEALTH_PROBE_INTERVAL": float(os.getenv("HEALTH_PROBE_INTERVAL", "15")),
+    "MAX_QUEUED_TASKS": int(os.getenv("MAX_QUEUED_TASKS", "50")),
+    "ADMISSION_MIN_TOKENS": int(os.getenv("ADMISSION_MIN_TOKENS", "20000")),
     "DEFAULT_MODEL": os.getenv("DEFAULT_MODEL", "claude-opus-4-20250514"),
     "MODEL_COMPLEX": os.getenv("MODEL_COMPLEX", "claude-opus-4-20250514"),
     "MODEL_FAST": os.getenv("MODEL_FAST", "claude-haiku-3-20250307"),
     "MODEL_CODING": os.getenv("MODEL_CODING", "claude-sonnet-4-20250514"),
+    "MAX_CONCURRENT_TASKS": int(os.getenv("MAX_CONCURRENT_TASKS", "2")),
+    "MAX_SANDBOXES": int(os.getenv("MAX_SANDBOXES", "0")),  # 0: MAX_CONCURRENT_TASKS + MAX_PARALLEL_AGENTS - 1
+    "QUEUE_BACKEND": os.getenv("QUEUE_BACKEND", "memory"),
+    "REDIS_URL": os.getenv("REDIS_URL", "redis://localhost:6379"),
+    "NODE_ID": os.getenv("NODE_ID"),
+    "FAIR_SHARE_KEY": os.getenv("FAIR_SHARE_KEY", "user"),
+    "FAIR_SHARE_WEIGHTS": os.getenv("FAIR_SHARE_WEIGHTS", "starter:1,pro:2,enterprise:4"),
+    "FAIR_SHARE_MAX_RUNNING": os.getenv("FAIR_SHARE_MAX_RUNNING", ""),
+    "QUEUE_HEARTBEAT_TTL": int(os.getenv("QUEUE_HEARTBEAT_TTL", "30")),
+    "WEBHOOK_OUTBOX_PATH": os.getenv("WEBHOOK_OUTBOX_PATH", "workspace/webhook_outbox.db"),
+    "WEBHOOK_MAX_ATTEMPTS": int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "20")),
+    "WEBHOOK_CONCURRENCY": int(os.getenv("WEBHOOK_CONCURRENCY", "4")),
+    "WEBHOOK_COMPRESS_MIN_BYTES": int(os.getenv("WEBHOOK_COMPRESS_MIN_BYTES", "1024")),
+    "RESULT_INLINE_LIMIT": int(os.getenv("RESULT_INLINE_LIMIT", str(256 * 1024))),
+    "RESULT_CHUNK_SIZE": int(os.getenv("RESULT_CHUNK_SIZE", str(1024 * 1024))),
+    "TASK_TTL": int(os.getenv("TASK_TTL", "3600")),
+    "TASK_REGISTRY_MAX_ENTRIES": int(os.getenv("TASK_REGISTRY_MAX_ENTRIES", "1000")),
+    "CHECKPOINT_PATH": os.getenv("CHECKPOINT_PATH", "workspace/checkpoints.db"),
+    "WORKSPACE_ROOT": os.getenv("WORKSPACE_ROOT", "/tmp"),
+    "TRACE_DIR": os.getenv("TRACE_DIR", ""),
+    "RESULT_CACHE_TTL": int(os.getenv("RESULT_CACHE_TTL", "3600")),  # 0 disables the cache
+    "RESULT_CACHE_MAX_BYTES": int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
 }
 
 # Initialize LLM
@@ -55,6 +110,9 @@ class TaskRequest(BaseModel):
     priority: str = "normal"
     user_id: str
     project_id: Optional[str] = None
+    plan: Optional[str] = None  # Subscription tier, used for fair-share weights and caps
+    cache: bool = False  # Opt-in: reuse the result of an identical recent or in-flight task
+    batch_id: Optional[str] = None
 
 
 class TaskResponse(BaseModel):
@@ -62,48 +120,307 @@ class TaskResponse(BaseModel):
     message: str
 
 
+class BatchRequest(BaseModel):
+    batch_id: Optional[str] = None
+    tasks: List[TaskRequest]
+    share_planning: bool = True
+
+
+class BatchResponse(BaseModel):
+    status: str
+    batch_id: str
+    accepted: List[str]
+    message: str
+
+
 class HealthResponse(BaseModel):
     status: str
     version: str
     sandbox_ready: bool
 
 
-# === Active Tasks Registry ===
+class ReadyResponse(BaseModel):
+    ready: bool
+    draining: bool = False
+    free_slots: int
+    max_concurrent: int
+    running: int
+    queued: int
+    queue_full: bool = False
+    sandbox_ready: bool
+    sandbox_image_ready: bool
+    active_sandboxes: int
+    sandbox_checked_at: Optional[float] = None
+    llm_rate_limits: Dict[str, Dict[str, Any]]
+
+
+# === Task Registry ===
+
+# Compact status per task; finished tasks expire after TASK_TTL seconds
+task_registry = TaskRegistry(
+    ttl=CONFIG["TASK_TTL"],
+    max_entries=CONFIG["TASK_REGISTRY_MAX_ENTRIES"]
+)
+
+# Live event streams of running tasks on this node, for /tasks/{task_id}/events
+event_streams: Dict[str, EventStream] = {}
+
+# Batches submitted via /tasks/execute_batch, with a shared planner per batch
+batch_registry = TaskRegistry(
+    ttl=CONFIG["TASK_TTL"],
+    max_entries=CONFIG["TASK_REGISTRY_MAX_ENTRIES"]
+)
+batch_planners: Dict[str, SharedPlanner] = {}
+
+# Results of opt-in cached tasks, plus identical submissions attached to in-flight runs
+result_cache = ResultCache(
+    ttl=CONFIG["RESULT_CACHE_TTL"],
+    max_bytes=CONFIG["RESULT_CACHE_MAX_BYTES"]
+)
+
+
+# Fixes for failed actions, shared so LLM diagnoses are reused across tasks
+error_classifier = ErrorClassifier()
+
+# Results of pure actions (web searches, page fetches), shared between tasks of a project
+action_memo = ActionMemo(
+    ttls=parse_tier_map(CONFIG["ACTION_MEMO_TTLS"]),
+    max_entries=CONFIG["ACTION_MEMO_MAX_ENTRIES"]
+)
+
+
+# Progress of running tasks (saved every iteration) and tasks interrupted by a
+# drain (SIGTERM) or crash, resubmitted on startup
+checkpoints = CheckpointStore(CONFIG["CHECKPOINT_PATH"])
+_drain_task: Optional[asyncio.Task] = None
+
+
+# === Scheduler ===
+
+async def _run_scheduled_task(payload: Dict[str, Any]):
+    """Scheduler handler: rebuild the request and run the agent."""
+    task_request = TaskRequest(**payload)
+
+    # With a shared queue the task may have been accepted by another node
+    if task_request.task_id not in task_registry:
+        task_registry.register(task_request.task_id, batch_id=task_request.batch_id)
+
+    await run_agent_task(task_request)
+
+
+async def _fail_dead_task(entry: Dict[str, Any]):
+    """Scheduler dead-letter handler: the task crashed its nodes too often, report it failed."""
+    task_id = entry["task_id"]
+    error = "Task was given up after its agent node crashed too many times"
+
+    task_registry.finish(task_id, "failed", error=error)
+    _publish_status(task_id, "failed")
+    await send_task_error(task_id, error)
+    await asyncio.to_thread(checkpoints.delete, task_id)
+    _update_batch(task_id)
+
+
+scheduler = TaskScheduler(
+    handler=_run_scheduled_task,
+    max_concurrent=CONFIG["MAX_CONCURRENT_TASKS"],
+    queue=create_task_queue(CONFIG),
+    dead_letter_handler=_fail_dead_task
+)
+
+
+# Running sandbox containers of all tasks and their parallel plan steps; by default
+# one task can fan out fully while the other slots run a sandbox each
+sandbox_pool = SandboxPool(
+    CONFIG["MAX_SANDBOXES"] or CONFIG["MAX_CONCURRENT_TASKS"] + CONFIG["MAX_PARALLEL_AGENTS"] - 1
+)
+
+
+# === Webhook Dispatcher ===
+
+webhooks = WebhookDispatcher(
+    webhook_url=f"{CONFIG['WRITGO_API_URL']}/api/agent/webhook",
+    secret=CONFIG["WRITGO_WEBHOOK_SECRET"],
+    outbox_path=CONFIG["WEBHOOK_OUTBOX_PATH"],
+    max_attempts=CONFIG["WEBHOOK_MAX_ATTEMPTS"],
+    concurrency=CONFIG["WEBHOOK_CONCURRENCY"],
+    compress_min_bytes=CONFIG["WEBHOOK_COMPRESS_MIN_BYTES"]
+)
+
+
+# === Health Prober ===
+
+health_prober = HealthProber(
+    sandbox_image=CONFIG["SANDBOX_IMAGE"],
+    interval=CONFIG["HEALTH_PROBE_INTERVAL"]
+)
+
+
+# === Admission Control ===
+
+admission = AdmissionController(
+    max_queue_depth=CONFIG["MAX_QUEUED_TASKS"],
+    min_tokens_remaining=CONFIG["ADMISSION_MIN_TOKENS"],
+    sandbox_retry_seconds=CONFIG["HEALTH_PROBE_INTERVAL"]
+)
+
+
+def _llm_rate_limits() -> Dict[str, Dict[str, Any]]:
+    """Last reported rate-limit headroom per LLM provider."""
+    return {
+        name: provider.get_rate_limits()
+        for name, provider in model_router.providers.items()
+    }
+
+
+@app.on_event("startup")
+async def start_runtime():
+    """Start the webhook dispatcher, the registry janitor, the health prober and the agent worker pool."""
+    await webhooks.start()
+    await task_registry.start()
+    await batch_registry.start()
+    await health_prober.start()
+    await _resume_checkpoints()
+    await scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_runtime():
+    """Drain and stop the agent worker pool, then the registry janitor and the webhook dispatcher."""
+    request_drain()
+    await _drain_task
+    await scheduler.stop()
+    await health_prober.stop()
+    await batch_registry.stop()
+    await task_registry.stop()
+    await webhooks.stop()
+    checkpoints.close()
+
+
+def request_drain():
+    """Start draining: refuse new tasks and checkpoint the running ones. Idempotent."""
+    global _drain_task
+    if _drain_task is None:
+        _drain_task = asyncio.get_running_loop().create_task(_drain())
+
+
+async def _drain():
+    logger.info("Draining: no new tasks are accepted, running tasks are checkpointed")
+    interrupted = await scheduler.drain()
 
-active_tasks: Dict[str, Dict] = {}
+    # Tasks still waiting in a non-durable queue (or on a duplicate) would be lost on exit
+    waiting = await scheduler.queue.export_waiting()
+    waiting += [{"task_id": payload["task_id"], "payload": payload} for payload in result_cache.attached_payloads()]
+    for entry in waiting:
+        if not await asyncio.to_thread(checkpoints.load, entry["task_id"]):
+            await asyncio.to_thread(checkpoints.save, entry["task_id"], entry["payload"])
+
+    logger.info(f"Drain complete: {len(interrupted)} running and {len(waiting)} queued tasks saved")
+
+
+async def _resume_checkpoints():
+    """Resubmit tasks left by the last drain or crash; running ones continue from their checkpoint."""
+    saved = await asyncio.to_thread(checkpoints.all)
+    for checkpoint in saved:
+        task_request = TaskRequest(**checkpoint["payload"])
+        task_registry.register(
+            task_request.task_id,
+            batch_id=task_request.batch_id,
+            resumed=checkpoint["state"] is not None
+        )
+        try:
+            await _submit_task(task_request)
+        except ValueError:
+            # Still on the shared queue; the checkpoint is used when it runs
+            continue
+
+    if saved:
+        logger.info(f"Resubmitted {len(saved)} tasks from checkpoints")
+
+
+class DrainingServer(uvicorn.Server):
+    """Uvicorn server that starts draining on SIGTERM, before open connections are awaited."""
+
+    def handle_exit(self, sig, frame):
+        request_drain()
+        super().handle_exit(sig, frame)
+
+
+def serve(host: str = "0.0.0.0", port: int = 8000, log_level: str = "info"):
+    """Run the API server with graceful drain on shutdown."""
+    DrainingServer(uvicorn.Config(app, host=host, port=port, log_level=log_level)).run()
 
 
 # === API Endpoints ===
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint."""
-    # Test Docker availability
-    sandbox_ready = False
-    try:
-        import docker
-        client = docker.from_env()
-        client.ping()
-        sandbox_ready = True
-    except:
-        pass
-
+    """Health check endpoint (liveness). Docker availability comes from the cached probe."""
     return {
         "status": "healthy",
         "version": "1.0.0",
-        "sandbox_ready": sandbox_ready
+        "sandbox_ready": health_prober.state["sandbox_ready"]
     }
 
 
+@app.get("/ready", response_model=ReadyResponse)
+async def readiness_check(response: Response):
+    """
+    Readiness endpoint reporting real capacity.
+    Returns 503 when no task could start here right now.
+    """
+    stats = await scheduler.stats()
+    sandbox = health_prober.state
+
+    llm_rate_limits = _llm_rate_limits()
+
+    # Same backlog as admission control: a full queue would answer 429 here
+    backlog = stats["queued"] + sandbox_pool.stats()["waiting"]
+    queue_full = backlog >= admission.max_queue_depth
+
+    ready = sandbox["sandbox_ready"] and stats["free_slots"] > 0 and not queue_full and not scheduler.draining
+    if not ready:
+        response.status_code = 503
+
+    return {
+        "ready": ready,
+        "draining": scheduler.draining,
+        "free_slots": stats["free_slots"],
+        "max_concurrent": stats["max_concurrent"],
+        "running": stats["running"],
+        "queued": stats["queued"],
+        "queue_full": queue_full,
+        "sandbox_ready": sandbox["sandbox_ready"],
+        "sandbox_image_ready": sandbox["sandbox_image_ready"],
+        "active_sandboxes": sandbox["active_sandboxes"],
+        "sandbox_checked_at": sandbox["checked_at"],
+        "llm_rate_limits": llm_rate_limits
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint."""
+    stats = await scheduler.stats()
+    QUEUE_DEPTH.set(stats["queued"])
+    TASKS_RUNNING.set(stats["running"])
+
+    try:
+        WEBHOOK_OUTBOX_PENDING.set(await asyncio.to_thread(webhooks.outbox.pending_count))
+    except Exception as e:
+        logger.error(f"Failed to read webhook outbox size: {e}")
+
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/tasks/execute", response_model=TaskResponse)
 async def execute_task(
     task_request: TaskRequest,
-    background_tasks: BackgroundTasks,
     authorization: Optional[str] = Header(None)
 ):
     """
     Execute a task from WritGo.nl.
-    Runs in background and sends results via webhook.
+    Queued by priority, runs when an agent slot is free and sends results via webhook.
     """
     # Verify authorization
     expected_auth = f"Bearer {CONFIG['WRITGO_WEBHOOK_SECRET']}"
@@ -112,37 +429,311 @@ async def execute_task(
 
     task_id = task_request.task_id
 
-    # Check if already running
-    if task_id in active_tasks:
+    if scheduler.draining:
+        raise HTTPException(status_code=503, detail="Agent runtime is shutting down", headers={"Retry-After": "30"})
+
+    # Check if already running (finished tasks may be resubmitted)
+    if task_id in task_registry and not task_registry.is_finished(task_id):
+        raise HTTPException(status_code=409, detail="Task already running")
+
+    logger.info(f"Received task {task_id}: {task_request.title}")
+
+    # Identical cached or in-flight work costs no capacity, so check it before admission
+    served = await _serve_from_cache(task_request)
+    if served:
+        return served
+
+    # Admission control: tell WritGo.nl when to retry instead of queueing work that would time out
+    rejection = admission.check(
+        await scheduler.stats(),
+        health_prober.state,
+        _llm_rate_limits(),
+        sandbox_pool=sandbox_pool.stats()
+    )
+    if rejection:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Agent runtime saturated ({rejection['reason']})",
+            headers={"Retry-After": str(rejection["retry_after"])}
+        )
+
+    # Register task, then queue it for execution by the worker pool
+    task_registry.register(task_id, batch_id=task_request.batch_id)
+    try:
+        position = await _submit_task(task_request)
+    except ValueError:
         raise HTTPException(status_code=409, detail="Task already running")
 
-    # Register task
-    active_tasks[task_id] = {
-        "status": "queued",
-        "started_at": datetime.now().isoformat()
+    return {
+        "status": "accepted",
+        "message": f"Task {task_id} queued for execution (position {position})"
     }
 
-    logger.info(f"Received task {task_id}: {task_request.title}")
 
-    # Execute in background
-    background_tasks.add_task(
-        run_agent_task,
-        task_request
+@app.post("/tasks/execute_batch", response_model=BatchResponse)
+async def execute_batch(
+    batch_request: BatchRequest,
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Execute a group of tasks from WritGo.nl (e.g. one autopilot content run).
+    Prompts that share a template are planned once and the plan is reused.
+    """
+    expected_auth = f"Bearer {CONFIG['WRITGO_WEBHOOK_SECRET']}"
+    if authorization != expected_auth:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if scheduler.draining:
+        raise HTTPException(status_code=503, detail="Agent runtime is shutting down", headers={"Retry-After": "30"})
+
+    tasks = batch_request.tasks
+    if not tasks:
+        raise HTTPException(status_code=400, detail="Batch contains no tasks")
+
+    task_ids = [t.task_id for t in tasks]
+    if len(set(task_ids)) != len(task_ids):
+        raise HTTPException(status_code=400, detail="Duplicate task_id in batch")
+
+    running = [
+        task_id for task_id in task_ids
+        if task_id in task_registry and not task_registry.is_finished(task_id)
+    ]
+    if running:
+        raise HTTPException(status_code=409, detail=f"Tasks already running: {', '.join(running)}")
+
+    batch_id = batch_request.batch_id or f"batch_{uuid.uuid4().hex[:12]}"
+    if batch_id in batch_registry and not batch_registry.is_finished(batch_id):
+        raise HTTPException(status_code=409, detail="Batch already running")
+
+    rejection = admission.check(
+        await scheduler.stats(),
+        health_prober.state,
+        _llm_rate_limits(),
+        incoming=len(tasks),
+        sandbox_pool=sandbox_pool.stats()
     )
+    if rejection:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Agent runtime saturated ({rejection['reason']})",
+            headers={"Retry-After": str(rejection["retry_after"])}
+        )
+
+    logger.info(f"Received batch {batch_id} with {len(tasks)} tasks")
+
+    if batch_request.share_planning:
+        batch_planners[batch_id] = SharedPlanner(llm_provider, [t.prompt for t in tasks])
+
+    batch_registry.register(batch_id, status="running", task_ids=task_ids, total=len(tasks))
+
+    accepted = []
+    for task_request in tasks:
+        task_request.batch_id = batch_id
+        if await _serve_from_cache(task_request):
+            accepted.append(task_request.task_id)
+            continue
+
+        task_registry.register(task_request.task_id, batch_id=batch_id)
+        try:
+            await _submit_task(task_request)
+            accepted.append(task_request.task_id)
+        except ValueError:
+            task_registry.finish(task_request.task_id, "failed", error="Task already scheduled")
+
+    batch_registry.update(batch_id, task_ids=accepted, total=len(accepted))
+    if not accepted:
+        # No task will ever finish it
+        batch_planners.pop(batch_id, None)
+        batch_registry.finish(batch_id, "rejected")
+        logger.warning(f"Batch {batch_id} rejected: none of its tasks could be queued")
+        return {
+            "status": "rejected",
+            "batch_id": batch_id,
+            "accepted": [],
+            "message": f"None of the {len(tasks)} tasks could be queued"
+        }
+
+    # Cache hits may already have finished every task of the batch
+    _update_batch(accepted[0])
 
     return {
         "status": "accepted",
-        "message": f"Task {task_id} queued for execution"
+        "batch_id": batch_id,
+        "accepted": accepted,
+        "message": f"{len(accepted)} of {len(tasks)} tasks queued for execution"
+    }
+
+
+@app.get("/batches/{batch_id}/status")
+async def get_batch_status(batch_id: str):
+    """Get aggregated status of a batch."""
+    batch = batch_registry.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    counts: Dict[str, int] = {}
+    for task_id in batch["task_ids"]:
+        status = (task_registry.get(task_id) or {}).get("status", "unknown")
+        counts[status] = counts.get(status, 0) + 1
+
+    planner = batch_planners.get(batch_id)
+    if planner:
+        batch["planner_calls"] = planner.planner_calls
+        batch["shared_plans"] = planner.shared_plans
+
+    batch["counts"] = counts
+    return batch
+
+
+def _update_batch(task_id: str):
+    """Finish the task's batch once all of its tasks have finished."""
+    batch_id = (task_registry.get(task_id) or {}).get("batch_id")
+    batch = batch_registry.get(batch_id) if batch_id else None
+    if not batch or batch_registry.is_finished(batch_id):
+        return
+
+    if all(task_registry.is_finished(t) for t in batch["task_ids"]):
+        planner = batch_planners.pop(batch_id, None)
+        summary = {}
+        if planner:
+            summary = {"planner_calls": planner.planner_calls, "shared_plans": planner.shared_plans}
+        batch_registry.finish(batch_id, "completed", **summary)
+        logger.info(f"Batch {batch_id} finished")
+
+
+@app.delete("/tasks/{task_id}", response_model=TaskResponse)
+async def cancel_task(
+    task_id: str,
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Cancel a queued or running task.
+    A running agent is interrupted, its sandbox is killed and a
+    'cancelled' webhook is sent to WritGo.nl.
+    """
+    expected_auth = f"Bearer {CONFIG['WRITGO_WEBHOOK_SECRET']}"
+    if authorization != expected_auth:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if task_registry.is_finished(task_id):
+        raise HTTPException(status_code=409, detail="Task already finished")
+
+    if result_cache.detach(task_id):
+        # Attached to an identical in-flight task: just stop waiting for it
+        task_registry.finish(task_id, "cancelled")
+        _update_batch(task_id)
+        await send_task_cancelled(task_id)
+        return {
+            "status": "cancelled",
+            "message": f"Task {task_id} detached from its in-flight duplicate"
+        }
+
+    # The payload is gone once the task leaves the queue, but its duplicates still need it
+    entry = await scheduler.queue.get_entry(task_id)
+    outcome = await scheduler.cancel(task_id)
+
+    if outcome is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if outcome == "queued":
+        # Never started: finish it here
+        await asyncio.to_thread(checkpoints.delete, task_id)
+        task_registry.finish(task_id, "cancelled")
+        _update_batch(task_id)
+        await send_task_cancelled(task_id)
+
+        cache_key = _cache_key(TaskRequest(**entry["payload"])) if entry else None
+        if cache_key:
+            await _promote_followers(cache_key, result_cache.complete(cache_key, task_id))
+        return {
+            "status": "cancelled",
+            "message": f"Task {task_id} removed from the queue"
+        }
+
+    return {
+        "status": "cancelling",
+        "message": f"Task {task_id} is being cancelled"
     }
 
 
 @app.get("/tasks/{task_id}/status")
 async def get_task_status(task_id: str):
     """Get status of running task."""
-    if task_id not in active_tasks:
+    queue_info = await scheduler.get_queue_info(task_id)
+
+    status = task_registry.get(task_id)
+    if status is None and queue_info:
+        # Queued on the shared queue by another node
+        status = {"status": "queued"}
+    elif status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if queue_info:
+        status.update(queue_info)
+
+    return status
+
+
+@app.get("/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Stream task events (action, observation, recovery, ...) as Server-Sent Events.
+    Resume with ?offset=N or the Last-Event-ID header; the stream ends after
+    the task has finished and all events are sent.
+    Events hold the task's code and tool output, so this needs the same auth as the task endpoints.
+    """
+    expected_auth = f"Bearer {CONFIG['WRITGO_WEBHOOK_SECRET']}"
+    if authorization != expected_auth:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if task_id not in task_registry:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    return active_tasks[task_id]
+    if last_event_id is not None and last_event_id.isdigit():
+        offset = max(offset, int(last_event_id) + 1)
+
+    async def event_generator():
+        next_offset = offset
+        stream = None
+
+        while True:
+            if await request.is_disconnected():
+                return
+
+            # Hold on to the stream: it is released from the registry when the task finishes
+            stream = stream or event_streams.get(task_id)
+            if stream:
+                items, next_offset = stream.get_since(next_offset)
+                for event_offset, event in items:
+                    data = json.dumps(event, default=str)
+                    yield f"id: {event_offset}\nevent: {event.get('type', 'message')}\ndata: {data}\n\n"
+
+            status = (task_registry.get(task_id) or {}).get("status")
+            if status is None or task_registry.is_finished(task_id) or scheduler.draining:
+                yield f"event: end\ndata: {json.dumps({'status': status})}\n\n"
+                return
+
+            if stream:
+                has_events = await stream.wait_for_events(next_offset, timeout=15.0)
+            else:
+                # Still queued: the event stream is created when the task starts
+                await asyncio.sleep(1.0)
+                has_events = True
+
+            if not has_events:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 async def run_agent_task(task_request: TaskRequest):
@@ -151,160 +742,396 @@ async def run_agent_task(task_request: TaskRequest):
     This is the main integration point!
     """
     task_id = task_request.task_id
+    cache_key = _cache_key(task_request)
+    started = time.perf_counter()
+    agent = None
 
     try:
         # Update status to running
-        active_tasks[task_id]["status"] = "running"
+        task_registry.update(task_id, status="running")
         await send_status_update(task_id, "running")
 
-        logger.info(f"Starting agent execution for task {task_id}")
+        # A task interrupted by a drain or crash continues from its last completed iteration
+        await asyncio.to_thread(checkpoints.register, task_id, task_request.model_dump())
+        checkpoint = await asyncio.to_thread(checkpoints.load, task_id)
+        resume_from = checkpoint["state"] if checkpoint else None
+        workspace_dir = (
+            resume_from["workspace_dir"] if resume_from
+            else os.path.join(CONFIG["WORKSPACE_ROOT"], f"agent_workspace_{task_id}")
+        )
+
+        logger.info(f"Starting agent execution for task {task_id}" + (" (resumed)" if resume_from else ""))
 
         # Initialize components
         sandbox = DockerSandbox(
+            image=CONFIG["SANDBOX_IMAGE"],
             timeout=CONFIG["SANDBOX_TIMEOUT"],
-            workspace_dir=f"/tmp/agent_workspace_{task_id}"
+            workspace_dir=workspace_dir
         )
         event_stream = EventStream()
-        file_storage = FileStorage(workspace_dir=f"/tmp/agent_workspace_{task_id}")
+        event_streams[task_id] = event_stream
+        file_storage = FileStorage(workspace_dir=workspace_dir)
+        task_context = {
+            "user_id": task_request.user_id,
+            "project_id": task_request.project_id,
+            "priority": task_request.priority
+        }
+
+        components = {
+            "llm_provider": llm_provider,
+            "planner": batch_planners.get(task_request.batch_id) or Planner(llm_provider),
+            "sandbox": sandbox,
+            "file_storage": file_storage,
+            "action_memo": action_memo,
+            "error_classifier": error_classifier,
+        }
+        settings = {
+            "max_iterations": CONFIG["MAX_ITERATIONS"],
+            "max_parallel_tools": CONFIG["MAX_PARALLEL_TOOLS"],
+            "context_budgets": parse_tier_map(CONFIG["CONTEXT_TOKEN_BUDGETS"]),
+            "task_id": task_id,
+            "stall_window": CONFIG["STALL_WINDOW"],
+            "stall_repeats": CONFIG["STALL_MAX_REPEATS"],
+            "max_replans": CONFIG["MAX_REPLANS"],
+        }
+
+        # Record the run for offline replay (resumed runs lack their start)
+        recorder = None
+        if CONFIG["TRACE_DIR"] and not resume_from:
+            recorder = TraceRecorder(
+                task_request.prompt,
+                task_context,
+                config={**settings, "models": model_router.models}
+            )
+            components = {
+                argument: recorder.wrap(kind, components[argument])
+                for kind, argument in TRACE_COMPONENTS.items()
+            }
 
         # Create agent loop
         agent = AgentLoop(
-            llm_provider=llm_provider,
             model_router=model_router,
-            sandbox=sandbox,
             event_stream=event_stream,
-            file_storage=file_storage,
-            max_iterations=CONFIG["MAX_ITERATIONS"]
+            checkpoint_store=checkpoints,
+            **components,
+            **settings
         )
 
-        # Run task
-        result = await agent.run(
-            task=task_request.prompt,
-            context={
-                "user_id": task_request.user_id,
-                "project_id": task_request.project_id,
-                "priority": task_request.priority
-            }
-        )
+        def spawn_step_agent(name: str, step_workspace: str) -> AgentLoop:
+            """Sub-agent for one plan step, with its own sandbox and event stream."""
+            return AgentLoop(
+                llm_provider=llm_provider,
+                model_router=model_router,
+                sandbox=DockerSandbox(
+                    image=CONFIG["SANDBOX_IMAGE"],
+                    timeout=CONFIG["SANDBOX_TIMEOUT"],
+                    workspace_dir=step_workspace
+                ),
+                event_stream=EventStream(),
+                file_storage=FileStorage(workspace_dir=step_workspace),
+                error_classifier=error_classifier,
+                action_memo=action_memo,
+                **{**settings, "task_id": f"{task_id}-{name}"}
+            )
+
+        # Run task (independent plan steps in parallel sub-agents; traces cover a single loop)
+        if resume_from:
+            async with sandbox_pool.slot():
+                result = await agent.resume(task_id)
+        else:
+            executor = DagExecutor(
+                agent,
+                spawn_step_agent,
+                max_parallel=1 if recorder else CONFIG["MAX_PARALLEL_AGENTS"],
+                sandbox_pool=sandbox_pool
+            )
+            result = await executor.run(task_request.prompt, task_context)
+        await asyncio.to_thread(checkpoints.delete, task_id)
+
+        if recorder:
+            try:
+                os.makedirs(CONFIG["TRACE_DIR"], exist_ok=True)
+                await asyncio.to_thread(recorder.save, os.path.join(CONFIG["TRACE_DIR"], f"{task_id}.jsonl.gz"))
+            except OSError as e:
+                logger.warning(f"Could not save trace for task {task_id}: {e}")
+
+        outcome = result.get("status", "completed")
+        TASK_DURATION.labels(outcome).observe(time.perf_counter() - started)
+        TASK_ITERATIONS.labels(outcome).observe(result.get("iterations") or 0)
 
-        # Send results to WritGo.nl
+        # Send results to WritGo.nl (a stalled run is reported failed, with its files)
+        status = _task_status(result)
         await send_task_results(task_id, result)
 
-        # Update local status
-        active_tasks[task_id]["status"] = "completed"
-        active_tasks[task_id]["completed_at"] = datetime.now().isoformat()
+        if cache_key:
+            followers = result_cache.complete(cache_key, task_id)
+            if status == "completed":
+                if outcome == "completed":
+                    result_cache.put(cache_key, result)
+                for follower in followers:
+                    await _finish_from_cache(follower["task_id"], result)
+            else:
+                # Duplicates get a run of their own instead of this failure
+                await _promote_followers(cache_key, followers)
 
-        logger.info(f"Task {task_id} completed successfully")
+        # Update local status (compact summary only)
+        task_registry.finish(
+            task_id,
+            status,
+            result_status=result.get("status"),
+            iterations=result.get("iterations"),
+            result_files=(result.get("result") or {}).get("files", [])[:50],
+            error=_task_error(result)
+        )
+        _publish_status(task_id, status)
+
+        logger.info(f"Task {task_id} finished: {status} (agent status {outcome})")
+
+    except asyncio.CancelledError:
+        if scheduler.draining:
+            # Shutting down: save progress and leave the task for the next start
+            state = agent.checkpoint() if agent else None
+            await asyncio.to_thread(checkpoints.save, task_id, task_request.model_dump(), state)
+            task_registry.update(task_id, status="interrupted")
+            _publish_status(task_id, "interrupted")
+            await send_status_update(task_id, "queued")
+            logger.info(f"Task {task_id} checkpointed at iteration {state['iteration'] if state else 0}")
+            raise
+
+        logger.info(f"Task {task_id} cancelled")
+        TASK_DURATION.labels("cancelled").observe(time.perf_counter() - started)
+
+        task_registry.finish(task_id, "cancelled")
+        _publish_status(task_id, "cancelled")
+
+        await send_task_cancelled(task_id)
+        await asyncio.to_thread(checkpoints.delete, task_id)
+        if cache_key:
+            await _promote_followers(cache_key, result_cache.complete(cache_key, task_id))
+        raise
 
     except Exception as e:
         logger.error(f"Task {task_id} failed: {e}", exc_info=True)
+        TASK_DURATION.labels("error").observe(time.perf_counter() - started)
 
         # Update status
-        active_tasks[task_id]["status"] = "failed"
-        active_tasks[task_id]["error"] = str(e)
+        task_registry.finish(task_id, "failed", error=str(e)[:1000])
+        _publish_status(task_id, "failed")
 
         # Send error to WritGo.nl
         await send_task_error(task_id, str(e))
+        await asyncio.to_thread(checkpoints.delete, task_id)
+
+        if cache_key:
+            await _promote_followers(cache_key, result_cache.complete(cache_key, task_id))
 
     finally:
-        # Cleanup after 1 hour
-        await asyncio.sleep(3600)
-        if task_id in active_tasks:
-            del active_tasks[task_id]
+        # Release the event stream; the registry janitor expires the status record
+        event_streams.pop(task_id, None)
+        _update_batch(task_id)
 
 
-async def send_status_update(task_id: str, status: str):
-    """Send status update to WritGo.nl webhook."""
-    webhook_url = f"{CONFIG['WRITGO_API_URL']}/api/agent/webhook"
+def _cache_key(task_request: TaskRequest) -> Optional[str]:
+    """Result cache key for an opt-in task, or None if it must not be cached."""
+    if not task_request.cache or not result_cache.enabled:
+        return None
 
+    model_config = {
+        name: CONFIG[name]
+        for name in ("DEFAULT_MODEL", "MODEL_COMPLEX", "MODEL_FAST", "MODEL_CODING", "MAX_ITERATIONS")
+    }
+    return result_cache.key_for(
+        task_request.prompt,
+        task_request.user_id,
+        task_request.project_id,
+        model_config
+    )
+
+
+async def _serve_from_cache(task_request: TaskRequest) -> Optional[Dict[str, str]]:
+    """
+    Answer an opt-in task from the result cache or attach it to an identical
+    in-flight run. Returns the API response, or None if the task must run.
+    """
+    cache_key = _cache_key(task_request)
+    if not cache_key:
+        return None
+
+    task_id = task_request.task_id
+
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        RESULT_CACHE_LOOKUPS.labels("hit").inc()
+        task_registry.register(task_id, batch_id=task_request.batch_id)
+        await _finish_from_cache(task_id, cached)
+        return {
+            "status": "completed",
+            "message": f"Task {task_id} served from the result cache"
+        }
+
+    leader = result_cache.leader(cache_key)
+    if leader and leader != task_id:
+        RESULT_CACHE_LOOKUPS.labels("attached").inc()
+        result_cache.attach(cache_key, task_request.model_dump())
+        task_registry.register(task_id, batch_id=task_request.batch_id, attached_to=leader)
+        logger.info(f"Task {task_id} attached to identical in-flight task {leader}")
+        return {
+            "status": "accepted",
+            "message": f"Task {task_id} attached to in-flight task {leader}"
+        }
+
+    RESULT_CACHE_LOOKUPS.labels("miss").inc()
+    return None
+
+
+async def _submit_task(task_request: TaskRequest) -> int:
+    """Queue a registered task; opt-in tasks become the in-flight run for their cache key."""
+    # With a shared queue another node may run the task, so duplicates cannot wait on it here
+    cache_key = _cache_key(task_request) if CONFIG["QUEUE_BACKEND"] == "memory" else None
+    if cache_key:
+        result_cache.start(cache_key, task_request.task_id)
+
+    try:
+        return await scheduler.submit(
+            task_request.task_id,
+            task_request.model_dump(),
+            priority=task_request.priority
+        )
+    except ValueError:
+        if cache_key:
+            await _promote_followers(cache_key, result_cache.complete(cache_key, task_request.task_id))
+        raise
+
+
+async def _finish_from_cache(task_id: str, result: Dict[str, Any]):
+    """Complete a task with a result produced by an identical run."""
+    await send_task_results(task_id, result)
+    task_registry.finish(
+        task_id,
+        "completed",
+        cached=True,
+        result_status=result.get("status"),
+        iterations=result.get("iterations"),
+        result_files=(result.get("result") or {}).get("files", [])[:50]
+    )
+    _update_batch(task_id)
+
+
+async def _promote_followers(cache_key: str, followers: List[Dict[str, Any]]):
+    """The in-flight run failed or was cancelled: run the first attached task instead."""
+    if not followers:
+        return
+
+    leader, rest = TaskRequest(**followers[0]), followers[1:]
+    task_registry.update(leader.task_id, attached_to=None)
+    try:
+        await _submit_task(leader)
+    except ValueError:
+        logger.error(f"Could not resubmit attached task {leader.task_id}")
+        return
+
+    for payload in rest:
+        result_cache.attach(cache_key, payload)
+        task_registry.update(payload["task_id"], attached_to=leader.task_id)
+    logger.info(f"Task {leader.task_id} now runs for {len(rest)} attached duplicates")
+
+
+def _publish_status(task_id: str, status: str):
+    """Append a status event so live subscribers see the transition immediately."""
+    stream = event_streams.get(task_id)
+    if stream:
+        stream.add_event({"type": "status", "content": status})
+
+
+async def send_status_update(task_id: str, status: str):
+    """Queue status update for the WritGo.nl webhook."""
     payload = {
         "task_id": task_id,
         "status": status
     }
 
-    headers = {
-        "Authorization": f"Bearer {CONFIG['WRITGO_WEBHOOK_SECRET']}",
-        "Content-Type": "application/json"
-    }
-
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                webhook_url,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
-            response.raise_for_status()
-            logger.info(f"Status update sent to WritGo.nl: {status}")
+        await webhooks.enqueue(task_id, "status", payload)
     except Exception as e:
-        logger.error(f"Failed to send status update: {e}")
+        logger.error(f"Failed to queue status update: {e}")
 
 
-async def send_task_results(task_id: str, result: Dict[str, Any]):
-    """Send task results to WritGo.nl webhook."""
-    webhook_url = f"{CONFIG['WRITGO_API_URL']}/api/agent/webhook"
+# Agent result statuses reported to WritGo.nl as a failed task
+FAILED_OUTCOMES = {"failed", "stalled"}
+
+
+def _task_status(result: Dict[str, Any]) -> str:
+    """
+    Final task status of an agent result.
+    A run that stalled or finished no plan step failed; its files are still delivered.
+    """
+    return "failed" if result.get("status") in FAILED_OUTCOMES else "completed"
+
 
+def _task_error(result: Dict[str, Any]) -> Optional[str]:
+    """Error message of a failed agent result, None for a completed one."""
+    if _task_status(result) != "failed":
+        return None
+    return (result.get("error") or f"Agent run ended with status {result.get('status')}")[:1000]
+
+
+async def send_task_results(task_id: str, result: Dict[str, Any]):
+    """Queue task results for the WritGo.nl webhook."""
     payload = {
         "task_id": task_id,
-        "status": "completed",
+        "status": _task_status(result),
         "result_data": result.get("result"),
         "result_files": result.get("result", {}).get("files", []),
         "session_data": {
             "iterations": result.get("iterations"),
+            "usage": result.get("usage"),
             "events": result.get("events")
         },
         "activity_log": result.get("events", [])
     }
-
-    headers = {
-        "Authorization": f"Bearer {CONFIG['WRITGO_WEBHOOK_SECRET']}",
-        "Content-Type": "application/json"
-    }
+    if payload["status"] == "failed":
+        payload["error_message"] = _task_error(result)
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                webhook_url,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
-            response.raise_for_status()
-            logger.info(f"Results sent to WritGo.nl for task {task_id}")
+        # Large results are split into file chunks that are uploaded before the manifest
+        deliveries = build_result_deliveries(
+            task_id,
+            payload,
+            inline_limit=CONFIG["RESULT_INLINE_LIMIT"],
+            chunk_size=CONFIG["RESULT_CHUNK_SIZE"]
+        )
+        for delivery in deliveries:
+            await webhooks.enqueue(task_id, **delivery)
     except Exception as e:
-        logger.error(f"Failed to send results: {e}")
+        logger.error(f"Failed to queue results: {e}")
 
 
 async def send_task_error(task_id: str, error_message: str):
-    """Send task error to WritGo.nl webhook."""
-    webhook_url = f"{CONFIG['WRITGO_API_URL']}/api/agent/webhook"
-
+    """Queue task error for the WritGo.nl webhook."""
     payload = {
         "task_id": task_id,
         "status": "failed",
         "error_message": error_message
     }
 
-    headers = {
-        "Authorization": f"Bearer {CONFIG['WRITGO_WEBHOOK_SECRET']}",
-        "Content-Type": "application/json"
+    try:
+        await webhooks.enqueue(task_id, "error", payload)
+    except Exception as e:
+        logger.error(f"Failed to queue error: {e}")
+
+
+async def send_task_cancelled(task_id: str):
+    """Queue task cancellation for the WritGo.nl webhook."""
+    payload = {
+        "task_id": task_id,
+        "status": "cancelled"
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                webhook_url,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
-            response.raise_for_status()
-            logger.info(f"Error sent to WritGo.nl for task {task_id}")
+        await webhooks.enqueue(task_id, "cancelled", payload)
     except Exception as e:
-        logger.error(f"Failed to send error: {e}")
+        logger.error(f"Failed to queue cancellation: {e}")
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    serve()
@@ -1,15 +1,29 @@
 """Core agent components"""
 
 from .agent import AgentLoop
+from .context import ContextBuilder
+from .dag import DagExecutor
+from .errors import ErrorClassifier
+from .memo import ActionMemo
 from .llm import LLMProvider, ClaudeProvider, OpenAIProvider, ModelRouter, create_llm_setup
-from .planner import Planner
+from .planner import Planner, SharedPlanner
+from .stall import StallDetector
+from .trace import TraceRecorder, TraceReplayer
 
 __all__ = [
     "AgentLoop",
+    "ContextBuilder",
+    "DagExecutor",
+    "ErrorClassifier",
+    "ActionMemo",
     "LLMProvider",
     "ClaudeProvider",
     "OpenAIProvider",
     "ModelRouter",
     "create_llm_setup",
-    "Planner"
+    "Planner",
+    "SharedPlanner",
+    "StallDetector",
+    "TraceRecorder",
+    "TraceReplayer"
 ]
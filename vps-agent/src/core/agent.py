@@ -4,16 +4,24 @@ Gebaseerd op Manus.im CodeAct paradigma + Abacus multi-model routing
 """
 
 import asyncio
+import copy
 import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
-from ..tools.sandbox import DockerSandbox
+from ..tools.sandbox import DockerSandbox, format_exec_result
 from ..memory.event_stream import EventStream
 from ..memory.file_storage import FileStorage
+from ..runtime.checkpoints import CheckpointStore
+from ..runtime.metrics import AGENT_STALLS, ERROR_DIAGNOSES
+from .context import ContextBuilder
+from .errors import ErrorClassifier
+from .memo import ActionMemo
 from .llm import LLMProvider, ModelRouter
+from .pipeline import BookkeepingPipeline
 from .planner import Planner
-from .tools_definitions import TOOLS
+from .stall import StallDetector
+from .tools_definitions import TOOLS, is_pure
 
 logger = logging.getLogger(__name__)
 
@@ -32,22 +40,148 @@ class AgentLoop:
         event_stream: EventStream,
         file_storage: FileStorage,
         max_iterations: int = 50,
+        planner: Optional[Planner] = None,
+        max_parallel_tools: int = 4,
+        context_budgets: Optional[Dict[str, float]] = None,
+        checkpoint_store: Optional[CheckpointStore] = None,
+        task_id: Optional[str] = None,
+        error_classifier: Optional[ErrorClassifier] = None,
+        action_memo: Optional[ActionMemo] = None,
+        stall_window: int = 12,
+        stall_repeats: int = 3,
+        max_replans: int = 1,
     ):
         self.llm = llm_provider
         self.router = model_router
         self.sandbox = sandbox
         self.events = event_stream
         self.storage = file_storage
-        self.planner = Planner(llm_provider)
+        self.planner = planner or Planner(llm_provider)
         self.max_iterations = max_iterations
+        self.max_parallel_tools = max(1, max_parallel_tools)
+        self.context_builder = ContextBuilder(sandbox, event_stream, self.planner, budgets=context_budgets)
+        self.errors = error_classifier or ErrorClassifier()
 
-    async def run(self, task: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+        # Repeated turns or errors trigger up to `max_replans` re-plans, then stop the run
+        self.stall_detector = StallDetector(window=stall_window, max_repeats=stall_repeats)
+        self.max_replans = max_replans
+
+        # Results of pure actions, reused within the task (and the project when shared)
+        self.memo = action_memo or ActionMemo()
+        self._task_scope = f"task:{task_id or id(self)}"
+        self._project_scope = self._task_scope
+
+        # Token usage of the loop's LLM calls (input, output, cache_read, cache_write)
+        self.usage: Dict[str, int] = {}
+
+        # Progress as of the last completed iteration (see checkpoint())
+        self._progress: Optional[Dict[str, Any]] = None
+
+        # Durable per-iteration checkpoints (see resume())
+        self.checkpoint_store = checkpoint_store
+        self.task_id = task_id
+        self._saved_offset: Optional[int] = None  # None: stored events must be replaced
+
+        # todo.md writes and checkpoint saves run here, off the critical path
+        self.bookkeeping = BookkeepingPipeline()
+
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """
+        Snapshot of the state after the last completed iteration.
+        Returns None before the plan exists (the task must start over).
+        """
+        if self._progress is None:
+            return None
+
+        events, _ = self.events.get_since(0)
+        return {
+            **self._progress,
+            "events": [event for offset, event in events if offset < self._progress["event_offset"]],
+            "workspace_dir": self.sandbox.workspace_dir,
+        }
+
+    def _mark_progress(
+        self,
+        task: str,
+        context: Optional[Dict],
+        plan: Dict,
+        iteration: int,
+        consecutive_errors: int,
+        replans: int,
+    ):
+        self._progress = {
+            "task": task,
+            "context": context,
+            "plan": plan,
+            "iteration": iteration,
+            "consecutive_errors": consecutive_errors,
+            "replans": replans,
+            "event_offset": self.events.total_added,
+        }
+
+        if self.checkpoint_store is not None and self.task_id is not None:
+            # Snapshot now; the loop keeps changing the plan and adding events meanwhile
+            state = {
+                **self._progress,
+                "plan": copy.deepcopy(plan),
+                "workspace_dir": self.sandbox.workspace_dir,
+            }
+            self.bookkeeping.submit("checkpoint", lambda: self._save_progress(state))
+
+    def _save_plan(self, plan: Dict):
+        """Render the plan and write it to todo.md in the background (Manus todo.md pattern)."""
+        text = self.context_builder.refresh_plan(plan)
+        self.bookkeeping.submit("todo.md", lambda: self.storage.save_file("todo.md", text))
+
+    async def _save_progress(self, state: Dict[str, Any]):
+        """Persist a progress snapshot to the checkpoint store: the small state plus new events only."""
+        events, _ = self.events.get_since(self._saved_offset or 0)
+        events = [(offset, event) for offset, event in events if offset < state["event_offset"]]
+        try:
+            await asyncio.to_thread(
+                self.checkpoint_store.save_progress,
+                self.task_id,
+                state,
+                events,
+                replace_events=self._saved_offset is None,
+                keep_from=self.events.total_added - len(self.events.events),
+            )
+            self._saved_offset = state["event_offset"]
+        except Exception as e:
+            # A failed save only costs progress on a crash; keep the run going
+            logger.warning(f"Could not save checkpoint for task {self.task_id}: {e}")
+
+    async def resume(self, task_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Continue a task from its last saved iteration (after a crash, restart or node move).
+
+        Raises:
+            ValueError: If the store holds no agent state for the task
+        """
+        task_id = task_id or self.task_id
+        saved = await asyncio.to_thread(self.checkpoint_store.load, task_id) if self.checkpoint_store else None
+        if not saved or not saved["state"]:
+            raise ValueError(f"No checkpoint to resume task {task_id} from")
+
+        self.task_id = task_id
+        state = saved["state"]
+        return await self.run(state["task"], state.get("context"), resume_from=state)
+
+    async def run(
+        self,
+        task: str,
+        context: Optional[Dict] = None,
+        resume_from: Optional[Dict[str, Any]] = None,
+        plan: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
         """
         Run the agent loop for a given task.
 
         Args:
             task: The task description
             context: Optional context (project_id, user preferences, etc.)
+            resume_from: Optional checkpoint() of an interrupted run to continue from
+            plan: Optional plan made beforehand (e.g. one step of a DAG); skips planning
 
         Returns:
             Dict with status, result, iterations, etc.
@@ -57,24 +191,50 @@ class AgentLoop:
         # Initialize sandbox
         await self.sandbox.start()
 
+        iteration = 0
+        replans = 0
+        stalled: Optional[Dict[str, Any]] = None
+        cancelled = False
+        task_context = context
+        if context and (context.get("project_id") or context.get("user_id")):
+            self._project_scope = f"project:{context.get('project_id') or 'user:' + str(context['user_id'])}"
+
         try:
-            # === PHASE 1: PLANNING ===
-            plan = await self.planner.create_plan(task, context)
-            logger.info(f"Plan created with {len(plan['steps'])} steps")
+            consecutive_errors = 0
+            max_consecutive_errors = 3
+
+            if resume_from:
+                # === RESUME: restore plan and events, skip planning ===
+                plan = resume_from["plan"]
+                iteration = resume_from["iteration"]
+                consecutive_errors = resume_from.get("consecutive_errors", 0)
+                replans = resume_from.get("replans", 0)
+                for event in resume_from.get("events", []):
+                    self.events.add_event(event)
+
+                self.events.add_event({
+                    "type": "resume",
+                    "content": f"Resumed after restart at iteration {iteration}",
+                    "timestamp": datetime.now().isoformat()
+                })
+                logger.info(f"Resuming task at iteration {iteration}")
+            else:
+                # === PHASE 1: PLANNING ===
+                if plan is None:
+                    plan = await self.planner.create_plan(task, context)
+                    logger.info(f"Plan created with {len(plan['steps'])} steps")
 
-            # Save plan to workspace (Manus todo.md pattern)
-            await self.storage.save_file("todo.md", self.planner.format_plan(plan))
+                # Save plan to workspace (Manus todo.md pattern)
+                self._save_plan(plan)
 
-            # Initialize event stream
-            self.events.add_event({
-                "type": "task",
-                "content": task,
-                "timestamp": datetime.now().isoformat()
-            })
+                # Initialize event stream
+                self.events.add_event({
+                    "type": "task",
+                    "content": task,
+                    "timestamp": datetime.now().isoformat()
+                })
 
-            iteration = 0
-            consecutive_errors = 0
-            max_consecutive_errors = 3
+            self._mark_progress(task, task_context, plan, iteration, consecutive_errors, replans)
 
             # === PHASE 2: EXECUTION LOOP ===
             while iteration < self.max_iterations:
@@ -82,51 +242,96 @@ class AgentLoop:
                 logger.info(f"Iteration {iteration}/{self.max_iterations}")
 
                 # Build context for LLM
-                context = self._build_context(plan)
+                context = await self.context_builder.build(plan)
 
-                # Get next action from LLM (with model routing)
-                action = await self._get_next_action(context, task)
+                # Get next actions from LLM (with model routing); one turn may call several tools
+                actions = await self._get_next_actions(context, task)
+                completed = any(action.get("type") == "complete" for action in actions)
+                actions = [action for action in actions if action.get("type") != "complete"]
 
                 # Check if task is complete
-                if action.get("type") == "complete":
+                if completed and not actions:
                     logger.info("Task marked as complete by agent")
                     break
 
-                # Execute action in sandbox
-                observation = await self._execute_action(action)
+                # Execute actions in sandbox
+                outcomes = await self._execute_actions(actions)
+                self.context_builder.note_actions(actions)
 
-                # Update event stream
-                self.events.add_event({
-                    "type": "action",
-                    "content": action,
-                    "timestamp": datetime.now().isoformat()
-                })
-                self.events.add_event({
-                    "type": "observation",
-                    "content": observation,
-                    "timestamp": datetime.now().isoformat()
-                })
+                observations = [outcome["observation"] for outcome in outcomes]
+                diagnoses = [self.errors.classify(action, outcome) for action, outcome in zip(actions, outcomes)]
+
+                # Update event stream (in call order, so the LLM sees all observations together)
+                for action, observation, diagnosis in zip(actions, observations, diagnoses):
+                    self.events.add_event({
+                        "type": "action",
+                        "content": action,
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    observation_event = {
+                        "type": "observation",
+                        "content": observation,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                    if diagnosis:
+                        observation_event["error"] = diagnosis["kind"]
+                    self.events.add_event(observation_event)
 
-                # Update plan progress
-                self.planner.update_progress(action, observation)
+                    # Update plan progress
+                    self.planner.update_progress(action, observation)
 
-                # Save updated plan
-                await self.storage.save_file(
-                    "todo.md",
-                    self.planner.format_plan(plan)
-                )
+                # Save updated plan (in the background; the next prompt uses the rendered text)
+                self._save_plan(plan)
+
+                if completed:
+                    logger.info("Task marked as complete by agent")
+                    self._mark_progress(task, task_context, plan, iteration, consecutive_errors, replans)
+                    break
+
+                # Stall detection: the same turn or error keeps coming back
+                stall = self.stall_detector.observe(actions, observations, diagnoses)
+                if stall:
+                    logger.warning(f"Stall in iteration {iteration}: {stall['description']}")
+                    if replans >= self.max_replans:
+                        AGENT_STALLS.labels(stall["reason"], "stop").inc()
+                        logger.error("Agent is stuck and has no re-plans left, stopping")
+                        stalled = stall
+                        self._mark_progress(task, task_context, plan, iteration, consecutive_errors, replans)
+                        break
+
+                    # Bounded re-plan: a new approach for the remaining steps
+                    AGENT_STALLS.labels(stall["reason"], "replan").inc()
+                    replans += 1
+                    plan = await self.planner.revise_plan(plan, stall["description"])
+                    self._save_plan(plan)
+                    self.stall_detector.reset()
+                    consecutive_errors = 0
+
+                    self.events.add_event({
+                        "type": "replan",
+                        "content": f"{stall['description']}. The plan was revised; take a different approach.",
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    self._mark_progress(task, task_context, plan, iteration, consecutive_errors, replans)
+                    continue
 
                 # Error handling (Manus pattern: keep errors in context)
-                if self._is_error(observation):
+                failed = [
+                    (action, observation, diagnosis)
+                    for action, observation, diagnosis in zip(actions, observations, diagnoses)
+                    if diagnosis
+                ]
+                if failed:
+                    action, observation, diagnosis = failed[0]
                     consecutive_errors += 1
-                    logger.warning(f"Error in iteration {iteration}: {observation[:200]}")
+                    logger.warning(f"Error in iteration {iteration} ({diagnosis['kind']}): {observation[:200]}")
 
                     if consecutive_errors >= max_consecutive_errors:
                         logger.error("Too many consecutive errors, stopping")
                         break
 
-                    # Try recovery
-                    recovery = await self._handle_error(observation, action)
+                    # Try recovery (the fix goes into the next prompt)
+                    recovery = await self._handle_error(observation, action, diagnosis)
                     self.events.add_event({
                         "type": "recovery",
                         "content": recovery,
@@ -135,21 +340,38 @@ class AgentLoop:
                 else:
                     consecutive_errors = 0  # Reset on success
 
+                self._mark_progress(task, task_context, plan, iteration, consecutive_errors, replans)
+
                 # Check plan completion
                 if self.planner.is_complete(plan):
                     logger.info("All plan steps completed")
                     break
 
             # === PHASE 3: RESULT EXTRACTION ===
+            await self.bookkeeping.flush()
             result = await self._extract_result()
 
-            return {
-                "status": "completed" if iteration < self.max_iterations else "max_iterations",
+            if stalled:
+                status = "stalled"
+            else:
+                status = "completed" if iteration < self.max_iterations else "max_iterations"
+
+            outcome = {
+                "status": status,
                 "result": result,
                 "iterations": iteration,
                 "plan": plan,
+                "usage": self.usage,
                 "events": self.events.get_recent(20)
             }
+            if stalled:
+                outcome["error"] = f"Stopped after {replans} re-plan(s): {stalled['description']}"
+            return outcome
+
+        except asyncio.CancelledError:
+            logger.info(f"Agent loop cancelled at iteration {iteration}")
+            cancelled = True
+            raise
 
         except Exception as e:
             logger.error(f"Agent loop error: {e}", exc_info=True)
@@ -161,41 +383,19 @@ class AgentLoop:
             }
 
         finally:
-            # Cleanup sandbox
-            await self.sandbox.stop()
-
-    def _build_context(self, plan: Dict) -> Dict[str, Any]:
-        """
-        Build context for LLM including events, plan, and workspace state.
-        Implements Manus's context engineering best practices.
-        """
-        # Get recent events (truncate to prevent token overflow)
-        recent_events = self.events.get_recent(20)
-
-        # Get workspace files
-        workspace_files = self.sandbox.list_files()
-
-        # Get current step from plan
-        current_step = self.planner.get_current_step(plan)
+            # Finish pending writes; when cancelled, the caller checkpoints from memory instead
+            await self.bookkeeping.close(drop_pending=cancelled)
 
-        return {
-            "events": recent_events,
-            "plan": plan,
-            "current_step": current_step,
-            "workspace_files": workspace_files,
-            "iteration_count": len([e for e in recent_events if e["type"] == "action"])
-        }
+            # Cleanup sandbox (kill at once when cancelled, to free it immediately)
+            await self.sandbox.stop(force=cancelled)
 
-    async def _get_next_action(self, context: Dict, original_task: str) -> Dict[str, Any]:
+    async def _get_next_actions(self, context: Dict, original_task: str) -> List[Dict[str, Any]]:
         """
-        Get next action from LLM using multi-model routing (Abacus pattern).
+        Get the next actions from LLM using multi-model routing (Abacus pattern).
         """
         # Build system prompt (Manus-style)
         system_prompt = self._build_system_prompt()
 
-        # Build user prompt with context
-        user_prompt = self._format_context_prompt(context, original_task)
-
         # Determine task complexity for model routing
         complexity = self._estimate_complexity(context)
 
@@ -207,76 +407,154 @@ class AgentLoop:
 
         logger.info(f"Using model: {model}")
 
+        # Build user prompt with context, packed into the model's token budget
+        # (task and plan first, as a cacheable prefix)
+        user_prompt = self.context_builder.prompt_blocks(context, original_task, model)
+
         # Get response from LLM with tool calling
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
 
+        # System prompt, tools and the task/plan prefix are identical between
+        # iterations; cache them so only the new events are processed
         response = await self.llm.complete(
             messages=messages,
             tools=TOOLS,
-            model=model
+            model=model,
+            cache=True
+        )
+        self._record_usage(response.get("usage"))
+
+        return self._parse_actions(response)
+
+    def _record_usage(self, usage: Optional[Dict[str, int]]):
+        """Add one completion's token usage to the run totals and log the cache split."""
+        for kind, tokens in (usage or {}).items():
+            self.usage[kind] = self.usage.get(kind, 0) + (tokens or 0)
+
+        if usage:
+            logger.info(
+                f"Prompt tokens: {usage.get('cache_read', 0)} cached, "
+                f"{usage.get('cache_write', 0)} written to cache, {usage.get('input', 0)} uncached"
+            )
+
+    async def _execute_actions(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Execute the actions of one turn and return their outcomes in order.
+        Consecutive side-effect-free actions run concurrently (at most
+        `max_parallel_tools` at a time); all others run one by one.
+        """
+        observations: List[Dict[str, Any]] = []
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+
+        async def bounded(action: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._execute_action(action)
+
+        i = 0
+        while i < len(actions):
+            j = i
+            while j < len(actions) and is_pure(actions[j]):
+                j += 1
+
+            if j - i > 1:
+                observations.extend(await asyncio.gather(*(bounded(a) for a in actions[i:j])))
+                i = j
+            else:
+                observations.append(await self._execute_action(actions[i]))
+                i += 1
+
+        return observations
+
+    async def _execute_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute an action, serving repeated pure actions from the memo.
+        Side-effecting actions drop the task's memoized file reads.
+        """
+        action_type = action.get("type")
+        key = self.memo.key_for(action, self._task_scope, self._project_scope)
+
+        outcome = await self.memo.run(
+            key,
+            action_type,
+            lambda: self._run_action(action),
+            lambda outcome: self.errors.classify(action, outcome) is None
         )
 
-        return self._parse_action(response)
+        if not is_pure(action):
+            self.memo.invalidate_scope(self._task_scope)
+        elif outcome.get("memoized"):
+            logger.info(f"Reused memoized result for {action_type}")
 
-    async def _execute_action(self, action: Dict[str, Any]) -> str:
+        return outcome
+
+    async def _run_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute action in sandbox.
         Supports CodeAct paradigm (Python code) + traditional function calls.
+
+        Returns:
+            Outcome with the observation text and, for sandbox executions, the
+            structured result (exit_code, stderr, timed_out); "error" is set
+            when the tool itself failed
         """
         action_type = action.get("type")
 
         try:
             if action_type == "execute_python":
                 # CodeAct paradigm: Execute Python code
-                return await self.sandbox.run_python(action["code"])
+                result = await self.sandbox.run_python(action["code"])
+                return {**result, "observation": format_exec_result(result)}
 
             elif action_type == "shell_command":
-                return await self.sandbox.run_shell(action["command"])
+                result = await self.sandbox.run_shell(action["command"])
+                return {**result, "observation": format_exec_result(result, "Command executed")}
 
             elif action_type == "browser_navigate":
-                return await self.sandbox.browser_action(
+                result = await self.sandbox.browser_action(
                     url=action["url"],
                     action=action["action"],
                     selector=action.get("selector")
                 )
+                return {**result, "observation": format_exec_result(result)}
 
             elif action_type == "web_search":
-                return await self.sandbox.web_search(action["query"])
+                result = await self.sandbox.web_search(action["query"])
+                return {**result, "observation": format_exec_result(result)}
 
             elif action_type == "save_file":
                 await self.storage.save_file(action["filename"], action["content"])
-                return f"File saved: {action['filename']}"
+                return {"observation": f"File saved: {action['filename']}"}
 
             elif action_type == "read_file":
                 content = await self.storage.read_file(action["filename"])
-                return content
+                return {"observation": content}
 
             else:
-                return f"Unknown action type: {action_type}"
+                return {
+                    "observation": f"Unknown action type: {action_type}",
+                    "error": f"Unknown action type: {action_type}"
+                }
 
         except Exception as e:
-            return f"Error executing {action_type}: {str(e)}"
-
-    def _is_error(self, observation: str) -> bool:
-        """Check if observation contains an error."""
-        error_indicators = [
-            "error:",
-            "traceback",
-            "exception",
-            "failed",
-            "command not found",
-            "permission denied"
-        ]
-        return any(indicator in observation.lower() for indicator in error_indicators)
+            return {
+                "observation": f"Error executing {action_type}: {str(e)}",
+                "error": f"{type(e).__name__}: {e}"
+            }
 
-    async def _handle_error(self, observation: str, failed_action: Dict) -> str:
+    async def _handle_error(self, observation: str, failed_action: Dict, diagnosis: Dict[str, Any]) -> str:
         """
-        Handle errors by asking LLM to diagnose and suggest recovery.
+        Suggest a fix for a failed action.
+        Known errors are fixed from the local classifier; only unknown ones are
+        diagnosed by the LLM, and that answer is remembered for the same error.
         Manus pattern: Keep errors in context for learning.
         """
+        if diagnosis["fix"]:
+            ERROR_DIAGNOSES.labels(diagnosis["source"]).inc()
+            return diagnosis["fix"]
+
         recovery_prompt = f"""
         The following action failed:
         {failed_action}
@@ -291,15 +569,19 @@ class AgentLoop:
             messages=[{"role": "user", "content": recovery_prompt}],
             model=self.router.select_model("analysis", 0.5)
         )
+        ERROR_DIAGNOSES.labels("llm").inc()
 
-        return response.get("content", "Unable to diagnose error")
+        fix = response.get("content") or "Unable to diagnose error"
+        if response.get("content"):
+            self.errors.learn(diagnosis["signature"], fix)
+        return fix
 
     async def _extract_result(self) -> Dict[str, Any]:
         """
         Extract final result from workspace and event stream.
         """
         # Get all files created
-        files = self.sandbox.list_files()
+        files = await self.context_builder.workspace_files()
 
         # Get final output from events
         final_events = self.events.get_by_type("observation")[-5:]
@@ -334,14 +616,15 @@ You have access to a Ubuntu Linux sandbox with Python, Node.js, and browser auto
 
 ## Agent Loop:
 1. Analyze the current state and plan
-2. Select ONE tool/action to take next
-3. Wait for the observation (result)
+2. Select the next tool call, or several independent ones
+3. Wait for the observations (results)
 4. Update your progress
 5. Repeat until task is complete
 
 ## Rules:
 - ALWAYS respond with a tool call, never direct text
-- Execute ONE action per iteration
+- Independent actions (e.g. several web searches or file reads) can be called together in one turn; they run in parallel
+- Actions that depend on each other's results belong in separate turns
 - Check results before proceeding to next step
 - If an error occurs, diagnose it and try a different approach
 - Keep errors in context to learn from them
@@ -370,38 +653,6 @@ with open('results.txt', 'w') as f:
 
 Now complete the task step by step."""
 
-    def _format_context_prompt(self, context: Dict, task: str) -> str:
-        """Format context into prompt for LLM."""
-        recent_events = context["events"][-10:]  # Last 10 events
-
-        prompt = f"""## Task:
-{task}
-
-## Current Plan:
-{self.planner.format_plan(context['plan'])}
-
-## Current Step:
-{context['current_step']['description'] if context['current_step'] else 'Planning'}
-
-## Recent Actions:
-"""
-        for event in recent_events:
-            if event["type"] == "action":
-                prompt += f"\nAction: {event['content'].get('type', 'unknown')}"
-            elif event["type"] == "observation":
-                # Truncate long observations
-                obs = event["content"][:500]
-                prompt += f"\nResult: {obs}\n"
-
-        prompt += f"""
-
-## Workspace Files:
-{', '.join(context['workspace_files']) if context['workspace_files'] else 'None'}
-
-What is your next action?"""
-
-        return prompt
-
     def _estimate_complexity(self, context: Dict) -> float:
         """
         Estimate task complexity for model routing.
@@ -426,18 +677,20 @@ What is your next action?"""
 
         return min(complexity, 1.0)
 
-    def _parse_action(self, response: Dict) -> Dict[str, Any]:
-        """Parse LLM response into action dict."""
+    def _parse_actions(self, response: Dict) -> List[Dict[str, Any]]:
+        """Parse LLM response into action dicts, one per tool call."""
         if "tool_calls" in response and response["tool_calls"]:
-            tool_call = response["tool_calls"][0]
-            return {
-                "type": tool_call["function"]["name"],
-                **tool_call["function"]["arguments"]
-            }
+            return [
+                {
+                    "type": tool_call["function"]["name"],
+                    **tool_call["function"]["arguments"]
+                }
+                for tool_call in response["tool_calls"]
+            ]
 
         # Fallback: try to extract from content
         content = response.get("content", "")
         if "complete" in content.lower():
-            return {"type": "complete"}
+            return [{"type": "complete"}]
 
-        return {"type": "unknown", "content": content}
+        return [{"type": "unknown", "content": content}]
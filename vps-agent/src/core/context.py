@@ -0,0 +1,246 @@
+"""
+Context Builder - Incrementally maintained LLM context
+Keeps the workspace listing and the rendered prompt segments between
+iterations instead of rebuilding them from the sandbox and event stream
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from ..memory.event_stream import EventStream
+from ..tools.sandbox import DockerSandbox
+from .llm import CACHE_CONTROL
+from .planner import Planner
+from .tools_definitions import is_pure
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = "default"
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _truncate_middle(text: str, max_chars: int) -> str:
+    """Keep the head and the tail of a long text (errors usually end up at the bottom)."""
+    if len(text) <= max_chars:
+        return text
+    head = max_chars // 3
+    tail = max_chars - head
+    return f"{text[:head]}\n... [{len(text) - max_chars} chars omitted] ...\n{text[-tail:]}"
+
+
+class ContextBuilder:
+    """
+    Per-run cache of everything the LLM context is made of.
+
+    - The workspace listing (a `docker exec ls`) is fetched once and only
+      refetched after an action that could have changed files.
+    - Events are pulled from the stream by offset; each one is rendered
+      (in full and as a one-line summary) and token-counted once, when it arrives.
+    - The plan is rendered once per iteration, via refresh_plan(), and the
+      same text is used for todo.md and the prompt.
+
+    The prompt is split into a stable prefix (task and plan), which is a
+    prompt cache breakpoint, and the part that changes every iteration.
+    That part is packed into the model's token budget by priority: current
+    step, latest errors (with their suggested fix), recent events in full,
+    then older events as summaries.
+    """
+
+    def __init__(
+        self,
+        sandbox: DockerSandbox,
+        events: EventStream,
+        planner: Planner,
+        budgets: Optional[Dict[str, int]] = None,
+        window: int = 100,
+        max_observation_tokens: int = 2000,
+        max_errors: int = 2,
+    ):
+        self.sandbox = sandbox
+        self.events = events
+        self.planner = planner
+        self.budgets = budgets or {}
+        self.max_observation_chars = max_observation_tokens * 4
+        self.max_errors = max_errors
+
+        self._offset = 0
+        self._window: Deque[Dict[str, Any]] = deque(maxlen=window)
+        self._files: Optional[List[str]] = None
+        self._plan_text = ""
+
+    def invalidate_files(self):
+        """Forget the workspace listing; the next build() fetches it again."""
+        self._files = None
+
+    def note_actions(self, actions: Iterable[Dict[str, Any]]):
+        """Invalidate the workspace listing if any of the actions can write files."""
+        if not all(is_pure(action) for action in actions):
+            self.invalidate_files()
+
+    async def workspace_files(self) -> List[str]:
+        """Workspace listing, fetched off the event loop when invalidated."""
+        if self._files is None:
+            self._files = await self.sandbox.list_files()
+        return list(self._files)
+
+    def refresh_plan(self, plan: Dict) -> str:
+        """Render the plan (after it changed) and return the text."""
+        self._plan_text = self.planner.format_plan(plan)
+        return self._plan_text
+
+    def budget_for(self, model: Optional[str]) -> int:
+        """Prompt token budget of a model (first budget key contained in its name)."""
+        name = (model or "").lower()
+        for key, budget in self.budgets.items():
+            if key != DEFAULT_BUDGET and key in name:
+                return int(budget)
+        return int(self.budgets.get(DEFAULT_BUDGET, 8000))
+
+    async def build(self, plan: Dict) -> Dict[str, Any]:
+        """
+        Build context for LLM including events, plan, and workspace state.
+        Implements Manus's context engineering best practices.
+        """
+        self._sync_events()
+        if not self._plan_text:
+            self.refresh_plan(plan)
+
+        recent_events = [entry["event"] for entry in list(self._window)[-20:]]
+        return {
+            "events": recent_events,
+            "plan": plan,
+            "current_step": self.planner.get_current_step(plan),
+            "workspace_files": await self.workspace_files(),
+            "iteration_count": len([e for e in recent_events if e["type"] == "action"]),
+        }
+
+    def format_prompt(self, context: Dict, task: str, model: Optional[str] = None) -> str:
+        """Join the cached segments into the user prompt for this iteration."""
+        return "".join(block["text"] for block in self.prompt_blocks(context, task, model))
+
+    def prompt_blocks(self, context: Dict, task: str, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """User prompt as content blocks; the task and plan prefix is cacheable."""
+        prefix = self._stable_prefix(task)
+        return [
+            {"type": "text", "text": prefix, "cache_control": CACHE_CONTROL},
+            {"type": "text", "text": self._dynamic_suffix(context, self.budget_for(model) - estimate_tokens(prefix))},
+        ]
+
+    def _stable_prefix(self, task: str) -> str:
+        return f"""## Task:
+{task}
+
+## Current Plan:
+{self._plan_text}
+
+"""
+
+    def _dynamic_suffix(self, context: Dict, budget: int) -> str:
+        current_step = context["current_step"]
+        files = context["workspace_files"]
+
+        head = f"""## Current Step:
+{current_step['description'] if current_step else 'Planning'}
+
+## Recent Actions:
+"""
+        tail = f"""
+
+## Workspace Files:
+{', '.join(files) if files else 'None'}
+
+What is your next action?"""
+
+        budget -= estimate_tokens(head) + estimate_tokens(tail)
+        return head + self._pack_events(budget) + tail
+
+    def _pack_events(self, budget: int) -> str:
+        """
+        Fill `budget` tokens with event lines, by priority:
+        the latest errors in full (with their action and suggested fix),
+        recent events in full (newest first, without gaps), then older
+        events as summaries. Output stays chronological.
+        """
+        entries = list(self._window)
+        chosen: Dict[int, str] = {}
+
+        def take(index: int, kind: str) -> bool:
+            nonlocal budget
+            entry = entries[index]
+            if entry[f"{kind}_tokens"] > budget:
+                return False
+            chosen[index] = entry[kind]
+            budget -= entry[f"{kind}_tokens"]
+            return True
+
+        errors = [i for i in range(len(entries) - 1, -1, -1) if entries[i]["error"]]
+        for index in errors[:self.max_errors]:
+            if not take(index, "full"):
+                continue
+            if index > 0 and entries[index - 1]["event"]["type"] == "action":
+                take(index - 1, "full")
+
+            # The fix for the turn follows its actions and observations
+            following = index + 1
+            while following < len(entries) and entries[following]["event"]["type"] in ("action", "observation"):
+                following += 1
+            if following < len(entries) and entries[following]["event"]["type"] == "recovery":
+                take(following, "full")
+
+        index = len(entries) - 1
+        while index >= 0 and (index in chosen or take(index, "full")):
+            index -= 1
+
+        while index >= 0 and (index in chosen or take(index, "summary")):
+            index -= 1
+
+        omitted = len(entries) - len(chosen) + self._evicted()
+        lines = [f"\n({omitted} earlier events not shown)"] if omitted else []
+        lines.extend(chosen[i] for i in sorted(chosen))
+        return "".join(lines)
+
+    def _evicted(self) -> int:
+        """Events that already dropped out of the window."""
+        return max(0, self._offset - len(self._window))
+
+    def _sync_events(self):
+        """Append events added since the last call to the rendered window."""
+        new_events, self._offset = self.events.get_since(self._offset)
+        for _, event in new_events:
+            self._window.append(self._render_event(event))
+
+    def _render_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Full and summary prompt lines of an event, with token estimates."""
+        full = summary = ""
+        error = False
+
+        if event["type"] == "action":
+            full = summary = f"\nAction: {event['content'].get('type', 'unknown')}"
+        elif event["type"] == "observation":
+            observation = str(event["content"])
+            error = bool(event.get("error"))
+            full = f"\nResult: {_truncate_middle(observation, self.max_observation_chars)}\n"
+            first_line = observation.strip().split("\n", 1)[0][:120]
+            summary = f"\nResult: {first_line} ({len(observation)} chars)\n"
+        elif event["type"] == "replan":
+            full = summary = f"\nNote: {event['content']}\n"
+        elif event["type"] == "recovery":
+            fix = str(event["content"])
+            full = f"\nSuggested fix: {_truncate_middle(fix, self.max_observation_chars)}\n"
+            first_line = fix.strip().split("\n", 1)[0][:120]
+            summary = f"\nSuggested fix: {first_line}\n"
+
+        return {
+            "event": event,
+            "error": error,
+            "full": full,
+            "full_tokens": estimate_tokens(full),
+            "summary": summary,
+            "summary_tokens": estimate_tokens(summary),
+        }
@@ -0,0 +1,334 @@
+"""
+DAG Executor - Run independent plan steps in parallel sub-agents
+Steps whose dependencies are done run at the same time, each with its own
+sandbox and event stream; their output files are merged into the task workspace
+"""
+
+import asyncio
+import contextlib
+import copy
+import hashlib
+import logging
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..runtime.sandbox_pool import SandboxPool
+from .agent import AgentLoop
+
+logger = logging.getLogger(__name__)
+
+# Sub-agent workspaces live here, inside the task workspace, until merged
+STEP_DIR = ".steps"
+
+# Each agent keeps its own todo.md; the parent's holds the whole DAG
+PLAN_FILE = "todo.md"
+
+
+def plan_levels(plan: Dict[str, Any]) -> List[int]:
+    """Depth of every step in the dependency graph (0 = no dependencies)."""
+    levels: List[int] = []
+    for index, step in enumerate(plan["steps"]):
+        depends_on = step.get("depends_on", [index - 1] if index > 0 else [])
+        levels.append(1 + max((levels[d] for d in depends_on if d < index), default=-1))
+    return levels
+
+
+def has_parallel_steps(plan: Dict[str, Any]) -> bool:
+    """True if at least two steps could run at the same time."""
+    levels = plan_levels(plan)
+    return len(set(levels)) < len(levels)
+
+
+def _digest(path: Path) -> str:
+    return hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+
+def _workspace_files(root: Path) -> Dict[str, Path]:
+    """Files of a workspace by relative path, without step workspaces and todo.md."""
+    files = {}
+    for path in root.rglob("*"):
+        relative = path.relative_to(root)
+        if relative.parts[0] == STEP_DIR or relative.as_posix() == PLAN_FILE or not path.is_file():
+            continue
+        files[relative.as_posix()] = path
+    return files
+
+
+def _seed_workspace(parent: Path, step_dir: Path) -> Dict[str, str]:
+    """Copy the task workspace into a step workspace; returns the digests of the copied files."""
+    step_dir.mkdir(parents=True, exist_ok=True)
+    seeded = {}
+    for name, path in _workspace_files(parent).items():
+        target = step_dir / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(path, target)
+        seeded[name] = _digest(path)
+    return seeded
+
+
+def _merge_workspace(step_dir: Path, parent: Path, seeded: Dict[str, str], step_name: str) -> List[str]:
+    """
+    Copy the files a step created or changed into the task workspace.
+    A file that another step changed in the meantime is kept under a
+    step-specific name. Returns the merged paths.
+    """
+    merged = []
+    for name, path in _workspace_files(step_dir).items():
+        digest = _digest(path)
+        if seeded.get(name) == digest:
+            continue
+
+        target = parent / name
+        if target.exists() and _digest(target) not in (seeded.get(name), digest):
+            target = target.with_name(f"{target.stem}.{step_name}{target.suffix}")
+            logger.warning(f"{name} was also changed by another step; keeping {step_name}'s version as {target.name}")
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(path, target)
+        merged.append(target.relative_to(parent).as_posix())
+    return merged
+
+
+class DagExecutor:
+    """
+    Runs a task whose plan steps declare dependencies ("depends_on").
+
+    The parent agent makes the plan. A plan without independent steps goes
+    to the parent agent unchanged (one loop, with checkpoints). Otherwise
+    every step is run by a sub-agent from `spawn(name, workspace_dir)` on a
+    one-step plan, as soon as the steps it depends on have completed, at most
+    `max_parallel` at a time. A sub-agent works on a copy of the task
+    workspace; the files it creates or changes are merged back when it
+    finishes. Steps that depend on a failed step are not run.
+
+    With a `sandbox_pool` every loop that starts a sandbox (the parent agent
+    on a sequential plan, or each sub-agent) holds one of its slots, so
+    parallel steps count against the same container limit as whole tasks.
+
+    DAG runs are not checkpointed per iteration: after a restart they start over.
+    """
+
+    def __init__(
+        self,
+        agent: AgentLoop,
+        spawn: Callable[[str, str], AgentLoop],
+        max_parallel: int = 3,
+        sandbox_pool: Optional[SandboxPool] = None,
+    ):
+        self.agent = agent
+        self.spawn = spawn
+        self.max_parallel = max_parallel
+        self.sandbox_pool = sandbox_pool
+
+    async def run(self, task: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Plan the task and run it, fanning out independent steps."""
+        plan = await self.agent.planner.create_plan(task, context)
+
+        if self.max_parallel <= 1 or not has_parallel_steps(plan):
+            async with self._sandbox_slot():
+                return await self.agent.run(task, context, plan=plan)
+
+        logger.info(
+            f"Running {len(plan['steps'])} steps as a DAG of depth {max(plan_levels(plan)) + 1}, "
+            f"up to {self.max_parallel} in parallel"
+        )
+        return await self._run_dag(task, context, plan)
+
+    async def _run_dag(self, task: str, context: Optional[Dict[str, Any]], plan: Dict[str, Any]) -> Dict[str, Any]:
+        workspace = Path(self.agent.storage.workspace_dir)
+        events = self.agent.events
+        events.add_event({
+            "type": "task",
+            "content": task,
+            "timestamp": datetime.now().isoformat()
+        })
+        await self._save_plan(plan)
+
+        results: Dict[int, Dict[str, Any]] = {}
+        running: Dict[asyncio.Task, int] = {}
+        try:
+            while True:
+                self._skip_blocked(plan)
+                for index in self._ready_steps(plan):
+                    if len(running) >= self.max_parallel:
+                        break
+                    plan["steps"][index]["started_at"] = datetime.now().isoformat()
+                    running[asyncio.create_task(self._run_step(task, context, plan, index))] = index
+                    self._add_subtask_event(index, "started", description=plan["steps"][index]["description"])
+
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    index = running.pop(finished)
+                    result, seeded = finished.result()
+                    results[index] = result
+                    await self._finish_step(plan, index, result, seeded, workspace)
+        finally:
+            for pending in running:
+                pending.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        completed = sum(1 for step in plan["steps"] if step["status"] == "completed")
+        if completed == len(plan["steps"]):
+            status = "completed"
+        else:
+            status = "partial" if completed else "failed"
+
+        usage: Dict[str, int] = {}
+        for result in results.values():
+            for kind, tokens in (result.get("usage") or {}).items():
+                usage[kind] = usage.get(kind, 0) + (tokens or 0)
+
+        return {
+            "status": status,
+            "result": await self._collect_result(workspace, results),
+            "iterations": sum(result.get("iterations") or 0 for result in results.values()),
+            "plan": plan,
+            "usage": usage,
+            "subtasks": [
+                {"step": index + 1, "status": result.get("status"), "iterations": result.get("iterations")}
+                for index, result in sorted(results.items())
+            ],
+            "events": events.get_recent(20)
+        }
+
+    def _ready_steps(self, plan: Dict[str, Any]) -> List[int]:
+        """Steps that were not started yet and whose dependencies have completed."""
+        steps = plan["steps"]
+        return [
+            index for index, step in enumerate(steps)
+            if step["status"] == "pending" and not step["started_at"]
+            and all(steps[d]["status"] == "completed" for d in step.get("depends_on", []))
+        ]
+
+    def _skip_blocked(self, plan: Dict[str, Any]):
+        """Fail the steps that depend on a failed step (dependencies always come earlier)."""
+        steps = plan["steps"]
+        for index, step in enumerate(steps):
+            if step["status"] != "pending" or step["started_at"]:
+                continue
+            failed = [d for d in step.get("depends_on", []) if steps[d]["status"] == "failed"]
+            if failed:
+                self.agent.planner.mark_step_failed(plan, index, f"Skipped, step {failed[0] + 1} failed")
+                self._add_subtask_event(index, "skipped")
+
+    async def _run_step(
+        self,
+        task: str,
+        context: Optional[Dict[str, Any]],
+        plan: Dict[str, Any],
+        index: int,
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Run one step in a sub-agent; returns its result and the digests of its seeded files."""
+        name = f"step-{index + 1}"
+        step_dir = Path(self.agent.storage.workspace_dir) / STEP_DIR / name
+        step = plan["steps"][index]
+
+        try:
+            seeded = await asyncio.to_thread(_seed_workspace, Path(self.agent.storage.workspace_dir), step_dir)
+            step_plan = {
+                "task": step["description"],
+                "steps": [{**copy.deepcopy(step), "depends_on": []}],
+                "created_at": datetime.now().isoformat(),
+                "status": "active"
+            }
+
+            async with self._sandbox_slot():
+                agent = self.spawn(name, str(step_dir))
+                result = await agent.run(self._step_task(task, plan, index), context, plan=step_plan)
+            return result, seeded
+
+        except Exception as e:
+            logger.error(f"Step {index + 1} failed to run: {e}", exc_info=True)
+            return {"status": "failed", "error": str(e), "iterations": 0}, {}
+
+    def _sandbox_slot(self):
+        return self.sandbox_pool.slot() if self.sandbox_pool else contextlib.nullcontext()
+
+    def _step_task(self, task: str, plan: Dict[str, Any], index: int) -> str:
+        """Task description for the sub-agent of one step."""
+        steps = plan["steps"]
+        text = f"""{steps[index]['description']}
+
+This is step {index + 1} of {len(steps)} of the task: {task}
+Work only on this step."""
+
+        earlier = steps[index].get("depends_on", [])
+        if earlier:
+            text += "\n\nCompleted before this step (their files are in /workspace):\n"
+            text += "\n".join(f"- {steps[d]['description']}" for d in earlier)
+
+        text += "\n\nSave your results to files in /workspace; they are passed on to the next steps."
+        return text
+
+    async def _finish_step(
+        self,
+        plan: Dict[str, Any],
+        index: int,
+        result: Dict[str, Any],
+        seeded: Dict[str, str],
+        workspace: Path,
+    ):
+        """Merge a finished step's files, update the plan and clean up its workspace."""
+        name = f"step-{index + 1}"
+        step_dir = workspace / STEP_DIR / name
+
+        merged: List[str] = []
+        if step_dir.exists():
+            try:
+                merged = await asyncio.to_thread(_merge_workspace, step_dir, workspace, seeded, name)
+            except OSError as e:
+                logger.error(f"Could not merge the files of {name}: {e}")
+                result = {**result, "status": "failed", "error": f"Merging files failed: {e}"}
+            await asyncio.to_thread(shutil.rmtree, step_dir, True)
+
+        if result.get("status") == "completed":
+            summary = f"Files: {', '.join(merged[:10])}" if merged else "Completed"
+            self.agent.planner.mark_step_complete(plan, index, summary)
+        else:
+            self.agent.planner.mark_step_failed(plan, index, result.get("error") or result.get("status", "failed"))
+
+        logger.info(f"Step {index + 1} finished: {result.get('status')} ({len(merged)} files merged)")
+        self._add_subtask_event(index, result.get("status"), iterations=result.get("iterations"), files=merged)
+        await self._save_plan(plan)
+
+    async def _save_plan(self, plan: Dict[str, Any]):
+        try:
+            await self.agent.storage.save_file(PLAN_FILE, self.agent.planner.format_plan(plan))
+        except OSError as e:
+            logger.warning(f"Could not write {PLAN_FILE}: {e}")
+
+    def _add_subtask_event(self, index: int, status: str, **details):
+        self.agent.events.add_event({
+            "type": "subtask",
+            "content": {"step": index + 1, "status": status, **details},
+            "timestamp": datetime.now().isoformat()
+        })
+
+    async def _collect_result(self, workspace: Path, results: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+        """Files of the merged workspace and the last observations of every step."""
+        files = await asyncio.to_thread(lambda: list(_workspace_files(workspace)))
+        if (workspace / PLAN_FILE).exists():
+            files.append(PLAN_FILE)
+        files.sort()
+
+        result_data = {}
+        for filename in files:
+            if filename.endswith(('.json', '.md', '.txt', '.csv')):
+                result_data[filename] = await self.agent.storage.read_file(filename)
+
+        final_observations = [
+            observation
+            for _, result in sorted(results.items())
+            for observation in ((result.get("result") or {}).get("final_observations") or [])[-1:]
+        ]
+        return {
+            "files": files,
+            "result_data": result_data,
+            "final_observations": final_observations
+        }
@@ -0,0 +1,162 @@
+"""
+Error Classifier - Local diagnosis of failed agent actions
+Recognizes common failures from structured sandbox results and suggests a fix
+without an LLM call; fixes found by LLM diagnosis are remembered per error signature
+"""
+
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Last line of a Python traceback: "requests.exceptions.ReadTimeout: ..." (module path dropped)
+_EXCEPTION_LINE = re.compile(r"^(?:[a-z_]\w*\.)*([A-Z]\w*)(?::\s*(.*))?$")
+
+# Exception-like line in other output: the name must look like an exception
+_ERROR_LINE = re.compile(r"^(?:[a-z_]\w*\.)*(\w+(?:Error|Exception)):\s*(.*)$")
+
+# (kind, message pattern, fix); the fix may use the pattern's groups
+KNOWN_FIXES: List[Tuple[str, str, str]] = [
+    ("ModuleNotFoundError", r"No module named '([\w.]+)'",
+     "Install the module first with shell_command `pip install {0}`, then run the code again."),
+    ("ImportError", r"",
+     "Check the import name and install the package with shell_command `pip install <package>`."),
+    ("FileNotFoundError", r"",
+     "The file does not exist. Files live in /workspace; check the name with shell_command `ls /workspace`."),
+    ("PermissionError", r"",
+     "Only /workspace is writable; write files there."),
+    ("SyntaxError", r"",
+     "Fix the syntax error at the reported line and send the complete code again."),
+    ("IndentationError", r"",
+     "Fix the indentation at the reported line and send the complete code again."),
+    ("NameError", r"name '(\w+)' is not defined",
+     "`{0}` is not defined. Every execute_python call runs in a fresh interpreter: "
+     "define or import everything you use in the same call, or load it from a file."),
+    ("KeyError", r"",
+     "The key is missing. Print the available keys before accessing them."),
+    ("IndexError", r"",
+     "The index is out of range. Print the length of the sequence before indexing it."),
+    ("AttributeError", r"'NoneType' object",
+     "A value was None (e.g. an element that was not found). Check for None before using it."),
+    ("JSONDecodeError", r"",
+     "The response was not valid JSON. Print the raw text first to see what was returned."),
+    ("ConnectionError", r"",
+     "The network request failed. Retry once, then try another URL or source."),
+    ("Timeout", r"",
+     "The network request timed out. Retry once with a timeout, or use another source."),
+    ("command_not_found", r"",
+     "The command is not installed in the sandbox. Install it or do the same in Python."),
+    ("timeout", r"",
+     "The command hit the sandbox time limit. Do less work per call (smaller batches, "
+     "request timeouts) or split it over several steps."),
+    ("killed", r"",
+     "The process was killed, most likely out of memory. Process the data in smaller chunks."),
+    ("browser", r"",
+     "The browser action failed. Check the URL and selector, or fetch the page with requests instead."),
+]
+
+
+class ErrorClassifier:
+    """
+    Rule-based classifier for action outcomes.
+
+    classify() decides from the structured result (exit code, stderr,
+    timeout flag) whether an action failed and what kind of error it was,
+    and attaches a known fix when one exists. Fixes from LLM diagnosis are
+    stored per error signature with learn(); the classifier can be shared
+    between runs, so later tasks reuse them.
+    """
+
+    def __init__(self, max_learned: int = 500):
+        self.max_learned = max_learned
+        self._rules = [(kind, re.compile(pattern), fix) for kind, pattern, fix in KNOWN_FIXES]
+        self._learned: "OrderedDict[str, str]" = OrderedDict()
+
+    def classify(self, action: Dict[str, Any], outcome: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Classify the outcome of one action.
+
+        Returns:
+            None if the action succeeded, otherwise
+            {kind, message, signature, fix (None if unknown), source ("rule", "learned" or None)}
+        """
+        kind, message = self._detect(outcome)
+        if kind is None:
+            return None
+
+        signature = self.signature(action.get("type", "unknown"), kind, message)
+        fix, source = self._rule_fix(kind, message), "rule"
+        if fix is None:
+            fix, source = self._learned.get(signature), "learned"
+            if fix is not None:
+                self._learned.move_to_end(signature)
+
+        return {
+            "kind": kind,
+            "message": message,
+            "signature": signature,
+            "fix": fix,
+            "source": source if fix is not None else None,
+        }
+
+    def learn(self, signature: str, fix: str):
+        """Remember a fix (e.g. from LLM diagnosis) for an error signature."""
+        self._learned[signature] = fix
+        self._learned.move_to_end(signature)
+        while len(self._learned) > self.max_learned:
+            self._learned.popitem(last=False)
+
+    @staticmethod
+    def signature(action_type: str, kind: str, message: str) -> str:
+        """Error identity with volatile parts (numbers, quoted values, paths) removed."""
+        message = re.sub(r"'[^']*'|\"[^\"]*\"", "<v>", message)
+        message = re.sub(r"(/[\w.\-]+)+", "<path>", message)
+        message = re.sub(r"\d+", "<n>", message)
+        return f"{action_type}:{kind}:{message[:200]}"
+
+    def _detect(self, outcome: Dict[str, Any]) -> Tuple[Optional[str], str]:
+        """Error kind and message of an outcome, or (None, "") if it succeeded."""
+        if outcome.get("error"):
+            exception = _EXCEPTION_LINE.match(outcome["error"].strip())
+            if exception and exception.group(2) is not None:
+                return exception.group(1), exception.group(2)
+            return "tool_error", outcome["error"]
+
+        if outcome.get("timed_out"):
+            return "timeout", f"Timed out after {outcome.get('timeout')}s"
+
+        exit_code = outcome.get("exit_code")
+        if exit_code is None or exit_code == 0:
+            return None, ""
+
+        stderr = (outcome.get("stderr") or "").strip()
+        if exit_code == 127 or "command not found" in stderr:
+            return "command_not_found", self._last_line(stderr)
+        if exit_code == 137 and not stderr:
+            return "killed", "Process killed (exit code 137)"
+        if stderr.startswith("Browser error:"):
+            return "browser", self._last_line(stderr)
+
+        pattern = _EXCEPTION_LINE if "Traceback (most recent call last)" in stderr else _ERROR_LINE
+        for line in reversed(stderr.splitlines()):
+            exception = pattern.match(line.strip())
+            if exception:
+                return exception.group(1), exception.group(2) or ""
+
+        return "exit_code", self._last_line(stderr) or f"Exit code {exit_code}"
+
+    def _rule_fix(self, kind: str, message: str) -> Optional[str]:
+        for rule_kind, pattern, fix in self._rules:
+            if rule_kind != kind and not kind.endswith(rule_kind):
+                continue
+            match = pattern.search(message)
+            if match:
+                return fix.format(*match.groups())
+        return None
+
+    @staticmethod
+    def _last_line(text: str) -> str:
+        lines = [line for line in text.splitlines() if line.strip()]
+        return lines[-1].strip() if lines else ""
@@ -4,13 +4,19 @@ Supports Claude (Anthropic) and OpenAI with multi-model routing (Abacus pattern)
 """
 
 import logging
+import time
 from abc import ABC, abstractmethod
 from typing import Dict, List, Optional, Any
 from anthropic import AsyncAnthropic
 from openai import AsyncOpenAI
 
+from ..runtime.metrics import LLM_LATENCY, LLM_TOKENS
+
 logger = logging.getLogger(__name__)
 
+# Anthropic cache breakpoint; everything up to and including the marked block is cached
+CACHE_CONTROL = {"type": "ephemeral"}
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
@@ -26,6 +32,64 @@ class LLMProvider(ABC):
         """Generate completion with optional tool calling."""
         pass
 
+    def get_rate_limits(self) -> Dict[str, Any]:
+        """Get the last rate-limit headroom reported by the provider API."""
+        return getattr(self, "rate_limits", {})
+
+
+def _parse_rate_limits(headers, names: Dict[str, str]) -> Dict[str, Any]:
+    """Extract numeric rate-limit values from response headers."""
+    limits = {}
+    for key, header in names.items():
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            limits[key] = int(value)
+        except ValueError:
+            limits[key] = value
+    if limits:
+        limits["updated_at"] = time.time()
+    return limits
+
+
+def _record_llm_metrics(provider: str, model: str, started: float, outcome: str, usage: Optional[Dict] = None):
+    """Record latency and token usage of one completion."""
+    LLM_LATENCY.labels(provider, model, outcome).observe(time.perf_counter() - started)
+    for kind, tokens in (usage or {}).items():
+        if tokens:
+            LLM_TOKENS.labels(provider, model, kind).inc(tokens)
+
+
+def _claude_tools(tools: Optional[List[Dict]], cache: bool) -> List[Dict]:
+    """Convert OpenAI-format tool definitions to Anthropic's; mark the last one cacheable."""
+    converted = []
+    for tool in tools or []:
+        if tool.get("type") == "function":
+            function = tool["function"]
+            tool = {
+                "name": function["name"],
+                "description": function.get("description", ""),
+                "input_schema": function.get("parameters", {"type": "object", "properties": {}}),
+            }
+        converted.append(dict(tool))
+
+    if cache and converted:
+        converted[-1]["cache_control"] = CACHE_CONTROL
+    return converted
+
+
+def _flatten_content(messages: List[Dict]) -> List[Dict]:
+    """Join text content blocks (with cache breakpoints) into plain strings."""
+    flattened = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = "".join(block.get("text", "") for block in content)
+            message = {**message, "content": content}
+        flattened.append(message)
+    return flattened
+
 
 class ClaudeProvider(LLMProvider):
     """Anthropic Claude provider."""
@@ -33,6 +97,7 @@ class ClaudeProvider(LLMProvider):
     def __init__(self, api_key: str, default_model: str = "claude-opus-4-20250514"):
         self.client = AsyncAnthropic(api_key=api_key)
         self.default_model = default_model
+        self.rate_limits: Dict[str, Any] = {}
 
     async def complete(
         self,
@@ -41,8 +106,16 @@ class ClaudeProvider(LLMProvider):
         model: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
-        """Generate completion using Claude."""
+        """
+        Generate completion using Claude.
+
+        With cache=True the system prompt and the tool definitions are cache
+        breakpoints; messages may add their own as content blocks with
+        "cache_control". Usage then reports cache_read and cache_write tokens
+        next to the uncached input tokens.
+        """
         model = model or self.default_model
+        cache = kwargs.get("cache", False)
 
         # Separate system message if present
         system_msg = None
@@ -52,20 +125,40 @@ class ClaudeProvider(LLMProvider):
             system_msg = messages[0]["content"]
             user_messages = messages[1:]
 
+            if cache and isinstance(system_msg, str):
+                system_msg = [{"type": "text", "text": system_msg, "cache_control": CACHE_CONTROL}]
+
+        started = time.perf_counter()
         try:
-            response = await self.client.messages.create(
+            raw_response = await self.client.messages.with_raw_response.create(
                 model=model,
                 messages=user_messages,
                 system=system_msg,
-                tools=tools if tools else [],
+                tools=_claude_tools(tools, cache),
                 max_tokens=kwargs.get("max_tokens", 4096),
                 temperature=kwargs.get("temperature", 0.7)
             )
+            response = raw_response.parse()
+
+            self.rate_limits = _parse_rate_limits(raw_response.headers, {
+                "requests_limit": "anthropic-ratelimit-requests-limit",
+                "requests_remaining": "anthropic-ratelimit-requests-remaining",
+                "requests_reset": "anthropic-ratelimit-requests-reset",
+                "tokens_limit": "anthropic-ratelimit-tokens-limit",
+                "tokens_remaining": "anthropic-ratelimit-tokens-remaining",
+                "tokens_reset": "anthropic-ratelimit-tokens-reset",
+            }) or self.rate_limits
 
             # Parse response
             result = {
                 "content": "",
-                "tool_calls": []
+                "tool_calls": [],
+                "usage": {
+                    "input": response.usage.input_tokens,
+                    "output": response.usage.output_tokens,
+                    "cache_read": getattr(response.usage, "cache_read_input_tokens", None) or 0,
+                    "cache_write": getattr(response.usage, "cache_creation_input_tokens", None) or 0
+                }
             }
 
             for content_block in response.content:
@@ -84,9 +177,11 @@ class ClaudeProvider(LLMProvider):
             if result["tool_calls"]:
                 logger.info(f"Tool calls: {[tc['function']['name'] for tc in result['tool_calls']]}")
 
+            _record_llm_metrics("claude", model, started, "ok", result["usage"])
             return result
 
         except Exception as e:
+            _record_llm_metrics("claude", model, started, "error")
             logger.error(f"Claude API error: {e}")
             raise
 
@@ -97,6 +192,7 @@ class OpenAIProvider(LLMProvider):
     def __init__(self, api_key: str, default_model: str = "gpt-4-turbo-preview"):
         self.client = AsyncOpenAI(api_key=api_key)
         self.default_model = default_model
+        self.rate_limits: Dict[str, Any] = {}
 
     async def complete(
         self,
@@ -105,13 +201,18 @@ class OpenAIProvider(LLMProvider):
         model: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
-        """Generate completion using OpenAI."""
+        """
+        Generate completion using OpenAI.
+        OpenAI caches prompt prefixes automatically; cache breakpoints are
+        dropped and the cached part of the prompt is reported as cache_read.
+        """
         model = model or self.default_model
 
+        started = time.perf_counter()
         try:
             completion_kwargs = {
                 "model": model,
-                "messages": messages,
+                "messages": _flatten_content(messages),
                 "temperature": kwargs.get("temperature", 0.7),
                 "max_tokens": kwargs.get("max_tokens", 4096)
             }
@@ -120,13 +221,31 @@ class OpenAIProvider(LLMProvider):
                 completion_kwargs["tools"] = tools
                 completion_kwargs["tool_choice"] = "auto"
 
-            response = await self.client.chat.completions.create(**completion_kwargs)
+            raw_response = await self.client.chat.completions.with_raw_response.create(**completion_kwargs)
+            response = raw_response.parse()
+
+            self.rate_limits = _parse_rate_limits(raw_response.headers, {
+                "requests_limit": "x-ratelimit-limit-requests",
+                "requests_remaining": "x-ratelimit-remaining-requests",
+                "requests_reset": "x-ratelimit-reset-requests",
+                "tokens_limit": "x-ratelimit-limit-tokens",
+                "tokens_remaining": "x-ratelimit-remaining-tokens",
+                "tokens_reset": "x-ratelimit-reset-tokens",
+            }) or self.rate_limits
 
             message = response.choices[0].message
 
+            details = getattr(response.usage, "prompt_tokens_details", None) if response.usage else None
+            cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+
             result = {
                 "content": message.content or "",
-                "tool_calls": []
+                "tool_calls": [],
+                "usage": {
+                    "input": (response.usage.prompt_tokens - cached) if response.usage else 0,
+                    "output": response.usage.completion_tokens if response.usage else 0,
+                    "cache_read": cached
+                }
             }
 
             if message.tool_calls:
@@ -143,9 +262,11 @@ class OpenAIProvider(LLMProvider):
             if result["tool_calls"]:
                 logger.info(f"Tool calls: {[tc['function']['name'] for tc in result['tool_calls']]}")
 
+            _record_llm_metrics("openai", model, started, "ok", result["usage"])
             return result
 
         except Exception as e:
+            _record_llm_metrics("openai", model, started, "error")
             logger.error(f"OpenAI API error: {e}")
             raise
 
@@ -0,0 +1,130 @@
+"""
+Action Memo - Reuse results of repeated read-only agent actions
+Identical web searches, page fetches and file reads within a task, and across
+tasks of the same project, are answered from memory instead of the sandbox
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from ..runtime.metrics import ACTION_MEMO_LOOKUPS
+from .tools_definitions import TOOL_POLICIES, is_pure
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_arguments(action: Dict[str, Any]) -> Dict[str, Any]:
+    """Arguments of an action with insignificant differences removed."""
+    arguments = {}
+    for name, value in action.items():
+        if name == "type" or value is None:
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.split())
+        arguments[name] = value
+
+    if action.get("type") == "web_search" and "query" in arguments:
+        arguments["query"] = arguments["query"].lower()
+    if "url" in arguments:
+        parts = urlsplit(arguments["url"])
+        arguments["url"] = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+    return arguments
+
+
+class ActionMemo:
+    """
+    In-memory TTL store of action outcomes, shared by all agent runs.
+
+    Only pure actions (see TOOL_POLICIES) are memoized. Keys cover the scope
+    (task or project), the tool and the normalized arguments. Concurrent
+    identical calls share one execution.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 1000):
+        self.ttls = ttls or {}
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def ttl(self, tool: str) -> float:
+        """TTL of a tool's results (configured override, else the policy default)."""
+        return float(self.ttls.get(tool, TOOL_POLICIES.get(tool, {}).get("ttl", 0)))
+
+    def key_for(self, action: Dict[str, Any], task_scope: str, project_scope: str) -> Optional[str]:
+        """Memo key of an action, or None if it must not be memoized."""
+        tool = action.get("type")
+        if not is_pure(action) or self.ttl(tool) <= 0:
+            return None
+
+        scope = project_scope if TOOL_POLICIES[tool].get("scope") == "project" else task_scope
+        arguments = json.dumps(normalize_arguments(action), sort_keys=True, default=str)
+        return f"{scope}|{tool}|{arguments}"
+
+    async def run(
+        self,
+        key: Optional[str],
+        tool: str,
+        execute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool],
+    ) -> Dict[str, Any]:
+        """
+        Return the memoized outcome for `key`, or execute and store it.
+
+        Args:
+            key: Memo key from key_for() (None executes without memoization)
+            tool: Tool name (for TTL and metrics)
+            execute: Runs the action and returns its outcome
+            cacheable: Whether an outcome may be stored (failures are not)
+        """
+        if key is None:
+            return await execute()
+
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry["expires_at"]:
+            self._entries.move_to_end(key)
+            ACTION_MEMO_LOOKUPS.labels(tool, "hit").inc()
+            return {**copy.deepcopy(entry["outcome"]), "memoized": True}
+
+        if key in self._inflight:
+            ACTION_MEMO_LOOKUPS.labels(tool, "shared").inc()
+            outcome = await asyncio.shield(self._inflight[key])
+            if outcome is None:
+                # The shared execution raised or was cancelled; run it ourselves
+                return await execute()
+            return {**copy.deepcopy(outcome), "memoized": True}
+
+        ACTION_MEMO_LOOKUPS.labels(tool, "miss").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        outcome = None
+        try:
+            outcome = await execute()
+        finally:
+            del self._inflight[key]
+            future.set_result(outcome)
+
+        if cacheable(outcome):
+            self._entries[key] = {"outcome": copy.deepcopy(outcome), "expires_at": time.monotonic() + self.ttl(tool)}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return outcome
+
+    def invalidate_scope(self, scope: str):
+        """Drop all entries of a scope (e.g. a task's file reads after it wrote files)."""
+        prefix = f"{scope}|"
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get memo statistics."""
+        return {"entries": len(self._entries), "in_flight": len(self._inflight)}
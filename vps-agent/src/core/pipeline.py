@@ -0,0 +1,73 @@
+"""
+Bookkeeping Pipeline - Run an agent's non-critical writes in the background
+todo.md updates and checkpoint saves no longer delay the next LLM call
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class BookkeepingPipeline:
+    """
+    Background worker for one agent run.
+
+    Jobs run one at a time, in submission order. A job submitted under a key
+    that still has a pending job replaces it, so a slow disk never builds up
+    a backlog of outdated todo.md writes or checkpoints. Failures are logged
+    and do not stop the pipeline.
+    """
+
+    def __init__(self):
+        self._pending: "OrderedDict[str, Job]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, key: str, job: Job):
+        """Queue a job; replaces a pending job with the same key."""
+        self._pending[key] = job
+        self._idle.clear()
+        self._wakeup.set()
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def flush(self):
+        """Wait until every job submitted so far has finished."""
+        if self._worker is not None and not self._worker.done():
+            await self._idle.wait()
+
+    async def close(self, drop_pending: bool = False):
+        """
+        Stop the worker after a flush, or right after the running job when
+        `drop_pending` is set (the job itself is never interrupted).
+        """
+        if drop_pending:
+            self._pending.clear()
+        try:
+            await asyncio.shield(self.flush())
+        finally:
+            if self._worker is not None:
+                self._worker.cancel()
+                self._worker = None
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._pending:
+                key, job = self._pending.popitem(last=False)
+                try:
+                    await job()
+                except Exception as e:
+                    logger.warning(f"Bookkeeping job {key} failed: {e}")
+
+            self._idle.set()
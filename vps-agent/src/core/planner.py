@@ -3,12 +3,19 @@ Planner Module - Manus.im todo.md pattern
 Breaks tasks into numbered steps and tracks progress
 """
 
+import asyncio
+import copy
 import logging
-from typing import Dict, List, Optional, Any
+import re
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Dependency note at the end of a step: "(after: 1, 3)" or "(after: none)"
+_NUMBERED_STEP = re.compile(r"^\d+\s*[.)]\s*(.*)$")
+_DEPENDENCIES = re.compile(r"\s*\((?:after|depends on)\s*:?\s*([^)]*)\)\s*$", re.IGNORECASE)
+
 
 class Planner:
     """
@@ -48,6 +55,53 @@ class Planner:
 
         return plan
 
+    async def revise_plan(self, plan: Dict[str, Any], problem: str) -> Dict[str, Any]:
+        """
+        Re-plan the unfinished part of a plan after the agent got stuck.
+
+        Args:
+            plan: Current plan (completed steps are kept)
+            problem: What went wrong, e.g. the repeated action or error
+
+        Returns:
+            New plan dict: the completed steps followed by the new steps
+        """
+        logger.info(f"Revising plan: {problem[:200]}")
+
+        done = [step for step in plan["steps"] if step["status"] == "completed"]
+        prompt = f"""The agent got stuck while working on this task:
+
+{plan['task']}
+
+Current plan:
+{self.format_plan(plan)}
+Problem: {problem}
+
+Write a new plan for the remaining work that avoids this problem
+(a different approach, tool or data source). Do not repeat completed steps.
+
+Format your response as a numbered list:
+1. [Step description]
+2. [Step description]
+...
+
+Output ONLY the numbered list, no additional text.
+"""
+
+        response = await self.llm.complete(
+            messages=[{"role": "user", "content": prompt}],
+            model="claude-opus-4-20250514"
+        )
+
+        revised = self._parse_plan_response(response["content"], plan["task"])
+        for step in revised["steps"]:
+            step["depends_on"] = [index + len(done) for index in step["depends_on"]]
+        revised["steps"] = done + revised["steps"]
+        revised["revision"] = plan.get("revision", 0) + 1
+
+        logger.info(f"Plan revised with {len(revised['steps']) - len(done)} new steps")
+        return revised
+
     def _build_planning_prompt(self, task: str, context: Optional[Dict]) -> str:
         """Build prompt for plan generation."""
         prompt = f"""Create a detailed, step-by-step plan to accomplish this task:
@@ -70,6 +124,11 @@ Format your response as a numbered list:
 2. [Step description]
 ...
 
+Steps run in order by default. If a step does not need the result of the step
+right before it, end its line with the earlier steps it does need, e.g.
+"(after: 1, 2)", or "(after: none)" if it can start right away. Independent
+steps (such as researching each competitor) are then worked on in parallel.
+
 Be thorough but concise. Focus on the "what" not the "how" (the agent will figure out how).
 
 Output ONLY the numbered list, no additional text.
@@ -86,10 +145,10 @@ Output ONLY the numbered list, no additional text.
             if not line:
                 continue
 
-            # Parse numbered steps (1., 2., etc.)
-            if line[0].isdigit() and ('.' in line or ')' in line):
-                # Remove number prefix
-                step_text = line.split('.', 1)[-1].split(')', 1)[-1].strip()
+            # Parse numbered steps (1., 2., etc.) and remove the number prefix
+            numbered = _NUMBERED_STEP.match(line)
+            if numbered:
+                step_text, depends_on = self._parse_dependencies(numbered.group(1), len(steps))
 
                 # Infer step type from content
                 step_type = self._infer_step_type(step_text)
@@ -100,7 +159,8 @@ Output ONLY the numbered list, no additional text.
                     "type": step_type,
                     "started_at": None,
                     "completed_at": None,
-                    "observation": None
+                    "observation": None,
+                    "depends_on": depends_on
                 })
 
         return {
@@ -110,6 +170,19 @@ Output ONLY the numbered list, no additional text.
             "status": "active"
         }
 
+    @staticmethod
+    def _parse_dependencies(step_text: str, index: int) -> Tuple[str, List[int]]:
+        """
+        Split a "(after: ...)" note off a step. Returns the text and the
+        (0-based) earlier steps it depends on; without a note, the previous step.
+        """
+        match = _DEPENDENCIES.search(step_text)
+        if not match:
+            return step_text, [index - 1] if index > 0 else []
+
+        depends_on = sorted({int(n) - 1 for n in re.findall(r"\d+", match.group(1)) if 0 < int(n) <= index})
+        return step_text[:match.start()].strip(), depends_on
+
     def _infer_step_type(self, step_text: str) -> str:
         """Infer step type from description."""
         text_lower = step_text.lower()
@@ -147,7 +220,13 @@ Output ONLY the numbered list, no additional text.
 
         for i, step in enumerate(plan['steps'], 1):
             status_icon = "[x]" if step['status'] == 'completed' else "[ ]"
-            output += f"{i}. {status_icon} {step['description']}\n"
+            output += f"{i}. {status_icon} {step['description']}"
+
+            # Only non-sequential dependencies are worth showing
+            depends_on = step.get('depends_on', [i - 2] if i > 1 else [])
+            if depends_on != ([i - 2] if i > 1 else []):
+                output += f" (after: {', '.join(str(d + 1) for d in depends_on) or 'none'})"
+            output += "\n"
 
             if step['observation']:
                 output += f"   → {step['observation'][:200]}...\n"
@@ -194,3 +273,151 @@ Output ONLY the numbered list, no additional text.
             plan['steps'][step_index]['status'] = 'failed'
             plan['steps'][step_index]['completed_at'] = datetime.now().isoformat()
             plan['steps'][step_index]['observation'] = f"ERROR: {error}"
+
+
+def _split_template(a: str, b: str, min_shared: float = 0.6) -> Optional[Tuple[str, str]]:
+    """
+    Find the shared prefix and suffix (on word boundaries) of two prompts.
+    Returns None if they do not look like the same template.
+    """
+    words_a, words_b = a.split(" "), b.split(" ")
+
+    prefix = 0
+    while prefix < min(len(words_a), len(words_b)) and words_a[prefix] == words_b[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while (
+        suffix < min(len(words_a), len(words_b)) - prefix
+        and words_a[-1 - suffix] == words_b[-1 - suffix]
+    ):
+        suffix += 1
+
+    shared = prefix + suffix
+    if shared == len(words_a) or shared < min_shared * max(len(words_a), len(words_b)):
+        return None
+
+    head = " ".join(words_a[:prefix])
+    tail = " ".join(words_a[len(words_a) - suffix:]) if suffix else ""
+    return head, tail
+
+
+def _template_variable(prompt: str, head: str, tail: str) -> Optional[str]:
+    """Extract the variable part of a prompt, or None if it does not fit the template."""
+    if head and not prompt.startswith(head + " "):
+        return None
+    if tail and not prompt.endswith(" " + tail):
+        return None
+
+    start = len(head) + 1 if head else 0
+    end = len(prompt) - len(tail) - 1 if tail else len(prompt)
+    variable = prompt[start:end]
+    return variable if variable else None
+
+
+class SharedPlanner(Planner):
+    """
+    Planner for a batch of near-identical prompts (same template, different keyword).
+    Plans once per template and adapts the plan for every other prompt
+    by substituting the variable part, instead of calling the LLM again.
+    """
+
+    def __init__(self, llm_provider, prompts: List[str]):
+        super().__init__(llm_provider)
+        self.templates: List[Dict[str, Any]] = []
+        self.planner_calls = 0
+        self.shared_plans = 0
+
+        for prompt in prompts:
+            self._assign(prompt)
+
+        grouped = sum(1 for t in self.templates if len(t["members"]) > 1)
+        logger.info(f"Batch of {len(prompts)} prompts grouped into {len(self.templates)} templates ({grouped} shared)")
+
+    def _assign(self, prompt: str):
+        for template in self.templates:
+            if template["head"] is None:
+                split = _split_template(template["members"][0], prompt)
+                if split:
+                    template["head"], template["tail"] = split
+                    template["members"].append(prompt)
+                    return
+            elif _template_variable(prompt, template["head"], template["tail"]) is not None:
+                template["members"].append(prompt)
+                return
+
+        self.templates.append({"head": None, "tail": None, "members": [prompt], "plan": None})
+
+    def _find_template(self, task: str) -> Optional[Dict[str, Any]]:
+        for template in self.templates:
+            if template["head"] is not None and task in template["members"]:
+                return template
+        return None
+
+    async def create_plan(self, task: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+        template = self._find_template(task)
+        if template is None:
+            self.planner_calls += 1
+            return await super().create_plan(task, context)
+
+        # The first task of the template plans; the others wait for it
+        if template["plan"] is None:
+            template["plan"] = asyncio.get_running_loop().create_future()
+            template["source"] = task
+            try:
+                self.planner_calls += 1
+                plan = await super().create_plan(task, context)
+            except BaseException as e:
+                # Let waiting tasks fall back to planning on their own
+                future, template["plan"] = template["plan"], None
+                future.set_exception(RuntimeError(f"Shared planning failed: {e!r}"))
+                future.add_done_callback(lambda f: f.exception())
+                raise
+            template["plan"].set_result(plan)
+            return plan
+
+        try:
+            source_plan = await asyncio.shield(template["plan"])
+        except Exception:
+            self.planner_calls += 1
+            return await super().create_plan(task, context)
+
+        adapted = self._adapt_plan(source_plan, template, task)
+        if adapted is None:
+            self.planner_calls += 1
+            return await super().create_plan(task, context)
+
+        self.shared_plans += 1
+        return adapted
+
+    def _adapt_plan(self, plan: Dict[str, Any], template: Dict[str, Any], task: str) -> Optional[Dict[str, Any]]:
+        """
+        Copy a plan made for another prompt of the same template.
+        Returns None if the plan never mentions the source prompt's variable,
+        since the copy would then still be about the other prompt.
+        """
+        source_var = _template_variable(template["source"], template["head"], template["tail"])
+        target_var = _template_variable(task, template["head"], template["tail"])
+        if not source_var or not target_var:
+            return None
+
+        # Whole words only: "AI" must not rewrite "maintain" or "AIOps"
+        pattern = re.compile(r"(?<!\w)" + re.escape(source_var) + r"(?!\w)")
+        if not any(pattern.search(step["description"]) for step in plan["steps"]):
+            logger.info(f"Batch plan does not mention {source_var!r}, planning {target_var!r} separately")
+            return None
+
+        adapted = copy.deepcopy(plan)
+        adapted["task"] = task
+        adapted["created_at"] = datetime.now().isoformat()
+        adapted["shared_from"] = template["source"][:200]
+
+        for step in adapted["steps"]:
+            step["description"] = pattern.sub(lambda _: target_var, step["description"])
+            step["status"] = "pending"
+            step["started_at"] = None
+            step["completed_at"] = None
+            step["observation"] = None
+
+        logger.info(f"Reusing batch plan with {len(adapted['steps'])} steps ({source_var!r} -> {target_var!r})")
+        return adapted
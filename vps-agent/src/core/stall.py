@@ -0,0 +1,130 @@
+"""
+Stall Detector - Spot an agent that keeps repeating itself
+Fingerprints every turn (actions and their results, with volatile details
+removed) and watches a rolling window of them for repeats, even when other
+turns succeed in between
+"""
+
+import hashlib
+import json
+import logging
+import re
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .memo import normalize_arguments
+
+logger = logging.getLogger(__name__)
+
+# Volatile parts of tool output: hex ids (uuids, hashes, addresses) and numbers
+_HEX = re.compile(r"\b(?=[0-9a-f\-]*\d)[0-9a-f][0-9a-f\-]{7,}\b", re.IGNORECASE)
+_NUMBER = re.compile(r"\d+")
+
+
+def fingerprint(text: str) -> str:
+    """Short hash of a text with ids, numbers and whitespace differences removed."""
+    text = _HEX.sub("<h>", text)
+    text = _NUMBER.sub("<n>", text)
+    text = " ".join(text.split())
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class StallDetector:
+    """
+    Rolling-window detector for agent loops that make no progress.
+
+    Each turn becomes one hash of its normalized actions and results (for a
+    failed action, its error signature instead of the raw output); each
+    error signature is counted as well. observe() reports a stall when, within
+    the last `window` turns:
+
+    - the same turn (same calls, same results) occurs `max_repeats` times,
+      which also covers short cycles such as A, B, A, B, A;
+    - the same error occurs `max_repeats` times, however the code around it
+      was changed.
+
+    Successful turns in between do not reset the counts, unlike the loop's
+    consecutive error limit.
+    """
+
+    def __init__(self, window: int = 12, max_repeats: int = 3):
+        self.window = window
+        self.max_repeats = max(2, max_repeats)
+
+        self._turns: Deque[Tuple[str, List[str]]] = deque()
+        self._turn_counts: Counter = Counter()
+        self._error_counts: Counter = Counter()
+
+    def observe(
+        self,
+        actions: List[Dict[str, Any]],
+        observations: List[str],
+        diagnoses: List[Optional[Dict[str, Any]]],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Record one turn.
+
+        Returns:
+            None, or {reason ("repeated_turn" or "repeated_error"), repeats, description}
+        """
+        parts = []
+        errors = []
+        for action, observation, diagnosis in zip(actions, observations, diagnoses):
+            call = json.dumps(
+                [action.get("type"), normalize_arguments(action)], sort_keys=True, default=str
+            )
+            if diagnosis:
+                errors.append(diagnosis["signature"])
+                result = diagnosis["signature"]
+            else:
+                result = str(observation)
+            parts.append(f"{fingerprint(call)}:{fingerprint(result)}")
+
+        turn = hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=8).hexdigest()
+        errors = sorted(set(errors))
+        self._push(turn, errors)
+
+        repeats = self._turn_counts[turn]
+        if repeats >= self.max_repeats:
+            calls = ", ".join(action.get("type", "unknown") for action in actions)
+            return {
+                "reason": "repeated_turn",
+                "repeats": repeats,
+                "description": (
+                    f"The same {calls} call returned the same result {repeats} times "
+                    f"in the last {len(self._turns)} turns"
+                ),
+            }
+
+        for signature in errors:
+            repeats = self._error_counts[signature]
+            if repeats >= self.max_repeats:
+                diagnosis = next(d for d in diagnoses if d and d["signature"] == signature)
+                return {
+                    "reason": "repeated_error",
+                    "repeats": repeats,
+                    "description": (
+                        f"The same error ({diagnosis['kind']}: {diagnosis['message'][:200]}) "
+                        f"occurred {repeats} times in the last {len(self._turns)} turns"
+                    ),
+                }
+
+        return None
+
+    def reset(self):
+        """Forget the history (e.g. after a re-plan, so the new plan gets a fresh start)."""
+        self._turns.clear()
+        self._turn_counts.clear()
+        self._error_counts.clear()
+
+    def _push(self, turn: str, errors: List[str]):
+        self._turns.append((turn, errors))
+        self._turn_counts[turn] += 1
+        self._error_counts.update(errors)
+
+        while len(self._turns) > self.window:
+            old_turn, old_errors = self._turns.popleft()
+            self._turn_counts[old_turn] -= 1
+            self._error_counts.subtract(old_errors)
+            self._turn_counts += Counter()  # drop keys that reached zero
+            self._error_counts += Counter()
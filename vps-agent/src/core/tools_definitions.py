@@ -191,3 +191,40 @@ Include a summary of what was accomplished.""",
         }
     }
 ]
+
+
+# Memoization policy per tool. Pure tools return the same result for the same
+# arguments, so a repeat within `ttl` seconds is served from memory.
+# "task" scope entries are dropped after any side-effecting action of the task;
+# "project" scope entries are shared between tasks of the same project.
+TOOL_POLICIES = {
+    "execute_python": {"pure": False},
+    "shell_command": {"pure": False},
+    "browser_navigate": {
+        "pure": True,
+        "ttl": 600,
+        "scope": "project",
+        "pure_actions": {"navigate", "get_text", "extract_links"},
+    },
+    "web_search": {"pure": True, "ttl": 3600, "scope": "project"},
+    "save_file": {"pure": False},
+    "read_file": {"pure": True, "ttl": 300, "scope": "task"},
+    "complete": {"pure": False},
+}
+
+# Tools without side effects whatever their arguments
+SIDE_EFFECT_FREE_TOOLS = {
+    name for name, policy in TOOL_POLICIES.items()
+    if policy.get("pure") and "pure_actions" not in policy
+}
+
+
+def is_pure(action: dict) -> bool:
+    """
+    Whether an action has no side effects (unknown tools are side-effecting).
+    Several pure actions in one turn may run concurrently.
+    """
+    policy = TOOL_POLICIES.get(action.get("type"), {})
+    if not policy.get("pure"):
+        return False
+    return "pure_actions" not in policy or action.get("action") in policy["pure_actions"]
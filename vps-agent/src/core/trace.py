@@ -0,0 +1,351 @@
+"""
+Agent Traces - Record and replay agent runs
+A recorded run holds every LLM response, plan, action outcome and sandbox
+call of one task; replaying it runs AgentLoop offline, without API keys or Docker
+"""
+
+import asyncio
+import contextvars
+import gzip
+import hashlib
+import inspect
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from ..memory.event_stream import EventStream
+from .agent import AgentLoop
+from .errors import ErrorClassifier
+from .llm import ModelRouter
+from .memo import ActionMemo
+from .planner import Planner
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 1
+
+# Set while a recorded call runs; calls made inside it (e.g. the sandbox
+# calls of an action outcome) are covered by its result and not recorded
+_inside_call: contextvars.ContextVar[bool] = contextvars.ContextVar("trace_inside_call", default=False)
+
+# Components a trace covers, with the AgentLoop argument they replace
+COMPONENTS = {
+    "llm": "llm_provider",
+    "planner": "planner",
+    "sandbox": "sandbox",
+    "storage": "file_storage",
+    "memo": "action_memo",
+    "errors": "error_classifier",
+}
+
+# Sync methods whose results depend on state the replay cannot rebuild
+# (e.g. fixes the shared classifier learned from earlier tasks)
+SYNC_METHODS = {
+    "errors": ("classify",),
+}
+
+ROUTER_MODELS = {
+    "complex": "MODEL_COMPLEX",
+    "fast": "MODEL_FAST",
+    "coding": "MODEL_CODING",
+    "default": "DEFAULT_MODEL",
+}
+
+
+def _jsonable(value: Any) -> Any:
+    """JSON-safe copy of call arguments and results (callables become a placeholder)."""
+    return json.loads(json.dumps(
+        value,
+        default=lambda v: "<callable>" if callable(v) else str(v)
+    ))
+
+
+def _call_key(kind: str, method: str, args: Any, kwargs: Any) -> str:
+    material = json.dumps([kind, method, args, kwargs], sort_keys=True)
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _RecordingProxy:
+    """Forwards to a component and records the calls of its async methods (and SYNC_METHODS)."""
+
+    def __init__(self, recorder: "TraceRecorder", kind: str, target: Any):
+        self._recorder = recorder
+        self._kind = kind
+        self._target = target
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._target, name)
+        if name in SYNC_METHODS.get(self._kind, ()):
+            def recorded_sync(*args, **kwargs):
+                if _inside_call.get():
+                    return value(*args, **kwargs)
+                started = time.perf_counter()
+                result = value(*args, **kwargs)
+                self._recorder.record(self._kind, name, args, kwargs, started, result=result)
+                return result
+
+            return recorded_sync
+
+        if not inspect.iscoroutinefunction(value):
+            return value
+
+        async def recorded(*args, **kwargs):
+            if _inside_call.get():
+                return await value(*args, **kwargs)
+
+            token = _inside_call.set(True)
+            started = time.perf_counter()
+            try:
+                result = await value(*args, **kwargs)
+            except Exception as e:
+                self._recorder.record(self._kind, name, args, kwargs, started, error=e)
+                raise
+            finally:
+                _inside_call.reset(token)
+
+            self._recorder.record(self._kind, name, args, kwargs, started, result=result)
+            return result
+
+        return recorded
+
+
+class TraceRecorder:
+    """
+    Records one agent run into a trace.
+
+    Wrap the loop's components with wrap() before building the AgentLoop;
+    calls are kept in memory and written by save() as gzipped JSON lines
+    (a header, then one line per call in completion order).
+    """
+
+    def __init__(self, task: str, context: Optional[Dict] = None, config: Optional[Dict[str, Any]] = None):
+        self.header = {
+            "version": TRACE_VERSION,
+            "task": task,
+            "context": context,
+            "config": config or {},
+            "attrs": {},
+            "recorded_at": datetime.now().isoformat(),
+        }
+        self.calls: List[Dict[str, Any]] = []
+
+    def wrap(self, kind: str, target: Any) -> Any:
+        """Recording proxy for a component (one of COMPONENTS)."""
+        # Plain attributes (e.g. the sandbox's workspace_dir) are needed on replay
+        self.header["attrs"][kind] = {
+            name: value for name, value in vars(target).items()
+            if not name.startswith("_") and isinstance(value, (str, int, float, bool, type(None)))
+        }
+        return _RecordingProxy(self, kind, target)
+
+    def record(
+        self,
+        kind: str,
+        method: str,
+        args: tuple,
+        kwargs: Dict[str, Any],
+        started: float,
+        result: Any = None,
+        error: Optional[Exception] = None,
+    ):
+        call = {
+            "kind": kind,
+            "method": method,
+            "args": _jsonable(list(args)),
+            "kwargs": _jsonable(kwargs),
+            "elapsed": round(time.perf_counter() - started, 4),
+        }
+        if error is not None:
+            call["error"] = {"type": type(error).__name__, "message": str(error)}
+        else:
+            call["result"] = _jsonable(result)
+        self.calls.append(call)
+
+    def save(self, path: str):
+        """Write the trace (blocking; run it in a worker thread)."""
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(self.header) + "\n")
+            for call in self.calls:
+                f.write(json.dumps(call) + "\n")
+        logger.info(f"Trace with {len(self.calls)} calls written to {path}")
+
+
+class _ReplayProxy:
+    """Serves a component's async calls from a trace; sync methods go to a local stand-in."""
+
+    def __init__(self, replayer: "TraceReplayer", kind: str, stand_in: Any = None):
+        self._replayer = replayer
+        self._kind = kind
+        self._stand_in = stand_in
+
+    def __getattr__(self, name: str) -> Any:
+        attrs = self._replayer.header["attrs"].get(self._kind, {})
+        if name in attrs:
+            return attrs[name]
+
+        if name in SYNC_METHODS.get(self._kind, ()):
+            return lambda *args, **kwargs: self._replayer.answer(self._kind, name, args, kwargs)[0]
+
+        value = getattr(self._stand_in, name, None)
+        if value is not None and not inspect.iscoroutinefunction(value):
+            return value
+
+        async def replayed(*args, **kwargs):
+            return await self._replayer.take(self._kind, name, args, kwargs)
+
+        return replayed
+
+
+class TraceReplayer:
+    """
+    Replays a recorded trace.
+
+    Each call is answered with the recorded call of the same component and
+    method, preferring one with identical arguments; otherwise the oldest
+    unanswered one is used and counted as a divergence (e.g. a prompt that
+    changed). With `realtime` the recorded latencies are slept, so the
+    replay takes as long as the original run; without it only the loop's
+    own overhead remains.
+    """
+
+    def __init__(self, header: Dict[str, Any], calls: List[Dict[str, Any]], realtime: bool = False):
+        if header.get("version") != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version: {header.get('version')}")
+
+        self.header = header
+        self.realtime = realtime
+        self.divergent_calls: List[str] = []  # "kind.method" of each divergence
+        self.served = 0
+        self._pending: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
+        self._errors: Dict[str, type] = {}
+        self._last: Dict[tuple, Dict[str, Any]] = {}
+
+        for call in calls:
+            call["key"] = _call_key(call["kind"], call["method"], call["args"], call["kwargs"])
+            self._pending[(call["kind"], call["method"])].append(call)
+
+    @classmethod
+    def load(cls, path: str, realtime: bool = False) -> "TraceReplayer":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            calls = [json.loads(line) for line in f if line.strip()]
+        return cls(header, calls, realtime=realtime)
+
+    @property
+    def task(self) -> str:
+        return self.header["task"]
+
+    @property
+    def context(self) -> Optional[Dict]:
+        return self.header.get("context")
+
+    def proxy(self, kind: str) -> Any:
+        """Replaying stand-in for a component (one of COMPONENTS)."""
+        stand_ins: Dict[str, Callable[[], Any]] = {
+            "planner": lambda: Planner(llm_provider=None),
+            "memo": ActionMemo,
+            "errors": ErrorClassifier,
+        }
+        stand_in = stand_ins.get(kind)
+        return _ReplayProxy(self, kind, stand_in() if stand_in else None)
+
+    def agent(self, **overrides) -> AgentLoop:
+        """AgentLoop configured like the recorded run, with every component replayed."""
+        config = dict(self.header["config"])
+        models = config.pop("models", {})
+        router = ModelRouter({}, {ROUTER_MODELS[name]: model for name, model in models.items() if name in ROUTER_MODELS})
+
+        arguments = {
+            **{argument: self.proxy(kind) for kind, argument in COMPONENTS.items()},
+            "model_router": router,
+            "event_stream": EventStream(),
+            **config,
+            **overrides,
+        }
+        return AgentLoop(**arguments)
+
+    async def run(self, **overrides) -> Dict[str, Any]:
+        """Replay the recorded task."""
+        return await self.agent(**overrides).run(self.task, self.context)
+
+    async def take(self, kind: str, method: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """Answer one async call from the trace."""
+        result, elapsed = self.answer(kind, method, args, kwargs)
+        if self.realtime:
+            await asyncio.sleep(elapsed)
+        return result
+
+    def answer(self, kind: str, method: str, args: tuple, kwargs: Dict[str, Any]) -> tuple:
+        """Recorded (result, elapsed) of a call; raises the recorded error instead if it failed."""
+        pending = self._pending.get((kind, method))
+        if not pending:
+            # An extra write (e.g. a todo.md update the recording coalesced away) has nothing to return
+            last = self._last.get((kind, method))
+            if last is not None and "error" not in last and last["result"] is None:
+                self.divergent_calls.append(f"{kind}.{method}")
+                return None, 0.0
+            raise RuntimeError(f"Trace has no {kind}.{method} call left")
+
+        key = _call_key(kind, method, _jsonable(list(args)), _jsonable(kwargs))
+        index = next((i for i, call in enumerate(pending) if call["key"] == key), None)
+        if index is None:
+            self.divergent_calls.append(f"{kind}.{method}")
+            logger.debug(f"Replay diverged at {kind}.{method}; using the next recorded call")
+            index = 0
+
+        call = pending.pop(index)
+        self._last[(kind, method)] = call
+        self.served += 1
+
+        if "error" in call:
+            raise self._error_type(call["error"]["type"])(call["error"]["message"])
+        return call["result"], call["elapsed"]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "served": self.served,
+            "unused": sum(len(calls) for calls in self._pending.values()),
+            "divergences": len(self.divergent_calls),
+        }
+
+    def unused_calls(self) -> List[str]:
+        """
+        Recorded calls the replay never made, as "kind.method". Background
+        todo.md writes may show up here: the pipeline coalesces them by timing.
+        """
+        return [f"{kind}.{method}" for (kind, method), calls in self._pending.items() for _ in calls]
+
+    def _error_type(self, name: str) -> type:
+        """Exception class named like the recorded one (observations include the name)."""
+        if name not in self._errors:
+            self._errors[name] = type(name, (Exception,), {})
+        return self._errors[name]
+
+
+async def _benchmark(path: str, runs: int, realtime: bool):
+    for run in range(1, runs + 1):
+        replayer = TraceReplayer.load(path, realtime=realtime)
+        started = time.perf_counter()
+        result = await replayer.run()
+        elapsed = time.perf_counter() - started
+        print(
+            f"run {run}: {result['status']} after {result.get('iterations')} iterations "
+            f"in {elapsed * 1000:.1f} ms {replayer.stats()}"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a recorded agent trace offline")
+    parser.add_argument("trace", help="Trace file (.jsonl.gz)")
+    parser.add_argument("--runs", type=int, default=1, help="Number of replays (for timing)")
+    parser.add_argument("--realtime", action="store_true", help="Sleep the recorded call latencies")
+    parser.add_argument("--verbose", action="store_true", help="Show the agent's logging")
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING)
+    asyncio.run(_benchmark(options.trace, options.runs, options.realtime))
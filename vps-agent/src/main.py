@@ -50,20 +50,14 @@ def main():
     logger.info(f"Sandbox timeout: {os.getenv('SANDBOX_TIMEOUT', '300')}s")
     logger.info(f"Default model: {os.getenv('DEFAULT_MODEL', 'claude-opus-4-20250514')}")
 
-    # Start server
-    import uvicorn
-    from src.api.server import app
+    # Start server (drains and checkpoints running tasks on SIGTERM)
+    from src.api.server import serve
 
     logger.info("Starting FastAPI server on http://0.0.0.0:8000")
     logger.info("Health check: http://localhost:8000/health")
     logger.info("API docs: http://localhost:8000/docs")
 
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="info"
-    )
+    serve(host="0.0.0.0", port=8000, log_level="info")
 
 
 if __name__ == "__main__":
@@ -3,8 +3,9 @@ Event Stream Memory - Manus.im append-only pattern
 Maintains context of all actions and observations
 """
 
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 from collections import deque
 
@@ -20,6 +21,8 @@ class EventStream:
     def __init__(self, max_events: int = 1000):
         self.events: deque = deque(maxlen=max_events)
         self.max_events = max_events
+        self.total_added = 0  # Offset of the next event, never reset by eviction
+        self._waiters: List[asyncio.Future] = []
 
     def add_event(self, event: Dict[str, Any]):
         """
@@ -30,12 +33,51 @@ class EventStream:
             event["timestamp"] = datetime.now().isoformat()
 
         self.events.append(event)
+        self.total_added += 1
         logger.debug(f"Event added: {event.get('type', 'unknown')}")
 
+        # Wake up live subscribers
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
     def get_recent(self, n: int = 10) -> List[Dict]:
         """Get the N most recent events."""
         return list(self.events)[-n:]
 
+    def get_since(self, offset: int) -> Tuple[List[Tuple[int, Dict]], int]:
+        """
+        Get events from an absolute offset onwards.
+        Events already evicted from the window are skipped.
+
+        Returns:
+            ([(offset, event), ...], next_offset)
+        """
+        first = self.total_added - len(self.events)
+        start = max(offset, first)
+        items = [
+            (i, self.events[i - first])
+            for i in range(start, self.total_added)
+        ]
+        return items, self.total_added
+
+    async def wait_for_events(self, offset: int, timeout: float) -> bool:
+        """Wait until events beyond `offset` exist. Returns False on timeout."""
+        if self.total_added > offset:
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
     def get_by_type(self, event_type: str) -> List[Dict]:
         """Get all events of a specific type."""
         return [e for e in self.events if e.get("type") == event_type]
@@ -0,0 +1,31 @@
+"""Runtime components"""
+
+from .admission import AdmissionController
+from .checkpoints import CheckpointStore
+from .fairshare import FairSharePolicy
+from .health import HealthProber
+from .queue import TaskQueue, MemoryTaskQueue, RedisTaskQueue, create_task_queue
+from .registry import TaskRegistry
+from .result_cache import ResultCache
+from .result_delivery import build_result_deliveries
+from .sandbox_pool import SandboxPool
+from .scheduler import TaskScheduler
+from .webhooks import WebhookDispatcher, WebhookOutbox
+
+__all__ = [
+    "AdmissionController",
+    "CheckpointStore",
+    "FairSharePolicy",
+    "HealthProber",
+    "TaskQueue",
+    "MemoryTaskQueue",
+    "RedisTaskQueue",
+    "create_task_queue",
+    "TaskRegistry",
+    "ResultCache",
+    "build_result_deliveries",
+    "SandboxPool",
+    "TaskScheduler",
+    "WebhookDispatcher",
+    "WebhookOutbox"
+]
@@ -0,0 +1,122 @@
+"""
+Admission Control - Reject new tasks when the runtime is saturated
+Returns a reason and a computed Retry-After instead of queueing work that would time out
+"""
+
+import logging
+import math
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_until_reset(value: Any, now: Optional[float] = None) -> Optional[float]:
+    """
+    Parse a rate-limit reset header value into seconds from now.
+    Supports RFC 3339 timestamps (Anthropic) and durations like "6m0s" or "1.5s" (OpenAI).
+    """
+    if value is None:
+        return None
+
+    now = now if now is not None else time.time()
+    text = str(value).strip()
+
+    try:
+        reset_at = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        return max(0.0, reset_at.timestamp() - now)
+    except ValueError:
+        pass
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", text)
+    if not parts:
+        return None
+
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+class AdmissionController:
+    """
+    Decides whether a new task may enter the queue.
+
+    A task is rejected when:
+    - the sandbox (Docker) is unavailable
+    - the backlog (queued tasks plus agent loops waiting for a sandbox of
+      the pool) already holds `max_queue_depth` entries
+    - an LLM provider reports fewer than `min_tokens_remaining` tokens of headroom
+
+    A full sandbox pool alone does not reject: queued tasks hold no sandbox.
+    It only lengthens Retry-After, since nothing starts before a sandbox frees up.
+    """
+
+    def __init__(
+        self,
+        max_queue_depth: int = 50,
+        min_tokens_remaining: int = 20000,
+        default_task_seconds: float = 120.0,
+        sandbox_retry_seconds: float = 15.0,
+        max_retry_after: int = 900,
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.min_tokens_remaining = min_tokens_remaining
+        self.default_task_seconds = default_task_seconds
+        self.sandbox_retry_seconds = sandbox_retry_seconds
+        self.max_retry_after = max_retry_after
+
+    def check(
+        self,
+        scheduler_stats: Dict[str, Any],
+        sandbox_state: Dict[str, Any],
+        rate_limits: Dict[str, Dict[str, Any]],
+        incoming: int = 1,
+        sandbox_pool: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Check current capacity for `incoming` new tasks.
+        `sandbox_pool` is SandboxPool.stats() (size, in_use, waiting) of this node.
+
+        Returns:
+            None if the task is admitted, otherwise {"reason": ..., "retry_after": seconds}
+        """
+        if not sandbox_state.get("sandbox_ready", False):
+            return self._reject("sandbox_unavailable", self.sandbox_retry_seconds)
+
+        avg_task = scheduler_stats.get("avg_task_seconds") or self.default_task_seconds
+
+        waiting = sandbox_pool.get("waiting", 0) if sandbox_pool else 0
+        backlog = scheduler_stats.get("queued", 0) + waiting
+        if backlog + incoming > self.max_queue_depth:
+            # Time until enough tasks have started for the new ones to fit
+            slots = max(1, scheduler_stats.get("max_concurrent", 1))
+            excess = backlog + incoming - self.max_queue_depth
+            retry_after = excess * avg_task / slots
+            if sandbox_pool and sandbox_pool["in_use"] >= sandbox_pool["size"]:
+                # Nothing starts before the loops already waiting for a sandbox get one
+                retry_after = max(retry_after, (waiting + 1) * avg_task / sandbox_pool["size"])
+            return self._reject("queue_full", retry_after)
+
+        for provider, limits in rate_limits.items():
+            remaining = limits.get("tokens_remaining")
+            if not isinstance(remaining, int) or remaining >= self.min_tokens_remaining:
+                continue
+
+            reset_in = seconds_until_reset(limits.get("tokens_reset"))
+            if reset_in is None:
+                reset_in = 60.0
+
+            # Headers are a snapshot; ignore them once the window has reset
+            age = time.time() - limits.get("updated_at", 0)
+            if age >= reset_in:
+                continue
+
+            return self._reject(f"llm_token_budget:{provider}", reset_in - age)
+
+        return None
+
+    def _reject(self, reason: str, retry_after: float) -> Dict[str, Any]:
+        retry_after = min(max(1, math.ceil(retry_after)), self.max_retry_after)
+        logger.warning(f"Admission rejected ({reason}), retry after {retry_after}s")
+        return {"reason": reason, "retry_after": retry_after}
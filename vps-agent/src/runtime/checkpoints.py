@@ -0,0 +1,175 @@
+"""
+Task Checkpoints - Persist agent progress across restarts and crashes
+Running tasks save their loop state after every iteration; a drain (SIGTERM)
+also saves queued tasks. Startup resubmits everything that is left
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, default=str, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(value: Any) -> Any:
+    # Rows written before compression was introduced hold plain JSON text
+    if isinstance(value, bytes):
+        value = zlib.decompress(value).decode("utf-8")
+    return json.loads(value)
+
+
+class CheckpointStore:
+    """
+    SQLite-backed store of task checkpoints.
+
+    Each row holds the TaskRequest payload and, for tasks that were running,
+    the agent state (plan, iteration, error count, workspace directory).
+    The events of a run live in a separate table keyed by stream offset, so
+    a per-iteration save only appends the new events. State and events are
+    stored as zlib-compressed JSON.
+    Calls are blocking and meant to run in a worker thread.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                task_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                state TEXT,
+                saved_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoint_events (
+                task_id TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                event BLOB NOT NULL,
+                PRIMARY KEY (task_id, offset)
+            )
+        """)
+
+    def register(self, task_id: str, payload: Dict[str, Any]):
+        """Record a task that starts running, keeping an existing checkpoint."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO checkpoints (task_id, payload, state, saved_at) VALUES (?, ?, NULL, ?)",
+                (task_id, json.dumps(payload, default=str), time.time())
+            )
+
+    def save(self, task_id: str, payload: Dict[str, Any], state: Optional[Dict[str, Any]] = None):
+        """Save (or replace) the checkpoint of a task; state["events"] replaces the stored events."""
+        state = dict(state) if state is not None else None
+        events = list(enumerate(state.pop("events", []))) if state is not None else []
+
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (task_id, payload, state, saved_at) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    task_id,
+                    json.dumps(payload, default=str),
+                    _pack(state) if state is not None else None,
+                    time.time(),
+                )
+            )
+            self._conn.execute("DELETE FROM checkpoint_events WHERE task_id = ?", (task_id,))
+            self._insert_events(task_id, events)
+
+    def save_progress(
+        self,
+        task_id: str,
+        state: Dict[str, Any],
+        events: List[Tuple[int, Dict[str, Any]]],
+        replace_events: bool = False,
+        keep_from: int = 0,
+    ):
+        """
+        Save the agent state after an iteration.
+
+        Args:
+            task_id: Task the state belongs to
+            state: Agent state without events
+            events: New (offset, event) pairs since the last save
+            replace_events: Drop previously stored events first (e.g. after a resume renumbered them)
+            keep_from: Drop stored events below this offset (evicted from the agent's stream)
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO checkpoints (task_id, payload, state, saved_at) VALUES (?, '{}', ?, ?) "
+                "ON CONFLICT(task_id) DO UPDATE SET state = excluded.state, saved_at = excluded.saved_at",
+                (task_id, _pack(state), time.time())
+            )
+            if replace_events:
+                self._conn.execute("DELETE FROM checkpoint_events WHERE task_id = ?", (task_id,))
+            elif keep_from:
+                self._conn.execute(
+                    "DELETE FROM checkpoint_events WHERE task_id = ? AND offset < ?",
+                    (task_id, keep_from)
+                )
+            self._insert_events(task_id, events)
+
+    def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task's checkpoint as {task_id, payload, state, saved_at}."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT task_id, payload, state, saved_at FROM checkpoints WHERE task_id = ?",
+                (task_id,)
+            ).fetchone()
+            return self._decode(row) if row else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        """All checkpoints, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, payload, state, saved_at FROM checkpoints ORDER BY saved_at"
+            ).fetchall()
+            return [self._decode(row) for row in rows]
+
+    def delete(self, task_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM checkpoints WHERE task_id = ?", (task_id,))
+            self._conn.execute("DELETE FROM checkpoint_events WHERE task_id = ?", (task_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _insert_events(self, task_id: str, events: List[Tuple[int, Dict[str, Any]]]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO checkpoint_events (task_id, offset, event) VALUES (?, ?, ?)",
+            [(task_id, offset, _pack(event)) for offset, event in events]
+        )
+
+    def _decode(self, row: tuple) -> Dict[str, Any]:
+        """Decode a checkpoint row; the caller holds the lock."""
+        state = _unpack(row[2]) if row[2] else None
+        if state is not None and "events" not in state:
+            events = self._conn.execute(
+                "SELECT event FROM checkpoint_events WHERE task_id = ? ORDER BY offset",
+                (row[0],)
+            ).fetchall()
+            state["events"] = [_unpack(event) for (event,) in events]
+
+        return {
+            "task_id": row[0],
+            "payload": json.loads(row[1]),
+            "state": state,
+            "saved_at": row[3],
+        }
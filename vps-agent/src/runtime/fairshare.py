@@ -0,0 +1,93 @@
+"""
+Fair Share Policy - Weighted fair queuing across tenants
+Maps a task payload to its tenant, plan weight and per-tenant concurrency cap
+"""
+
+import math
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+DEFAULT_PLAN = "default"
+
+
+def parse_tier_map(value: Optional[str]) -> Dict[str, float]:
+    """
+    Parse a "plan:value" list such as "starter:1,pro:2,enterprise:4".
+
+    Returns:
+        Dict of lowercased plan name to value
+    """
+    result = {}
+    for item in (value or "").split(","):
+        if ":" not in item:
+            continue
+        plan, number = item.split(":", 1)
+        result[plan.strip().lower()] = float(number)
+    return result
+
+
+class FairSharePolicy:
+    """
+    Describes how the queue shares agent slots between tenants.
+
+    A tenant is a user_id, or user_id:project_id when `key` is "project".
+    Each tenant gets slots in proportion to the weight of its plan tier
+    and never runs more than the plan's `max_running` tasks at once.
+    """
+
+    def __init__(
+        self,
+        key: str = "user",
+        weights: Optional[Dict[str, float]] = None,
+        max_running: Optional[Dict[str, float]] = None,
+    ):
+        if key not in ("user", "project"):
+            raise ValueError(f"Unknown fair share key: {key}")
+
+        self.key = key
+        self.weights = weights or {}
+        self.max_running = max_running or {}
+
+    def plan(self, payload: Dict[str, Any]) -> str:
+        """Normalized plan tier of a task (bounded set, safe as a metric label)."""
+        plan = (payload.get("plan") or "").lower()
+        return plan if plan in self.weights or plan in self.max_running else DEFAULT_PLAN
+
+    def tenant(self, payload: Dict[str, Any]) -> str:
+        """Tenant key a task is scheduled under."""
+        tenant = payload.get("user_id") or "anonymous"
+        if self.key == "project" and payload.get("project_id"):
+            tenant = f"{tenant}:{payload['project_id']}"
+        return tenant
+
+    def describe(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Tenant, plan, weight and cap (0 = unlimited) for a task."""
+        plan = self.plan(payload)
+        weight = self.weights.get(plan, self.weights.get(DEFAULT_PLAN, 1.0))
+        cap = self.max_running.get(plan, self.max_running.get(DEFAULT_PLAN, 0))
+        return {
+            "tenant": self.tenant(payload),
+            "plan": plan,
+            "weight": weight if weight > 0 else 1.0,
+            "max_running": int(cap),
+        }
+
+
+def estimate_position(
+    index: int,
+    vtime: float,
+    weight: float,
+    others: Iterable[Tuple[float, float, int]],
+) -> int:
+    """
+    Estimate the 1-based dispatch position of a waiting task.
+
+    The task is the `index`-th waiting task of a tenant with virtual time
+    `vtime`; `others` holds (vtime, weight, waiting) for every other tenant.
+    Ignores caps and future arrivals; ties count as ahead.
+    """
+    tag = vtime + index / weight
+    ahead = index
+    for other_vtime, other_weight, waiting in others:
+        if tag >= other_vtime:
+            ahead += min(waiting, math.floor((tag - other_vtime) * other_weight) + 1)
+    return ahead + 1
@@ -0,0 +1,99 @@
+"""
+Health Prober - Cached sandbox availability
+Checks Docker in the background so /health and /ready never block the event loop
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProber:
+    """
+    Periodically probes the Docker daemon with one long-lived client
+    and caches the result for the health and readiness endpoints.
+    """
+
+    def __init__(self, sandbox_image: str, interval: float = 15.0):
+        self.sandbox_image = sandbox_image
+        self.interval = interval
+
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+        self.state: Dict[str, Any] = {
+            "sandbox_ready": False,
+            "sandbox_image_ready": False,
+            "active_sandboxes": 0,
+            "checked_at": None,
+            "error": None,
+        }
+
+    async def start(self):
+        """Run a first probe and start the background loop."""
+        if self._task:
+            return
+        await self.probe()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop the background loop and close the Docker client."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        if self._client is not None:
+            try:
+                self._client.close()
+            except Exception:
+                pass
+            self._client = None
+
+    async def probe(self):
+        """Probe Docker in a worker thread and update the cached state."""
+        try:
+            state = await asyncio.to_thread(self._probe_docker)
+        except Exception as e:
+            # Drop the client so the next probe reconnects
+            self._client = None
+            state = {
+                "sandbox_ready": False,
+                "sandbox_image_ready": False,
+                "active_sandboxes": 0,
+                "error": str(e),
+            }
+            logger.warning(f"Sandbox health probe failed: {e}")
+
+        state["checked_at"] = time.time()
+        self.state = state
+
+    def _probe_docker(self) -> Dict[str, Any]:
+        import docker
+
+        if self._client is None:
+            self._client = docker.from_env()
+
+        self._client.ping()
+
+        try:
+            self._client.images.get(self.sandbox_image)
+            image_ready = True
+        except docker.errors.ImageNotFound:
+            image_ready = False
+
+        active = self._client.containers.list(filters={"ancestor": self.sandbox_image})
+
+        return {
+            "sandbox_ready": True,
+            "sandbox_image_ready": image_ready,
+            "active_sandboxes": len(active),
+            "error": None,
+        }
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.probe()
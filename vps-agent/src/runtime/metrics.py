@@ -0,0 +1,130 @@
+"""
+Runtime Metrics - Prometheus counters and histograms
+Shared metric objects for the scheduler, agent loop, LLM providers, sandbox and webhooks
+"""
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+REGISTRY = CollectorRegistry()
+
+# Buckets for multi-minute agent work vs. sub-second calls
+TASK_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# === Queue ===
+
+QUEUE_DEPTH = Gauge(
+    "agent_queue_depth",
+    "Tasks waiting for an agent slot",
+    registry=REGISTRY,
+)
+TASKS_RUNNING = Gauge(
+    "agent_tasks_running",
+    "Tasks currently running on this node",
+    registry=REGISTRY,
+)
+QUEUE_WAIT = Histogram(
+    "agent_queue_wait_seconds",
+    "Time a task waited in the queue before starting",
+    ["priority", "plan"],
+    buckets=LATENCY_BUCKETS + (600, 1800, 3600),
+    registry=REGISTRY,
+)
+
+# === Tasks ===
+
+TASK_DURATION = Histogram(
+    "agent_task_duration_seconds",
+    "Agent task wall-clock duration by outcome",
+    ["outcome"],
+    buckets=TASK_BUCKETS,
+    registry=REGISTRY,
+)
+TASK_ITERATIONS = Histogram(
+    "agent_task_iterations",
+    "Agent loop iterations per task",
+    ["outcome"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 40, 50, 75, 100),
+    registry=REGISTRY,
+)
+
+# === LLM ===
+
+LLM_LATENCY = Histogram(
+    "agent_llm_request_seconds",
+    "LLM completion latency",
+    ["provider", "model", "outcome"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_TOKENS = Counter(
+    "agent_llm_tokens_total",
+    "LLM tokens used",
+    ["provider", "model", "kind"],
+    registry=REGISTRY,
+)
+
+RESULT_CACHE_LOOKUPS = Counter(
+    "agent_result_cache_lookups_total",
+    "Result cache lookups for opt-in task submissions",
+    ["outcome"],
+    registry=REGISTRY,
+)
+
+ACTION_MEMO_LOOKUPS = Counter(
+    "agent_action_memo_lookups_total",
+    "Memo lookups for pure agent actions",
+    ["tool", "outcome"],
+    registry=REGISTRY,
+)
+
+AGENT_STALLS = Counter(
+    "agent_stalls_total",
+    "Agent loops caught repeating themselves, by reason and the action taken (replan or stop)",
+    ["reason", "action"],
+    registry=REGISTRY,
+)
+
+ERROR_DIAGNOSES = Counter(
+    "agent_error_diagnoses_total",
+    "Failed agent actions by where the suggested fix came from",
+    ["source"],
+    registry=REGISTRY,
+)
+
+# === Sandbox ===
+
+SANDBOX_EXEC_LATENCY = Histogram(
+    "agent_sandbox_exec_seconds",
+    "Sandbox command execution latency",
+    ["kind", "outcome"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+
+# === Webhooks ===
+
+WEBHOOK_LATENCY = Histogram(
+    "agent_webhook_delivery_seconds",
+    "Webhook delivery latency per attempt",
+    ["kind", "outcome"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+WEBHOOK_OUTBOX_PENDING = Gauge(
+    "agent_webhook_outbox_pending",
+    "Undelivered webhooks in the outbox",
+    registry=REGISTRY,
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Render all metrics in the Prometheus text format."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
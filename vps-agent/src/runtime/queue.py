@@ -0,0 +1,609 @@
+"""
+Task Queue Backends - In-memory and Redis
+The scheduler pulls work from a TaskQueue; Redis lets several agent nodes share one queue
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from .fairshare import DEFAULT_PLAN, FairSharePolicy, estimate_position, parse_tier_map
+
+logger = logging.getLogger(__name__)
+
+# Lower rank runs first; unknown priorities are treated as "normal"
+PRIORITY_RANKS = {
+    "urgent": 0,
+    "high": 1,
+    "normal": 2,
+    "low": 3,
+}
+
+
+def priority_rank(priority: Optional[str]) -> int:
+    """Map a TaskRequest priority string to its queue rank."""
+    return PRIORITY_RANKS.get((priority or "normal").lower(), PRIORITY_RANKS["normal"])
+
+
+class TaskQueue(ABC):
+    """
+    Abstract task queue.
+    Entries are dicts with task_id, payload, priority, enqueued_at and the
+    fair share fields (tenant, plan, weight, max_running).
+    """
+
+    @abstractmethod
+    async def push(self, task_id: str, payload: Dict[str, Any], priority: str = "normal"):
+        """Add a task to the queue."""
+        pass
+
+    @abstractmethod
+    async def pop(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        """Claim the next task, waiting up to `timeout` seconds."""
+        pass
+
+    @abstractmethod
+    async def ack(self, task_id: str):
+        """Mark a claimed task as finished so it is never redelivered."""
+        pass
+
+    @abstractmethod
+    async def remove(self, task_id: str) -> bool:
+        """Remove a waiting (not yet claimed) task. Returns True if it was removed."""
+        pass
+
+    @abstractmethod
+    async def contains(self, task_id: str) -> bool:
+        """Check if a task is waiting or claimed."""
+        pass
+
+    @abstractmethod
+    async def get_entry(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a waiting task with its 1-based queue position."""
+        pass
+
+    @abstractmethod
+    async def size(self) -> int:
+        """Number of waiting tasks."""
+        pass
+
+    async def heartbeat(self):
+        """Report that this node is alive (no-op for single-process queues)."""
+        pass
+
+    async def requeue_dead(self) -> List[Dict[str, Any]]:
+        """
+        Requeue tasks claimed by dead nodes.
+
+        Returns:
+            Tasks ({task_id, payload}) that used up their attempts and were dead-lettered
+        """
+        return []
+
+    async def release(self, task_id: str):
+        """
+        Give up a claimed task without finishing it (drain on shutdown).
+        Durable queues put it back for any node; others just drop the claim.
+        """
+        await self.ack(task_id)
+
+    async def export_waiting(self) -> List[Dict[str, Any]]:
+        """Remove and return all waiting tasks if the queue does not survive a restart."""
+        return []
+
+    async def request_cancel(self, task_id: str):
+        """Ask the node running a claimed task to cancel it (multi-node queues only)."""
+        pass
+
+    async def pop_cancel_requests(self, task_ids: List[str]) -> List[str]:
+        """Return (and clear) the cancel requests for the given running tasks."""
+        return []
+
+    async def close(self):
+        """Release backend resources."""
+        pass
+
+
+class MemoryTaskQueue(TaskQueue):
+    """
+    In-process weighted fair queue.
+    Tenants take turns by virtual time (start-time fair queuing); within a
+    tenant tasks run in priority order, FIFO within the same priority.
+    Queued tasks are lost when the process exits.
+    """
+
+    def __init__(self, policy: Optional[FairSharePolicy] = None):
+        self.policy = policy or FairSharePolicy()
+        self._tenants: Dict[str, Dict[str, Any]] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._claimed: Dict[str, Dict[str, Any]] = {}
+        self._counter = itertools.count()
+        self._vclock = 0.0
+        self._changed = asyncio.Event()
+
+    async def push(self, task_id: str, payload: Dict[str, Any], priority: str = "normal"):
+        share = self.policy.describe(payload)
+        entry = {
+            "task_id": task_id,
+            "payload": payload,
+            "priority": priority,
+            "rank": priority_rank(priority),
+            "seq": next(self._counter),
+            "enqueued_at": time.time(),
+            **share,
+        }
+
+        tenant = self._tenants.setdefault(share["tenant"], {"heap": [], "vtime": 0.0, "running": 0, "waiting": 0})
+        if not tenant["waiting"]:
+            # A tenant that was idle does not bank credit for the time it had nothing queued
+            tenant["vtime"] = max(tenant["vtime"], self._vclock)
+        tenant["weight"] = share["weight"]
+        tenant["max_running"] = share["max_running"]
+        tenant["waiting"] += 1
+
+        self._entries[task_id] = entry
+        heapq.heappush(tenant["heap"], (entry["rank"], entry["seq"], task_id))
+        self._changed.set()
+
+    async def pop(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            entry = self._select()
+            if entry:
+                return entry
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    def _select(self) -> Optional[Dict[str, Any]]:
+        """Claim the head task of the eligible tenant with the lowest virtual time."""
+        best = None
+        for name, tenant in self._tenants.items():
+            if not tenant["waiting"]:
+                continue
+            if tenant["max_running"] and tenant["running"] >= tenant["max_running"]:
+                continue
+
+            heap = tenant["heap"]
+            while heap and not self._is_current(heap[0]):
+                heapq.heappop(heap)
+
+            key = (tenant["vtime"], heap[0][1])
+            if best is None or key < best[0]:
+                best = (key, name)
+
+        if best is None:
+            return None
+
+        tenant = self._tenants[best[1]]
+        _, _, task_id = heapq.heappop(tenant["heap"])
+        entry = self._entries.pop(task_id)
+
+        self._vclock = tenant["vtime"]
+        tenant["vtime"] += 1.0 / tenant["weight"]
+        tenant["waiting"] -= 1
+        tenant["running"] += 1
+
+        self._claimed[task_id] = entry
+        return entry
+
+    def _is_current(self, item: tuple) -> bool:
+        """False for heap items of removed tasks, including ones pushed again since (new seq)."""
+        entry = self._entries.get(item[2])
+        return entry is not None and entry["seq"] == item[1]
+
+    async def ack(self, task_id: str):
+        entry = self._claimed.pop(task_id, None)
+        if entry:
+            tenant = self._tenants[entry["tenant"]]
+            tenant["running"] -= 1
+            # Forget idle tenants once their virtual time carries no information
+            if not tenant["running"] and not tenant["waiting"] and tenant["vtime"] <= self._vclock:
+                self._tenants.pop(entry["tenant"], None)
+            self._changed.set()
+
+    async def remove(self, task_id: str) -> bool:
+        # The heap item is skipped lazily by _select(), also if the task is pushed again
+        entry = self._entries.pop(task_id, None)
+        if not entry:
+            return False
+        self._tenants[entry["tenant"]]["waiting"] -= 1
+        return True
+
+    async def contains(self, task_id: str) -> bool:
+        return task_id in self._entries or task_id in self._claimed
+
+    async def get_entry(self, task_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(task_id)
+        if not entry:
+            return None
+
+        key = (entry["rank"], entry["seq"])
+        index = sum(
+            1 for other in self._entries.values()
+            if other["tenant"] == entry["tenant"] and (other["rank"], other["seq"]) < key
+        )
+        tenant = self._tenants[entry["tenant"]]
+        others = [
+            (other["vtime"], other["weight"], other["waiting"])
+            for name, other in self._tenants.items()
+            if name != entry["tenant"] and other["waiting"]
+        ]
+        position = estimate_position(index, tenant["vtime"], tenant["weight"], others)
+        return {**entry, "queue_position": position}
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+    async def release(self, task_id: str):
+        entry = self._claimed.pop(task_id, None)
+        if not entry:
+            return
+
+        tenant = self._tenants[entry["tenant"]]
+        tenant["running"] -= 1
+        tenant["waiting"] += 1
+        self._entries[task_id] = entry
+        heapq.heappush(tenant["heap"], (entry["rank"], entry["seq"], task_id))
+        self._changed.set()
+
+    async def export_waiting(self) -> List[Dict[str, Any]]:
+        waiting = sorted(self._entries.values(), key=lambda entry: entry["seq"])
+        for entry in waiting:
+            await self.remove(entry["task_id"])
+        return waiting
+
+
+# Queue a task under its tenant; an idle tenant restarts at the current virtual clock
+_PUSH_SCRIPT = """
+redis.call('HSET', KEYS[5], 'payload', ARGV[2], 'priority', ARGV[3], 'score', ARGV[4],
+    'enqueued_at', ARGV[5], 'attempts', 0, 'tenant', ARGV[6], 'plan', ARGV[7])
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+redis.call('HSET', KEYS[4], 'weight', ARGV[8], 'max_running', ARGV[9])
+if not redis.call('ZSCORE', KEYS[3], ARGV[6]) then
+    local vclock = tonumber(redis.call('GET', KEYS[6]) or '0')
+    local vtime = math.max(tonumber(redis.call('HGET', KEYS[4], 'vtime') or '0'), vclock)
+    redis.call('HSET', KEYS[4], 'vtime', vtime)
+    redis.call('ZADD', KEYS[3], vtime, ARGV[6])
+end
+return 1
+"""
+
+# Claim the head task of the eligible tenant with the lowest virtual time
+_CLAIM_SCRIPT = """
+local tenants = redis.call('ZRANGE', KEYS[3], 0, -1, 'WITHSCORES')
+for i = 1, #tenants, 2 do
+    local tenant = tenants[i]
+    local vtime = tonumber(tenants[i + 1])
+    local tenant_key = ARGV[2] .. 'tenant:' .. tenant
+    local queue_key = ARGV[2] .. 'tenant_queue:' .. tenant
+    local state = redis.call('HMGET', tenant_key, 'running', 'max_running', 'weight')
+    local running = tonumber(state[1] or '0') or 0
+    local cap = tonumber(state[2] or '0') or 0
+
+    if cap <= 0 or running < cap then
+        local popped = redis.call('ZPOPMIN', queue_key)
+        if #popped == 0 then
+            redis.call('ZREM', KEYS[3], tenant)
+        else
+            local task_id = popped[1]
+            local weight = tonumber(state[3] or '1') or 1
+            local next_vtime = vtime + 1 / weight
+
+            redis.call('ZREM', KEYS[1], task_id)
+            redis.call('SET', KEYS[4], vtime)
+            redis.call('HSET', tenant_key, 'vtime', next_vtime, 'running', running + 1)
+            if redis.call('ZCARD', queue_key) > 0 then
+                redis.call('ZADD', KEYS[3], next_vtime, tenant)
+            else
+                redis.call('ZREM', KEYS[3], tenant)
+            end
+
+            redis.call('HSET', KEYS[2], task_id, ARGV[1])
+            redis.call('HSET', ARGV[2] .. 'task:' .. task_id, 'claimed_by', ARGV[1], 'started_at', ARGV[3])
+            return task_id
+        end
+    end
+end
+return nil
+"""
+
+# Release a claim and free the tenant's running slot
+_ACK_SCRIPT = """
+local tenant = redis.call('HGET', KEYS[2], 'tenant')
+if redis.call('HDEL', KEYS[1], ARGV[1]) == 1 and tenant then
+    redis.call('HINCRBY', ARGV[2] .. 'tenant:' .. tenant, 'running', -1)
+end
+redis.call('DEL', KEYS[2])
+return 1
+"""
+
+# Put a claimed task back in the queue if the claim still belongs to the given node
+# (a dead node, or this node releasing it on drain without counting an attempt);
+# a task that used up its attempts moves to the dead letters instead
+_REQUEUE_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+local data = redis.call('HMGET', KEYS[3], 'score', 'tenant')
+local score, tenant = data[1], data[2]
+if not score then
+    return 0
+end
+local tenant_key = ARGV[4] .. 'tenant:' .. tenant
+redis.call('HINCRBY', tenant_key, 'running', -1)
+local attempts = redis.call('HINCRBY', KEYS[3], 'attempts', tonumber(ARGV[5]))
+if attempts > tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[6], ARGV[1], redis.call('HGET', KEYS[3], 'payload'))
+    redis.call('DEL', KEYS[3])
+    return -1
+end
+redis.call('HDEL', KEYS[3], 'claimed_by', 'started_at')
+redis.call('ZADD', KEYS[1], score, ARGV[1])
+redis.call('ZADD', ARGV[4] .. 'tenant_queue:' .. tenant, score, ARGV[1])
+if not redis.call('ZSCORE', KEYS[4], tenant) then
+    local vclock = tonumber(redis.call('GET', KEYS[5]) or '0')
+    local vtime = math.max(tonumber(redis.call('HGET', tenant_key, 'vtime') or '0'), vclock)
+    redis.call('ZADD', KEYS[4], vtime, tenant)
+end
+return 1
+"""
+
+
+class RedisTaskQueue(TaskQueue):
+    """
+    Durable weighted fair queue shared by any number of agent nodes.
+
+    Keys (under `prefix`):
+        queue              - sorted set of all waiting task ids, scored by priority then arrival
+        tenant_queue:<t>   - waiting task ids of one tenant, same scores
+        tenants            - sorted set of tenants with waiting work, scored by virtual time
+        tenant:<t>         - hash with vtime, running, weight and max_running of a tenant
+        vclock             - virtual time of the last dispatched task
+        task:<id>          - hash with payload, priority, score, tenant, attempts
+        claims             - hash task_id -> node_id for tasks being executed
+        node:<id>          - heartbeat key with a TTL; when it expires the node is dead
+        cancel:<id>        - cancel request for a task running on another node
+        dead_letter        - hash task_id -> payload of tasks that used up `max_attempts`
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        node_id: Optional[str] = None,
+        prefix: str = "writgo:agent",
+        heartbeat_ttl: int = 30,
+        max_attempts: int = 3,
+        poll_interval: float = 0.5,
+        policy: Optional[FairSharePolicy] = None,
+    ):
+        import redis.asyncio as redis_asyncio
+
+        self.redis = redis_asyncio.from_url(redis_url, decode_responses=True)
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.prefix = prefix
+        self.heartbeat_ttl = heartbeat_ttl
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.policy = policy or FairSharePolicy()
+
+        self._push = self.redis.register_script(_PUSH_SCRIPT)
+        self._claim = self.redis.register_script(_CLAIM_SCRIPT)
+        self._ack = self.redis.register_script(_ACK_SCRIPT)
+        self._requeue = self.redis.register_script(_REQUEUE_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    async def push(self, task_id: str, payload: Dict[str, Any], priority: str = "normal"):
+        seq = await self.redis.incr(self._key("seq"))
+        score = priority_rank(priority) * 10**12 + seq
+        share = self.policy.describe(payload)
+        tenant = share["tenant"]
+
+        await self._push(
+            keys=[
+                self._key("queue"),
+                self._key("tenant_queue", tenant),
+                self._key("tenants"),
+                self._key("tenant", tenant),
+                self._key("task", task_id),
+                self._key("vclock"),
+            ],
+            args=[
+                task_id, json.dumps(payload), priority, score, time.time(),
+                tenant, share["plan"], share["weight"], share["max_running"],
+            ],
+        )
+
+    async def pop(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            task_id = await self._claim(
+                keys=[self._key("queue"), self._key("claims"), self._key("tenants"), self._key("vclock")],
+                args=[self.node_id, self.prefix + ":", time.time()],
+            )
+            if task_id:
+                data = await self.redis.hgetall(self._key("task", task_id))
+                if not data:
+                    # Task hash vanished (acked elsewhere); drop the stale claim
+                    await self.redis.hdel(self._key("claims"), task_id)
+                    continue
+                return self._decode(task_id, data)
+
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    async def ack(self, task_id: str):
+        await self._ack(
+            keys=[self._key("claims"), self._key("task", task_id)],
+            args=[task_id, self.prefix + ":"],
+        )
+
+    async def remove(self, task_id: str) -> bool:
+        if not await self.redis.zrem(self._key("queue"), task_id):
+            return False
+
+        tenant = await self.redis.hget(self._key("task", task_id), "tenant")
+        pipe = self.redis.pipeline(transaction=True)
+        if tenant:
+            pipe.zrem(self._key("tenant_queue", tenant), task_id)
+        pipe.delete(self._key("task", task_id))
+        await pipe.execute()
+        return True
+
+    async def contains(self, task_id: str) -> bool:
+        return bool(await self.redis.exists(self._key("task", task_id)))
+
+    async def get_entry(self, task_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.redis.hgetall(self._key("task", task_id))
+        tenant = data.get("tenant")
+        if not tenant:
+            return None
+
+        index = await self.redis.zrank(self._key("tenant_queue", tenant), task_id)
+        if index is None:
+            return None
+
+        vtimes = dict(await self.redis.zrange(self._key("tenants"), 0, -1, withscores=True))
+        pipe = self.redis.pipeline(transaction=False)
+        for name in vtimes:
+            pipe.hget(self._key("tenant", name), "weight")
+            pipe.zcard(self._key("tenant_queue", name))
+        results = await pipe.execute()
+
+        weights = {name: float(results[2 * i] or 1) for i, name in enumerate(vtimes)}
+        waiting = {name: results[2 * i + 1] for i, name in enumerate(vtimes)}
+        others = [
+            (vtime, weights[name], waiting[name])
+            for name, vtime in vtimes.items()
+            if name != tenant
+        ]
+        position = estimate_position(index, vtimes.get(tenant, 0.0), weights.get(tenant, 1.0), others)
+        return {**self._decode(task_id, data), "queue_position": position}
+
+    async def size(self) -> int:
+        return await self.redis.zcard(self._key("queue"))
+
+    async def heartbeat(self):
+        await self.redis.set(self._key("node", self.node_id), time.time(), ex=self.heartbeat_ttl)
+
+    async def requeue_dead(self) -> List[Dict[str, Any]]:
+        claims = await self.redis.hgetall(self._key("claims"))
+        dead = []
+
+        for task_id, node_id in claims.items():
+            if await self.redis.exists(self._key("node", node_id)):
+                continue
+
+            result = await self._requeue(
+                keys=self._requeue_keys(task_id),
+                args=[task_id, node_id, self.max_attempts, self.prefix + ":", 1],
+            )
+            if result == 1:
+                logger.warning(f"Requeued task {task_id} from dead node {node_id}")
+            elif result == -1:
+                logger.error(f"Task {task_id} exceeded {self.max_attempts} attempts, moved to the dead letters")
+                payload = await self.redis.hget(self._key("dead_letter"), task_id)
+                dead.append({"task_id": task_id, "payload": json.loads(payload) if payload else {}})
+
+        return dead
+
+    async def release(self, task_id: str):
+        await self._requeue(
+            keys=self._requeue_keys(task_id),
+            args=[task_id, self.node_id, self.max_attempts, self.prefix + ":", 0],
+        )
+
+    def _requeue_keys(self, task_id: str) -> List[str]:
+        return [
+            self._key("queue"),
+            self._key("claims"),
+            self._key("task", task_id),
+            self._key("tenants"),
+            self._key("vclock"),
+            self._key("dead_letter"),
+        ]
+
+    async def request_cancel(self, task_id: str):
+        await self.redis.set(self._key("cancel", task_id), self.node_id, ex=3600)
+
+    async def pop_cancel_requests(self, task_ids: List[str]) -> List[str]:
+        if not task_ids:
+            return []
+
+        keys = [self._key("cancel", task_id) for task_id in task_ids]
+        values = await self.redis.mget(keys)
+        requested = [task_id for task_id, value in zip(task_ids, values) if value]
+        if requested:
+            await self.redis.delete(*[self._key("cancel", task_id) for task_id in requested])
+        return requested
+
+    async def close(self):
+        await self.redis.delete(self._key("node", self.node_id))
+        await self.redis.close()
+
+    def _decode(self, task_id: str, data: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "task_id": task_id,
+            "payload": json.loads(data["payload"]),
+            "priority": data.get("priority", "normal"),
+            "tenant": data.get("tenant"),
+            "plan": data.get("plan", DEFAULT_PLAN),
+            "enqueued_at": float(data.get("enqueued_at", 0)),
+            "attempts": int(data.get("attempts", 0)),
+        }
+
+
+def create_task_queue(config: Dict) -> TaskQueue:
+    """
+    Factory function to create the configured task queue.
+
+    Args:
+        config: Configuration dict with QUEUE_BACKEND, REDIS_URL and the FAIR_SHARE_* settings
+
+    Returns:
+        TaskQueue instance
+    """
+    backend = config.get("QUEUE_BACKEND", "memory").lower()
+    policy = FairSharePolicy(
+        key=config.get("FAIR_SHARE_KEY", "user"),
+        weights=parse_tier_map(config.get("FAIR_SHARE_WEIGHTS")),
+        max_running=parse_tier_map(config.get("FAIR_SHARE_MAX_RUNNING")),
+    )
+
+    if backend == "redis":
+        queue = RedisTaskQueue(
+            redis_url=config.get("REDIS_URL", "redis://localhost:6379"),
+            node_id=config.get("NODE_ID"),
+            heartbeat_ttl=config.get("QUEUE_HEARTBEAT_TTL", 30),
+            policy=policy,
+        )
+        logger.info(f"Redis task queue initialized (node {queue.node_id})")
+        return queue
+
+    if backend != "memory":
+        raise ValueError(f"Unknown QUEUE_BACKEND: {backend}")
+
+    logger.info("In-memory task queue initialized")
+    return MemoryTaskQueue(policy=policy)
@@ -0,0 +1,126 @@
+"""
+Task Registry - Bounded task-state store
+Keeps a compact status record per task and evicts finished tasks by TTL and size
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRegistry:
+    """
+    In-memory task status registry.
+    Finished tasks are kept for `ttl` seconds as a small summary;
+    a single janitor task sweeps expired entries.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 1000, sweep_interval: float = 60):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._finished_at: "OrderedDict[str, float]" = OrderedDict()
+        self._janitor: Optional[asyncio.Task] = None
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a copy of the task's status record."""
+        entry = self._entries.get(task_id)
+        return dict(entry) if entry is not None else None
+
+    def register(self, task_id: str, **fields) -> Dict[str, Any]:
+        """Register a new (or re-submitted) task."""
+        self._finished_at.pop(task_id, None)
+        self._entries[task_id] = {
+            "status": "queued",
+            "started_at": datetime.now().isoformat(),
+            **fields
+        }
+        self._entries.move_to_end(task_id)
+
+        if len(self._entries) > self.max_entries:
+            self._evict_overflow()
+
+        return self._entries[task_id]
+
+    def update(self, task_id: str, **fields):
+        """Update fields of a task's status record."""
+        entry = self._entries.get(task_id)
+        if entry is None:
+            entry = self.register(task_id)
+        entry.update(fields)
+
+    def finish(self, task_id: str, status: str, **summary):
+        """
+        Mark a task as finished. Only the given compact summary is kept;
+        callers must not store agent, sandbox or full results here.
+        """
+        self.update(task_id, status=status, completed_at=datetime.now().isoformat(), **summary)
+        self._finished_at[task_id] = time.monotonic()
+        self._finished_at.move_to_end(task_id)
+
+    def is_finished(self, task_id: str) -> bool:
+        return task_id in self._finished_at
+
+    def sweep(self) -> int:
+        """Remove finished tasks older than the TTL. Returns the number removed."""
+        cutoff = time.monotonic() - self.ttl
+        removed = 0
+
+        # _finished_at is ordered by finish time, so stop at the first fresh entry
+        while self._finished_at:
+            task_id, finished_at = next(iter(self._finished_at.items()))
+            if finished_at > cutoff:
+                break
+            self._finished_at.popitem(last=False)
+            self._entries.pop(task_id, None)
+            removed += 1
+
+        if removed:
+            logger.info(f"Task registry evicted {removed} expired tasks ({len(self._entries)} remaining)")
+        return removed
+
+    def _evict_overflow(self):
+        """Drop the oldest finished tasks until the registry fits max_entries."""
+        while len(self._entries) > self.max_entries and self._finished_at:
+            task_id, _ = self._finished_at.popitem(last=False)
+            self._entries.pop(task_id, None)
+
+        if len(self._entries) > self.max_entries:
+            logger.warning(
+                f"Task registry holds {len(self._entries)} active tasks "
+                f"(max_entries={self.max_entries})"
+            )
+
+    async def start(self):
+        """Start the janitor."""
+        if not self._janitor:
+            self._janitor = asyncio.create_task(self._janitor_loop())
+
+    async def stop(self):
+        """Stop the janitor."""
+        if self._janitor:
+            self._janitor.cancel()
+            await asyncio.gather(self._janitor, return_exceptions=True)
+            self._janitor = None
+
+    async def _janitor_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Task registry sweep failed: {e}")
+
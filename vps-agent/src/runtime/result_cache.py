@@ -0,0 +1,154 @@
+"""
+Result Cache - Reuse agent results for identical task submissions
+Completed results are kept compressed for a TTL within a byte budget; identical
+submissions made while a run is in flight attach to that run instead of starting their own
+"""
+
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize unicode and whitespace so trivially different prompts share a key."""
+    return " ".join(unicodedata.normalize("NFC", prompt or "").split())
+
+
+class ResultCache:
+    """
+    In-memory TTL cache of completed agent results.
+
+    Keys cover the normalized prompt, the user and project, and the model
+    configuration, so a result is never served to another tenant or after
+    the models change. Per key at most one run is in flight (the leader);
+    identical submissions are recorded as followers and get the leader's result.
+
+    Results hold file contents and events, so they are stored as compressed
+    JSON and the least recently used ones are evicted once the stored bytes
+    exceed `max_bytes`; a result larger than the whole budget is not cached.
+    """
+
+    def __init__(self, ttl: float = 3600, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stored_bytes = 0
+        self._leaders: Dict[str, str] = {}
+        self._followers: Dict[str, List[Dict[str, Any]]] = {}
+        self.hits = 0
+        self.attached = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def key_for(
+        prompt: str,
+        user_id: str,
+        project_id: Optional[str],
+        model_config: Dict[str, Any],
+    ) -> str:
+        """Cache key for a task submission."""
+        material = json.dumps(
+            {
+                "prompt": normalize_prompt(prompt),
+                "user_id": user_id,
+                "project_id": project_id,
+                "model": model_config,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached result, or None if missing or expired."""
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+
+        if time.monotonic() - entry["stored_at"] > self.ttl:
+            self._drop(key)
+            return None
+
+        self._results.move_to_end(key)
+        self.hits += 1
+        return json.loads(zlib.decompress(entry["data"]))
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a completed result."""
+        data = zlib.compress(json.dumps(result, default=str).encode("utf-8"))
+        self._drop(key)
+        if len(data) > self.max_bytes:
+            logger.info(f"Result of {len(data)} compressed bytes exceeds the result cache budget, not cached")
+            return
+
+        self._results[key] = {"data": data, "stored_at": time.monotonic()}
+        self.stored_bytes += len(data)
+
+        while self.stored_bytes > self.max_bytes:
+            self._drop(next(iter(self._results)))
+
+    def _drop(self, key: str):
+        entry = self._results.pop(key, None)
+        if entry:
+            self.stored_bytes -= len(entry["data"])
+
+    def leader(self, key: str) -> Optional[str]:
+        """Task id of the run in flight for this key."""
+        return self._leaders.get(key)
+
+    def start(self, key: str, task_id: str):
+        """Mark `task_id` as the in-flight run for this key."""
+        self._leaders[key] = task_id
+
+    def attach(self, key: str, payload: Dict[str, Any]):
+        """Attach a task (as its TaskRequest payload) to the in-flight run."""
+        self._followers.setdefault(key, []).append(payload)
+        self.attached += 1
+
+    def detach(self, task_id: str) -> bool:
+        """Remove an attached task (e.g. on cancel). Returns True if it was attached."""
+        for key, followers in self._followers.items():
+            for payload in followers:
+                if payload["task_id"] == task_id:
+                    followers.remove(payload)
+                    if not followers:
+                        del self._followers[key]
+                    return True
+        return False
+
+    def attached_payloads(self) -> List[Dict[str, Any]]:
+        """Payloads of all tasks waiting on an in-flight run."""
+        return [payload for followers in self._followers.values() for payload in followers]
+
+    def complete(self, key: str, task_id: str) -> List[Dict[str, Any]]:
+        """
+        End the in-flight run of `task_id` for this key.
+
+        Returns:
+            Payloads of the attached tasks (empty if `task_id` was not the leader)
+        """
+        if self._leaders.get(key) != task_id:
+            return []
+
+        del self._leaders[key]
+        return self._followers.pop(key, [])
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        return {
+            "entries": len(self._results),
+            "stored_bytes": self.stored_bytes,
+            "in_flight": len(self._leaders),
+            "hits": self.hits,
+            "attached": self.attached,
+        }
@@ -0,0 +1,93 @@
+"""
+Result Delivery - Split large task results into gzip file parts
+Small results go out as one JSON webhook; large ones upload each file as
+chunks first and then send a manifest that references them
+"""
+
+import copy
+import gzip
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, Dict, List
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PATH = "/upload"
+
+
+def build_result_deliveries(
+    task_id: str,
+    payload: Dict[str, Any],
+    inline_limit: int = 256 * 1024,
+    chunk_size: int = 1024 * 1024,
+) -> List[Dict[str, Any]]:
+    """
+    Turn a result webhook payload into one or more outbox deliveries.
+
+    Args:
+        task_id: Task the result belongs to
+        payload: Full result webhook payload (file contents inline)
+        inline_limit: Max JSON size in bytes that is still sent inline
+        chunk_size: Max size in bytes of one uploaded chunk (after gzip)
+
+    Returns:
+        List of enqueue() kwargs; chunk uploads first, the manifest last
+    """
+    files = ((payload.get("result_data") or {}).get("result_data")) or {}
+    size = len(json.dumps(payload, default=str).encode("utf-8"))
+
+    if size <= inline_limit or not files:
+        return [{"kind": "result", "payload": payload}]
+
+    upload_id = uuid.uuid4().hex
+    deliveries = []
+    uploaded = []
+
+    for filename, content in files.items():
+        raw = content.encode("utf-8") if isinstance(content, str) else json.dumps(content).encode("utf-8")
+        compressed = gzip.compress(raw, compresslevel=6)
+        digest = hashlib.sha256(compressed).hexdigest()
+        chunks = [compressed[i:i + chunk_size] for i in range(0, len(compressed), chunk_size)] or [b""]
+
+        for index, chunk in enumerate(chunks):
+            deliveries.append({
+                "kind": "result_chunk",
+                "path": UPLOAD_PATH,
+                "headers": {
+                    "Content-Type": "application/gzip",
+                    "X-Task-Id": task_id,
+                    "X-Upload-Id": upload_id,
+                    "X-File-Name": quote(filename, safe=""),
+                    "X-Chunk-Index": str(index),
+                    "X-Chunk-Count": str(len(chunks)),
+                    "X-Content-Sha256": digest,
+                },
+                "body": chunk,
+            })
+
+        uploaded.append({
+            "filename": filename,
+            "upload_id": upload_id,
+            "chunks": len(chunks),
+            "size": len(raw),
+            "gzip_size": len(compressed),
+            "sha256": digest,
+        })
+
+    manifest = copy.deepcopy({k: v for k, v in payload.items() if k != "result_data"})
+    manifest["result_data"] = {
+        **{k: v for k, v in payload["result_data"].items() if k != "result_data"},
+        "result_data": {},
+        "uploaded_files": uploaded,
+    }
+    manifest["delivery"] = "chunked"
+    deliveries.append({"kind": "result", "payload": manifest})
+
+    logger.info(
+        f"Result for task {task_id} is {size} bytes; sending {len(uploaded)} files "
+        f"as {len(deliveries) - 1} chunks plus manifest"
+    )
+    return deliveries
@@ -0,0 +1,54 @@
+"""
+Sandbox Pool - Global limit on running sandbox containers
+Every agent loop (a task or one of its parallel plan steps) holds a slot while
+its sandbox runs, so the host never runs more containers than the pool allows
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SandboxPool:
+    """
+    Counting semaphore over sandbox containers, shared by all worker slots.
+
+    A task's agent loop takes one slot; a task fanned out over parallel plan
+    steps takes one per running step instead (the parent loop starts no
+    sandbox then). Nothing holds a slot while waiting for another, so the
+    pool cannot deadlock.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._semaphore = asyncio.Semaphore(self.size)
+        self.in_use = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a sandbox slot for the duration of the block, waiting for one if the pool is full."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_use += 1
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool statistics."""
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "free": self.size - self.in_use,
+        }
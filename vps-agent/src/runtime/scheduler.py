@@ -0,0 +1,245 @@
+"""
+Task Scheduler - Bounded priority worker pool
+Runs at most N agent tasks concurrently and pulls the rest from a TaskQueue
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .fairshare import DEFAULT_PLAN
+from .metrics import QUEUE_WAIT
+from .queue import TaskQueue, MemoryTaskQueue, PRIORITY_RANKS
+
+logger = logging.getLogger(__name__)
+
+
+class TaskScheduler:
+    """
+    Worker pool with a fixed number of agent slots.
+    Each slot pulls the next task from the queue when it becomes free;
+    the queue shares slots fairly between tenants and orders each
+    tenant's tasks by priority. Tasks the queue gives up on (too many
+    attempts on dead nodes) go to `dead_letter_handler`.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        max_concurrent: int = 2,
+        queue: Optional[TaskQueue] = None,
+        heartbeat_interval: float = 10.0,
+        dead_letter_handler: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ):
+        self.handler = handler
+        self.dead_letter_handler = dead_letter_handler
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue = queue or MemoryTaskQueue()
+        self.heartbeat_interval = heartbeat_interval
+
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self.draining = False
+        self.avg_task_seconds: Optional[float] = None  # EWMA of task run time
+
+    async def start(self):
+        """Start the worker pool and the queue heartbeat."""
+        if self._workers:
+            return
+
+        await self.queue.heartbeat()
+
+        for i in range(self.max_concurrent):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        self._workers.append(asyncio.create_task(self._heartbeat_loop()))
+
+        logger.info(f"Task scheduler started with {self.max_concurrent} agent slots")
+
+    async def stop(self):
+        """Stop the worker pool. Running tasks are cancelled."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        await self.queue.close()
+        logger.info("Task scheduler stopped")
+
+    async def drain(self) -> List[str]:
+        """
+        Stop taking new tasks and interrupt the running ones.
+        Interrupted tasks are released back to the queue instead of acked;
+        handlers can check `draining` to checkpoint instead of finishing.
+
+        Returns:
+            Ids of the interrupted tasks
+        """
+        self.draining = True
+        running = list(self._running.values())
+        for entry in running:
+            entry["handle"].cancel()
+
+        await asyncio.gather(*(entry["handle"] for entry in running), return_exceptions=True)
+
+        interrupted = []
+        for entry in running:
+            if entry["handle"].cancelled():
+                await self.queue.release(entry["task_id"])
+                interrupted.append(entry["task_id"])
+
+        logger.info(f"Task scheduler drained, {len(interrupted)} running tasks interrupted")
+        return interrupted
+
+    async def submit(self, task_id: str, payload: Dict[str, Any], priority: str = "normal") -> int:
+        """
+        Queue a task for execution.
+
+        Returns:
+            1-based queue position of the task
+        """
+        if task_id in self._running or await self.queue.contains(task_id):
+            raise ValueError(f"Task {task_id} is already scheduled")
+
+        await self.queue.push(task_id, payload, priority)
+
+        entry = await self.queue.get_entry(task_id)
+        position = entry["queue_position"] if entry else 0
+        logger.info(f"Task {task_id} queued with priority {priority} at position {position}")
+        return position
+
+    async def cancel(self, task_id: str) -> Optional[str]:
+        """
+        Cancel a task.
+
+        Returns:
+            "queued" if removed from the queue, "running" if the running handler
+            was cancelled here, "remote" if another node was asked to cancel it,
+            or None if the task is unknown
+        """
+        running = self._running.get(task_id)
+        if running:
+            running["handle"].cancel()
+            logger.info(f"Cancelling running task {task_id}")
+            return "running"
+
+        if await self.queue.remove(task_id):
+            logger.info(f"Removed task {task_id} from the queue")
+            return "queued"
+
+        if await self.queue.contains(task_id):
+            await self.queue.request_cancel(task_id)
+            logger.info(f"Requested cancellation of task {task_id} on its node")
+            return "remote"
+
+        return None
+
+    async def get_queue_info(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get queue position and wait time for a waiting or running task."""
+        running = self._running.get(task_id)
+        if running:
+            return {
+                "queue_position": 0,
+                "wait_seconds": round(running["started_at"] - running["enqueued_at"], 3),
+            }
+
+        entry = await self.queue.get_entry(task_id)
+        if entry:
+            return {
+                "queue_position": entry["queue_position"],
+                "wait_seconds": round(time.time() - entry["enqueued_at"], 3),
+            }
+
+        return None
+
+    async def stats(self) -> Dict[str, Any]:
+        """Get scheduler statistics."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": len(self._running),
+            "queued": await self.queue.size(),
+            "free_slots": self.max_concurrent - len(self._running),
+            "avg_task_seconds": self.avg_task_seconds,
+        }
+
+    async def _worker(self, worker_id: int):
+        """Worker slot: pull the next task and run it to completion."""
+        while True:
+            if self.draining:
+                await asyncio.sleep(1.0)
+                continue
+
+            try:
+                entry = await self.queue.pop(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker {worker_id} failed to pull from queue: {e}")
+                await asyncio.sleep(1.0)
+                continue
+
+            if not entry:
+                continue
+
+            if self.draining:
+                # Claimed while a drain started
+                await self.queue.release(entry["task_id"])
+                continue
+
+            task_id = entry["task_id"]
+            entry["started_at"] = time.time()
+            self._running[task_id] = entry
+
+            wait = entry["started_at"] - entry["enqueued_at"]
+            priority = entry.get("priority", "normal")
+            QUEUE_WAIT.labels(
+                priority if priority in PRIORITY_RANKS else "normal",
+                entry.get("plan", DEFAULT_PLAN)
+            ).observe(max(wait, 0.0))
+            logger.info(f"Worker {worker_id} starting task {task_id} after {wait:.1f}s in queue")
+
+            # Run the handler as its own task so it can be cancelled without stopping the worker
+            entry["handle"] = asyncio.create_task(self.handler(entry["payload"]))
+            try:
+                await entry["handle"]
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    # The worker itself is being stopped
+                    entry["handle"].cancel()
+                    raise
+                logger.info(f"Task {task_id} was cancelled")
+            except Exception as e:
+                logger.error(f"Task {task_id} raised in worker {worker_id}: {e}", exc_info=True)
+            finally:
+                self._running.pop(task_id, None)
+                self._record_duration(time.time() - entry["started_at"])
+
+            # Interrupted by drain(), which releases the claim instead
+            if self.draining and entry["handle"].cancelled():
+                continue
+
+            await self.queue.ack(task_id)
+
+    def _record_duration(self, seconds: float, alpha: float = 0.2):
+        if self.avg_task_seconds is None:
+            self.avg_task_seconds = seconds
+        else:
+            self.avg_task_seconds = alpha * seconds + (1 - alpha) * self.avg_task_seconds
+
+    async def _heartbeat_loop(self):
+        """Keep this node's claims alive and requeue work from dead nodes."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.queue.heartbeat()
+                for entry in await self.queue.requeue_dead():
+                    if self.dead_letter_handler:
+                        await self.dead_letter_handler(entry)
+
+                for task_id in await self.queue.pop_cancel_requests(list(self._running)):
+                    running = self._running.get(task_id)
+                    if running:
+                        logger.info(f"Cancelling task {task_id} on request of another node")
+                        running["handle"].cancel()
+            except Exception as e:
+                logger.error(f"Queue heartbeat failed: {e}")
@@ -0,0 +1,411 @@
+"""
+Webhook Dispatcher - Persistent outbox for WritGo.nl callbacks
+Deliveries are written to SQLite first and sent by a background loop with retries
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+from .metrics import WEBHOOK_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying; any other 4xx is treated as a permanent failure
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+
+class WebhookOutbox:
+    """
+    SQLite-backed outbox of pending webhook deliveries.
+    Calls are blocking and meant to run in a worker thread.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                dead INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt_at)"
+        )
+
+        # Raw-body deliveries (result file chunks); added after the first release
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        for column, ddl in (
+            ("path", "TEXT NOT NULL DEFAULT ''"),
+            ("headers", "TEXT"),
+            ("body", "BLOB"),
+        ):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE outbox ADD COLUMN {column} {ddl}")
+
+    def add(
+        self,
+        task_id: str,
+        kind: str,
+        payload: Optional[Dict[str, Any]],
+        skip_ids: Set[int],
+        path: str = "",
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+    ) -> int:
+        """
+        Add a delivery.
+        A status update replaces the task's older undelivered status updates;
+        a final result or error makes them obsolete.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM outbox WHERE task_id = ? AND kind = 'status' AND dead = 0",
+                (task_id,)
+            ).fetchall()
+            stale = [row[0] for row in rows if row[0] not in skip_ids]
+            if stale:
+                self._conn.execute(
+                    f"DELETE FROM outbox WHERE id IN ({','.join('?' * len(stale))})",
+                    stale
+                )
+
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (task_id, kind, payload, next_attempt_at, created_at, path, headers, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    task_id, kind, json.dumps(payload), now, now,
+                    path, json.dumps(headers) if headers else None, body
+                )
+            )
+            return cursor.lastrowid
+
+    def due(self, limit: int) -> List[Dict[str, Any]]:
+        """Get deliveries whose next attempt is due, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, task_id, kind, payload, attempts, path, headers, body FROM outbox "
+                "WHERE dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+
+        return [
+            {
+                "id": r[0], "task_id": r[1], "kind": r[2], "payload": json.loads(r[3]), "attempts": r[4],
+                "path": r[5] or "", "headers": json.loads(r[6]) if r[6] else {}, "body": r[7]
+            }
+            for r in rows
+        ]
+
+    def has_earlier(self, task_id: str, delivery_id: int) -> bool:
+        """Check if an older undelivered entry exists for the same task."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM outbox WHERE task_id = ? AND id < ? AND dead = 0 LIMIT 1",
+                (task_id, delivery_id)
+            ).fetchone()
+        return row is not None
+
+    def dead_uploads(self, task_id: str) -> Set[str]:
+        """Upload ids of the task's result chunks that were given up."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT headers FROM outbox WHERE task_id = ? AND kind = 'result_chunk' AND dead = 1",
+                (task_id,)
+            ).fetchall()
+        return {json.loads(row[0]).get("X-Upload-Id") for row in rows if row[0]}
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next scheduled attempt, or None if empty."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE dead = 0"
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def delete(self, delivery_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (delivery_id,))
+
+    def reschedule(self, delivery_id: int, attempts: int, delay: float, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, delivery_id)
+            )
+
+    def mark_dead(self, delivery_id: int, attempts: int, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET dead = 1, attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, delivery_id)
+            )
+
+    def pending_count(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 0").fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WebhookDispatcher:
+    """
+    Asynchronous webhook delivery to WritGo.nl.
+    Uses one keep-alive HTTP client, coalesces status updates per task
+    and retries failed deliveries with exponential backoff.
+    JSON bodies above `compress_min_bytes` are sent gzip-encoded.
+    """
+
+    def __init__(
+        self,
+        webhook_url: str,
+        secret: Optional[str],
+        outbox_path: str,
+        max_attempts: int = 20,
+        concurrency: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        timeout: float = 30.0,
+        compress_min_bytes: int = 1024,
+    ):
+        self.webhook_url = webhook_url
+        self.secret = secret
+        self.outbox = WebhookOutbox(outbox_path)
+        self.max_attempts = max_attempts
+        self.concurrency = max(1, concurrency)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.compress_min_bytes = compress_min_bytes
+
+        self.client: Optional[httpx.AsyncClient] = None
+        self._wakeup = asyncio.Event()
+        self._in_flight: Set[int] = set()
+        self._deliveries: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        """Open the shared HTTP client and start the delivery loop."""
+        if self._loop_task:
+            return
+
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            headers={
+                "Authorization": f"Bearer {self.secret}"
+            }
+        )
+        self._stopping = False
+        self._loop_task = asyncio.create_task(self._run())
+
+        pending = await asyncio.to_thread(self.outbox.pending_count)
+        logger.info(f"Webhook dispatcher started ({pending} pending deliveries in outbox)")
+
+    async def stop(self):
+        """Stop the delivery loop. Undelivered entries stay in the outbox."""
+        if self._loop_task:
+            # wait_for() in Python < 3.12 can swallow a cancel that races with the
+            # wakeup, so the loop also checks this flag
+            self._stopping = True
+            self._wakeup.set()
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+        # Interrupted deliveries are retried from the outbox on next start
+        for task in list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+        await asyncio.to_thread(self.outbox.close)
+        logger.info("Webhook dispatcher stopped")
+
+    async def enqueue(
+        self,
+        task_id: str,
+        kind: str,
+        payload: Optional[Dict[str, Any]] = None,
+        path: str = "",
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+    ):
+        """
+        Persist a delivery and return immediately.
+
+        Args:
+            task_id: Task the delivery belongs to
+            kind: "status", "result", "result_chunk", "error" or "cancelled"
+            payload: JSON body for the webhook
+            path: Suffix appended to the webhook URL (e.g. "/upload")
+            headers: Extra request headers for raw-body deliveries
+            body: Raw request body, sent instead of the JSON payload
+        """
+        await asyncio.to_thread(
+            self.outbox.add, task_id, kind, payload, set(self._in_flight), path, headers, body
+        )
+        self._wakeup.set()
+
+    async def _run(self):
+        """Delivery loop: send due entries, in order per task."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        while not self._stopping:
+            try:
+                due = await asyncio.to_thread(self.outbox.due, self.concurrency * 4)
+            except Exception as e:
+                logger.error(f"Failed to read webhook outbox: {e}")
+                due = []
+
+            busy_tasks = set()
+            for delivery in due:
+                if delivery["id"] in self._in_flight or delivery["task_id"] in busy_tasks:
+                    busy_tasks.add(delivery["task_id"])
+                    continue
+                busy_tasks.add(delivery["task_id"])
+
+                # Keep per-task order: never overtake an older entry still in backoff
+                if await asyncio.to_thread(self.outbox.has_earlier, delivery["task_id"], delivery["id"]):
+                    continue
+
+                # A manifest cannot be assembled once one of its chunks was given up
+                if await self._chunks_lost(delivery):
+                    continue
+
+                self._in_flight.add(delivery["id"])
+                task = asyncio.create_task(self._deliver(delivery, semaphore))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+            self._wakeup.clear()
+            next_due = await asyncio.to_thread(self.outbox.next_due_in)
+            wait = 1.0 if next_due is None else min(max(next_due, 0.05), 5.0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, delivery: Dict[str, Any], semaphore: asyncio.Semaphore):
+        """Send one delivery and record the outcome in the outbox."""
+        try:
+            await self._attempt(delivery, semaphore)
+        except Exception as e:
+            logger.error(f"Webhook outbox update failed for task {delivery['task_id']}: {e}")
+        finally:
+            self._in_flight.discard(delivery["id"])
+            self._wakeup.set()
+
+    async def _chunks_lost(self, delivery: Dict[str, Any]) -> bool:
+        """Give up a chunked result manifest whose chunk uploads were given up."""
+        if delivery["kind"] != "result" or (delivery["payload"] or {}).get("delivery") != "chunked":
+            return False
+
+        uploads = {
+            uploaded["upload_id"]
+            for uploaded in delivery["payload"]["result_data"].get("uploaded_files", [])
+        }
+        lost = uploads & await asyncio.to_thread(self.outbox.dead_uploads, delivery["task_id"])
+        if not lost:
+            return False
+
+        error = f"Result chunks of upload {', '.join(sorted(lost))} were given up"
+        await asyncio.to_thread(self.outbox.mark_dead, delivery["id"], delivery["attempts"], error)
+        logger.error(f"Webhook result for task {delivery['task_id']} not sent: {error}")
+
+        # Tell WritGo.nl the result is lost instead of leaving the task running there
+        await self.enqueue(delivery["task_id"], "error", {
+            "task_id": delivery["task_id"],
+            "status": "failed",
+            "error_message": f"Result could not be delivered: {error}"
+        })
+        return True
+
+    def _encode(self, delivery: Dict[str, Any]) -> tuple[bytes, Dict[str, str]]:
+        """Build the request body and headers for a delivery."""
+        if delivery["body"] is not None:
+            return delivery["body"], delivery["headers"]
+
+        content = json.dumps(delivery["payload"], default=str).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if len(content) >= self.compress_min_bytes:
+            content = gzip.compress(content, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        return content, headers
+
+    async def _attempt(self, delivery: Dict[str, Any], semaphore: asyncio.Semaphore):
+        delivery_id = delivery["id"]
+        attempts = delivery["attempts"] + 1
+
+        started = time.perf_counter()
+        try:
+            content, headers = self._encode(delivery)
+            async with semaphore:
+                started = time.perf_counter()
+                response = await self.client.post(
+                    self.webhook_url + delivery["path"],
+                    content=content,
+                    headers=headers
+                )
+
+            outcome = "ok" if response.status_code < 400 else f"http_{response.status_code // 100}xx"
+            WEBHOOK_LATENCY.labels(delivery["kind"], outcome).observe(time.perf_counter() - started)
+
+            if response.status_code < 400:
+                await asyncio.to_thread(self.outbox.delete, delivery_id)
+                logger.info(f"Webhook {delivery['kind']} delivered for task {delivery['task_id']}")
+                return
+
+            error = f"HTTP {response.status_code}"
+            retryable = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES
+
+        except httpx.HTTPError as e:
+            WEBHOOK_LATENCY.labels(delivery["kind"], "error").observe(time.perf_counter() - started)
+            error = f"{type(e).__name__}: {e}"
+            retryable = True
+
+        if not retryable or attempts >= self.max_attempts:
+            await asyncio.to_thread(self.outbox.mark_dead, delivery_id, attempts, error)
+            logger.error(
+                f"Webhook {delivery['kind']} for task {delivery['task_id']} "
+                f"given up after {attempts} attempts: {error}"
+            )
+            return
+
+        delay = min(self.base_delay * (2 ** (attempts - 1)), self.max_delay)
+        delay *= random.uniform(0.8, 1.2)
+        await asyncio.to_thread(self.outbox.reschedule, delivery_id, attempts, delay, error)
+        logger.warning(
+            f"Webhook {delivery['kind']} for task {delivery['task_id']} failed ({error}), "
+            f"retry {attempts}/{self.max_attempts} in {delay:.1f}s"
+        )
@@ -6,12 +6,35 @@ Implements Manus.im's Ubuntu VM concept with Docker containers
 import asyncio
 import docker
 import logging
+import time
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 import tempfile
+import uuid
+
+from ..runtime.metrics import SANDBOX_EXEC_LATENCY
 
 logger = logging.getLogger(__name__)
 
+# Exit code of coreutils `timeout` when the limit is hit; 137 (SIGKILL) if the
+# process ignored SIGTERM, which is only a timeout once the limit has passed
+TIMEOUT_EXIT_CODE = 124
+KILLED_EXIT_CODE = 137
+
+
+def format_exec_result(result: Dict[str, Any], success_message: str = "Code executed successfully") -> str:
+    """Render a structured exec result as the observation text the LLM sees."""
+    if result.get("error"):
+        return f"Error: {result['error']}"
+
+    output = result.get("stdout", "")
+    if result.get("stderr"):
+        output += "\nSTDERR:\n" + result["stderr"]
+    if result.get("timed_out"):
+        output += f"\nTimed out after {result.get('timeout')}s"
+
+    return output if output else f"{success_message} (exit code: {result.get('exit_code')})"
+
 
 class DockerSandbox:
     """
@@ -78,87 +101,96 @@ class DockerSandbox:
             logger.error(f"Failed to start sandbox: {e}")
             raise
 
-    async def stop(self):
-        """Stop and cleanup the sandbox container."""
+    async def stop(self, force: bool = False):
+        """
+        Stop and cleanup the sandbox container.
+        With force=True the container is killed at once, which also
+        terminates any exec still running inside it.
+        """
         if self.container:
+            container, self.container = self.container, None
             try:
-                logger.info("Stopping sandbox container")
-                self.container.stop(timeout=5)
+                if force:
+                    logger.info("Killing sandbox container")
+                    await asyncio.to_thread(container.kill)
+                else:
+                    logger.info("Stopping sandbox container")
+                    await asyncio.to_thread(container.stop, timeout=5)
                 logger.info("Sandbox container stopped")
             except Exception as e:
                 logger.error(f"Error stopping container: {e}")
 
-    async def run_python(self, code: str) -> str:
+    async def _exec(self, command, **kwargs):
+        """
+        Run exec_run in a worker thread so the event loop stays responsive
+        and the task can be cancelled while the command runs.
+        """
+        container = self.container
+        if container is None:
+            raise RuntimeError("Sandbox is not running")
+        return await asyncio.to_thread(container.exec_run, command, **kwargs)
+
+    async def run_python(self, code: str) -> Dict[str, Any]:
         """
         Execute Python code in the sandbox.
         Implements CodeAct paradigm from Manus.im research.
+
+        Returns:
+            {exit_code, stdout, stderr, timed_out, timeout, error}; see format_exec_result()
         """
         logger.info("Executing Python code in sandbox")
 
-        # Write code to temp file
-        code_filename = f"_agent_code_{asyncio.get_event_loop().time()}.py"
-        code_path = f"/workspace/{code_filename}"
-
-        # Write code to file in container
-        exit_code, output = self.container.exec_run(
-            f"bash -c 'cat > {code_path}'",
-            stdin=True,
-            demux=True
-        )
-
-        # Send code via stdin
-        self.container.attach_socket(params={'stdin': 1, 'stdout': 1, 'stderr': 1})
+        # The workspace is bind-mounted, so the code file is written on the host side
+        code_filename = f"_agent_code_{uuid.uuid4().hex}.py"
+        code_file = Path(self.workspace_dir) / code_filename
+        await asyncio.to_thread(code_file.write_text, code, encoding="utf-8")
 
-        # Execute code
         try:
-            exit_code, output = self.container.exec_run(
-                f"python {code_path}",
-                timeout=self.timeout,
-                demux=True
-            )
-
-            stdout, stderr = output
-
-            result = ""
-            if stdout:
-                result += stdout.decode('utf-8')
-            if stderr:
-                result += "\nSTDERR:\n" + stderr.decode('utf-8')
-
-            logger.info(f"Python execution completed with exit code: {exit_code}")
-
-            return result if result else f"Code executed successfully (exit code: {exit_code})"
-
-        except Exception as e:
-            logger.error(f"Python execution error: {e}")
-            return f"Error executing Python code: {str(e)}"
+            return await self._run_command("python", ["python", f"/workspace/{code_filename}"])
+        finally:
+            await asyncio.to_thread(code_file.unlink, missing_ok=True)
 
-    async def run_shell(self, command: str) -> str:
-        """Execute shell command in the sandbox."""
+    async def run_shell(self, command: str) -> Dict[str, Any]:
+        """Execute shell command in the sandbox. Returns a structured result like run_python()."""
         logger.info(f"Executing shell command: {command[:100]}...")
-
+        return await self._run_command("shell", ["bash", "-c", command])
+
+    async def _run_command(self, kind: str, argv: List[str]) -> Dict[str, Any]:
+        """Run a command under `timeout` in the container and collect a structured result."""
+        result = {
+            "exit_code": None,
+            "stdout": "",
+            "stderr": "",
+            "timed_out": False,
+            "timeout": self.timeout,
+            "error": None,
+        }
+
+        started = time.perf_counter()
         try:
-            exit_code, output = self.container.exec_run(
-                f"bash -c '{command}'",
-                timeout=self.timeout,
+            exit_code, output = await self._exec(
+                ["timeout", "-k", "5", str(self.timeout), *argv],
                 demux=True
             )
+            stdout, stderr = output or (None, None)
 
-            stdout, stderr = output
-
-            result = ""
-            if stdout:
-                result += stdout.decode('utf-8')
-            if stderr:
-                result += "\nSTDERR:\n" + stderr.decode('utf-8')
-
-            logger.info(f"Shell command completed with exit code: {exit_code}")
+            result["exit_code"] = exit_code
+            result["stdout"] = stdout.decode("utf-8", errors="replace") if stdout else ""
+            result["stderr"] = stderr.decode("utf-8", errors="replace") if stderr else ""
+            result["timed_out"] = exit_code == TIMEOUT_EXIT_CODE or (
+                exit_code == KILLED_EXIT_CODE and time.perf_counter() - started >= self.timeout
+            )
 
-            return result if result else f"Command executed (exit code: {exit_code})"
+            outcome = "ok" if exit_code == 0 else "timeout" if result["timed_out"] else "nonzero"
+            SANDBOX_EXEC_LATENCY.labels(kind, outcome).observe(time.perf_counter() - started)
+            logger.info(f"{kind} execution completed with exit code: {exit_code}")
 
         except Exception as e:
-            logger.error(f"Shell execution error: {e}")
-            return f"Error executing shell command: {str(e)}"
+            SANDBOX_EXEC_LATENCY.labels(kind, "error").observe(time.perf_counter() - started)
+            logger.error(f"{kind} execution error: {e}")
+            result["error"] = f"executing {kind}: {e}"
+
+        return result
 
     async def _init_browser(self):
         """Initialize Playwright browser in container."""
@@ -188,7 +220,7 @@ asyncio.run(init())
         action: str,
         selector: Optional[str] = None,
         value: Optional[str] = None
-    ) -> str:
+    ) -> Dict[str, Any]:
         """
         Perform browser automation action.
         Uses Playwright in the sandbox container.
@@ -259,16 +291,19 @@ async def browser_task():
 """
 
         code += """
+import sys
+
 try:
     result = asyncio.run(browser_task())
     print(result)
 except Exception as e:
-    print(f"Browser error: {e}")
+    print(f"Browser error: {e}", file=sys.stderr)
+    sys.exit(1)
 """
 
         return await self.run_python(code)
 
-    async def web_search(self, query: str, num_results: int = 5) -> str:
+    async def web_search(self, query: str, num_results: int = 5) -> Dict[str, Any]:
         """
         Perform web search using Brave Search API (or DuckDuckGo as fallback).
         """
@@ -307,10 +342,10 @@ print(json.dumps(results, indent=2))
 
         return await self.run_python(code)
 
-    def list_files(self) -> List[str]:
+    async def list_files(self) -> List[str]:
         """List files in workspace."""
         try:
-            exit_code, output = self.container.exec_run("ls -1 /workspace")
+            exit_code, output = await self._exec(["ls", "-1", "/workspace"])
             if exit_code == 0:
                 files = output.decode('utf-8').strip().split('\n')
                 return [f for f in files if f and not f.startswith('_agent_')]
@@ -319,23 +354,23 @@ print(json.dumps(results, indent=2))
             logger.error(f"Error listing files: {e}")
             return []
 
-    def read_file(self, filename: str) -> str:
+    async def read_file(self, filename: str) -> str:
         """Read file from workspace."""
         try:
-            exit_code, output = self.container.exec_run(f"cat /workspace/{filename}")
+            exit_code, output = await self._exec(["cat", f"/workspace/{filename}"])
             if exit_code == 0:
                 return output.decode('utf-8')
             return f"Error reading file: exit code {exit_code}"
         except Exception as e:
             return f"Error reading file: {str(e)}"
 
-    def write_file(self, filename: str, content: str):
-        """Write file to workspace."""
+    async def write_file(self, filename: str, content: str) -> bool:
+        """Write file to workspace (through the bind mount)."""
         try:
-            # Use heredoc to write file
-            cmd = f"cat > /workspace/{filename} << 'EOF'\n{content}\nEOF"
-            exit_code, output = self.container.exec_run(f"bash -c '{cmd}'")
-            return exit_code == 0
+            path = Path(self.workspace_dir) / filename
+            await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+            await asyncio.to_thread(path.write_text, content, encoding="utf-8")
+            return True
         except Exception as e:
             logger.error(f"Error writing file: {e}")
             return False
@@ -0,0 +1,88 @@
+"""
+Fakes shared by the agent tests: a scripted LLM and a sandbox without Docker
+"""
+
+from pathlib import Path
+
+from src.core.agent import AgentLoop
+from src.core.llm import ModelRouter
+from src.memory.event_stream import EventStream
+from src.memory.file_storage import FileStorage
+
+
+class ScriptedLLM:
+    """Plans two steps, fails once, fixes the code, then completes."""
+
+    def __init__(self):
+        self.turn = 0
+
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        if tools is None:
+            return {"content": "1. Compute the numbers\n2. Save them to fibonacci.txt", "usage": {}}
+
+        self.turn += 1
+        calls = {
+            1: ("execute_python", {"code": "print(fib(10))"}),
+            2: ("execute_python", {"code": "def fib(n): ...\nprint(fib(10))"}),
+            3: ("save_file", {"filename": "fibonacci.txt", "content": "0 1 1 2 3 5 8 13 21 34"}),
+        }
+        if self.turn not in calls:
+            return {"content": "The task is complete.", "usage": {"input": 10, "output": 2}}
+
+        name, arguments = calls[self.turn]
+        return {
+            "content": "",
+            "tool_calls": [{"function": {"name": name, "arguments": arguments}}],
+            "usage": {"input": 100, "output": 20},
+        }
+
+
+class LoopingLLM:
+    """Runs the same working code every turn and never completes."""
+
+    def __init__(self):
+        self.plans = 0
+
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        if tools is None:
+            self.plans += 1
+            return {"content": f"1. Compute the numbers for plan {self.plans}", "usage": {}}
+        return {
+            "content": "",
+            "tool_calls": [{"function": {"name": "execute_python", "arguments": {"code": "def fib(n): ...\nprint(fib(10))"}}}],
+            "usage": {},
+        }
+
+
+class FakeSandbox:
+    """Runs no code: Python that uses fib without defining it fails, anything else succeeds."""
+
+    def __init__(self, workspace_dir):
+        self.workspace_dir = workspace_dir
+        self.calls = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self, force=False):
+        pass
+
+    async def list_files(self):
+        return sorted(path.name for path in Path(self.workspace_dir).iterdir())
+
+    async def run_python(self, code):
+        self.calls += 1
+        if "def fib" not in code:
+            return {
+                "exit_code": 1, "stdout": "", "timed_out": False, "timeout": 300, "error": None,
+                "stderr": "Traceback (most recent call last):\nNameError: name 'fib' is not defined",
+            }
+        return {"exit_code": 0, "stdout": "[0, 1, 1, 2, 3, 5, 8, 13, 21, 34]", "stderr": "",
+                "timed_out": False, "timeout": 300, "error": None}
+
+
+def fake_agent(workspace_dir, llm, **options) -> AgentLoop:
+    """An AgentLoop on a FakeSandbox with its files in `workspace_dir` (options override both)."""
+    options.setdefault("sandbox", FakeSandbox(str(workspace_dir)))
+    options.setdefault("file_storage", FileStorage(str(workspace_dir)))
+    return AgentLoop(llm_provider=llm, model_router=ModelRouter({}), event_stream=EventStream(), **options)
@@ -0,0 +1,62 @@
+"""
+Test admission control against the backlog and the sandbox pool
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.runtime.admission import AdmissionController
+from src.runtime.sandbox_pool import SandboxPool
+
+DOCKER = {"sandbox_ready": True, "active_sandboxes": 0}
+
+
+def test_full_sandbox_pool_does_not_reject_while_queue_has_room():
+    """Queued tasks hold no sandbox, so a busy pool (or busy host) still admits work."""
+    admission = AdmissionController(max_queue_depth=3, default_task_seconds=60)
+    stats = {"queued": 1, "max_concurrent": 2}
+
+    async def scenario():
+        pool = SandboxPool(2)
+        async with pool.slot(), pool.slot():
+            assert admission.check(stats, DOCKER, {}, sandbox_pool=pool.stats()) is None
+            assert admission.check(stats, {**DOCKER, "active_sandboxes": 9}, {}, sandbox_pool=pool.stats()) is None
+
+    asyncio.run(scenario())
+
+
+def test_sandbox_waiters_count_toward_the_backlog():
+    """Loops waiting for a sandbox fill the backlog; a full pool lengthens Retry-After."""
+    admission = AdmissionController(max_queue_depth=3, default_task_seconds=60)
+    stats = {"queued": 1, "max_concurrent": 2}
+
+    async def scenario():
+        pool = SandboxPool(1)
+        async with pool.slot():
+            waiters = [asyncio.create_task(pool.slot().__aenter__()) for _ in range(2)]
+            await asyncio.sleep(0)
+            rejection = admission.check(stats, DOCKER, {}, sandbox_pool=pool.stats())
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+
+            assert admission.check(stats, DOCKER, {}, sandbox_pool=pool.stats()) is None
+
+        assert pool.stats() == {"size": 1, "in_use": 0, "waiting": 0, "free": 1}
+        return rejection
+
+    # One excess entry would start within 60 / 2 s, but two loops are still ahead in the pool
+    assert asyncio.run(scenario()) == {"reason": "queue_full", "retry_after": 180}
+
+
+def test_queue_full_without_pool():
+    admission = AdmissionController(max_queue_depth=2, default_task_seconds=60)
+
+    assert admission.check({"queued": 1, "max_concurrent": 2}, DOCKER, {}) is None
+    rejection = admission.check({"queued": 2, "max_concurrent": 2}, DOCKER, {}, incoming=2)
+    assert rejection == {"reason": "queue_full", "retry_after": 60}
+    assert admission.check({"queued": 0}, {"sandbox_ready": False}, {})["reason"] == "sandbox_unavailable"
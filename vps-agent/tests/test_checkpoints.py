@@ -0,0 +1,129 @@
+"""
+Test saving task checkpoints and resuming them after a restart
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.runtime.checkpoints import CheckpointStore
+from tests.fakes import ScriptedLLM, fake_agent
+
+PAYLOAD = {"task_id": "t1", "title": "Blog", "prompt": "Write a post", "user_id": "u1"}
+
+
+def test_save_replaces_the_checkpoint(tmp_path):
+    """A later save of a task (e.g. on drain) replaces its earlier checkpoint."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.save("t1", PAYLOAD, {"iteration": 2, "events": [{"type": "task"}]})
+    store.save("t1", PAYLOAD, {"iteration": 4, "events": [{"type": "task"}, {"type": "action"}]})
+
+    saved = store.load("t1")
+    assert saved["payload"] == PAYLOAD
+    assert saved["state"] == {"iteration": 4, "events": [{"type": "task"}, {"type": "action"}]}
+    assert store.load("unknown") is None
+    store.close()
+
+
+def test_register_keeps_an_existing_checkpoint(tmp_path):
+    """A task that starts again after a restart does not lose its saved state."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.save("t1", PAYLOAD, {"iteration": 4, "events": [{"type": "task"}]})
+    store.register("t1", {**PAYLOAD, "prompt": "changed"})
+
+    saved = store.load("t1")
+    assert saved["payload"] == PAYLOAD
+    assert saved["state"] == {"iteration": 4, "events": [{"type": "task"}]}
+
+    store.register("t2", {**PAYLOAD, "task_id": "t2"})
+    assert store.load("t2")["state"] is None
+    store.close()
+
+
+def test_drained_tasks_listed_oldest_first_and_deleted(tmp_path):
+    """Startup resubmits every checkpoint in save order; a finished task leaves nothing behind."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    for task_id in ("queued", "running"):
+        store.save(task_id, {**PAYLOAD, "task_id": task_id}, None if task_id == "queued" else {"iteration": 2})
+
+    assert [(c["task_id"], c["state"]) for c in store.all()] == [
+        ("queued", None), ("running", {"iteration": 2, "events": []})
+    ]
+
+    store.delete("running")
+    assert store.load("running") is None
+    assert [c["task_id"] for c in store.all()] == ["queued"]
+    store.close()
+
+    # The store survives a restart
+    reopened = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    assert reopened.load("queued")["payload"]["task_id"] == "queued"
+    reopened.close()
+
+
+def test_progress_saves_append_events(tmp_path):
+    """Per-iteration saves add new events only; evicted offsets are dropped."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.register("t1", PAYLOAD)
+    store.save_progress("t1", {"iteration": 1}, [(0, {"n": 0}), (1, {"n": 1})])
+    store.save_progress("t1", {"iteration": 2}, [(2, {"n": 2})], keep_from=1)
+
+    saved = store.load("t1")
+    assert saved["payload"] == PAYLOAD
+    assert saved["state"] == {"iteration": 2, "events": [{"n": 1}, {"n": 2}]}
+
+    store.save_progress("t1", {"iteration": 3}, [(0, {"n": "resumed"})], replace_events=True)
+    assert store.load("t1")["state"]["events"] == [{"n": "resumed"}]
+    store.close()
+
+
+class CrashingLLM(ScriptedLLM):
+    """The scripted run, but the process dies before the third turn."""
+
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        if tools is not None and self.turn == 2:
+            raise RuntimeError("node crashed")
+        return await super().complete(messages, tools, model, **kwargs)
+
+
+def test_agent_resumes_from_last_iteration(tmp_path):
+    """A new loop continues after the last saved iteration without planning or redoing work."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    workspace = tmp_path / "workspace"
+
+    agent = fake_agent(workspace, CrashingLLM(), checkpoint_store=store, task_id="t1")
+    crashed = asyncio.run(agent.run("Save the first 10 Fibonacci numbers"))
+    assert crashed["status"] == "failed"
+    state = store.load("t1")["state"]
+    assert state["iteration"] == 2
+    assert [e["type"] for e in state["events"]][:1] == ["task"]
+
+    llm = ScriptedLLM()
+    llm.turn = 2
+    agent = fake_agent(workspace, llm, checkpoint_store=store, task_id="t1")
+    resumed = asyncio.run(agent.resume())
+
+    assert resumed["status"] == "completed"
+    assert resumed["iterations"] == 4
+    assert agent.sandbox.calls == 0
+    assert sorted(resumed["result"]["files"]) == ["fibonacci.txt", "todo.md"]
+    types = [e["type"] for e in agent.events.events]
+    assert types[0] == "task" and "resume" in types
+    store.close()
+
+
+def test_resume_without_state_fails(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.register("t1", PAYLOAD)
+
+    agent = fake_agent(tmp_path / "workspace", ScriptedLLM(), checkpoint_store=store, task_id="t1")
+    try:
+        asyncio.run(agent.resume())
+    except ValueError as e:
+        assert "t1" in str(e)
+    else:
+        raise AssertionError("resume() without agent state must raise")
+    store.close()
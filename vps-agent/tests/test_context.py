@@ -0,0 +1,154 @@
+"""
+Test packing the agent's event history into the prompt token budget
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.context import ContextBuilder, _truncate_middle, estimate_tokens
+from src.core.planner import Planner
+from src.memory.event_stream import EventStream
+from tests.fakes import FakeSandbox, fake_agent
+
+
+def _builder(events, **options):
+    return ContextBuilder(None, events, Planner(None), **options)
+
+
+def _history():
+    """A failed turn with its fix, followed by ten successful turns with long output."""
+    events = EventStream()
+    events.add_event({"type": "action", "content": {"type": "execute_python"}})
+    events.add_event({"type": "observation", "content": "NameError: name 'fib' is not defined", "error": "NameError"})
+    events.add_event({"type": "recovery", "content": "Define fib in the same call."})
+    for turn in range(10):
+        events.add_event({"type": "action", "content": {"type": "web_search"}})
+        events.add_event({"type": "observation", "content": f"Search results of turn {turn}\n" + "x" * 800})
+
+    builder = _builder(events)
+    builder._sync_events()
+    return builder
+
+
+def test_everything_fits_in_order():
+    builder = _history()
+    packed = builder._pack_events(100_000)
+
+    assert "earlier events not shown" not in packed
+    assert packed.count("Search results of turn") == 10
+    assert packed.index("NameError") < packed.index("turn 0") < packed.index("turn 9")
+
+
+def test_tight_budget_keeps_error_and_recent_turns_in_full():
+    """Errors with their fix come first, then the newest events in full, then summaries."""
+    builder = _history()
+    entries = list(builder._window)
+    error_block = sum(entry["full_tokens"] for entry in entries[:3])
+    last_turn = sum(entry["full_tokens"] for entry in entries[-2:])
+    summaries = sum(entry["summary_tokens"] for entry in entries[3:-2])
+
+    packed = builder._pack_events(error_block + last_turn + summaries)
+
+    assert "Suggested fix: Define fib in the same call." in packed
+    assert "x" * 800 in packed.split("turn 9")[1]
+    assert "Search results of turn 8 (" in packed  # summary: first line and length
+    assert "x" * 800 not in packed.split("turn 9")[0]
+    assert "earlier events not shown" not in packed
+
+    # Less room: the oldest summaries are dropped and counted
+    packed = builder._pack_events(error_block + last_turn + summaries // 2)
+    assert "NameError" in packed and "turn 9" in packed
+    assert "turn 0" not in packed
+    assert "earlier events not shown" in packed
+
+
+def test_budget_for_model():
+    builder = _builder(EventStream(), budgets={"default": 6000, "haiku": 3000})
+
+    assert builder.budget_for("claude-3-5-haiku-20241022") == 3000
+    assert builder.budget_for("claude-opus-4-20250514") == 6000
+    assert _builder(EventStream()).budget_for(None) == 8000
+
+
+def test_long_observations_keep_head_and_tail():
+    text = "start " + "y" * 1000 + " Error at the end"
+    truncated = _truncate_middle(text, 120)
+
+    assert truncated.startswith("start ") and truncated.endswith("Error at the end")
+    assert "chars omitted" in truncated
+    assert estimate_tokens(truncated) < estimate_tokens(text)
+
+
+class ListingSandbox(FakeSandbox):
+    """Counts how often the workspace is listed."""
+
+    def __init__(self, workspace_dir):
+        super().__init__(workspace_dir)
+        self.listings = 0
+
+    async def list_files(self):
+        self.listings += 1
+        return await super().list_files()
+
+
+def test_workspace_listing_cached_until_a_file_can_change(tmp_path):
+    """Pure actions keep the cached listing; anything that may write files refetches it."""
+    sandbox = ListingSandbox(str(tmp_path))
+    planner = Planner(None)
+    builder = ContextBuilder(sandbox, EventStream(), planner)
+    plan = planner._parse_plan_response("1. Search for tomatoes", "Write about tomatoes")
+
+    async def scenario():
+        (tmp_path / "notes.txt").write_text("draft")
+        first = (await builder.build(plan))["workspace_files"]
+
+        (tmp_path / "report.md").write_text("written behind the cache's back")
+        builder.note_actions([{"type": "web_search", "query": "tomatoes"}, {"type": "read_file", "filename": "notes.txt"}])
+        cached = (await builder.build(plan))["workspace_files"]
+
+        builder.note_actions([{"type": "web_search", "query": "tomatoes"}, {"type": "execute_python", "code": "..."}])
+        refetched = (await builder.build(plan))["workspace_files"]
+        return first, cached, refetched
+
+    first, cached, refetched = asyncio.run(scenario())
+
+    assert first == cached == ["notes.txt"]
+    assert refetched == ["notes.txt", "report.md"]
+    assert sandbox.listings == 2
+
+
+class ReadThenSaveLLM:
+    """Reads todo.md, saves a file, then completes."""
+
+    def __init__(self):
+        self.turn = 0
+
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        if tools is None:
+            return {"content": "1. Check the plan\n2. Save the answer", "usage": {}}
+
+        self.turn += 1
+        calls = {
+            1: ("read_file", {"filename": "todo.md"}),
+            2: ("save_file", {"filename": "answer.txt", "content": "42"}),
+        }
+        if self.turn not in calls:
+            return {"content": "The task is complete.", "usage": {}}
+        name, arguments = calls[self.turn]
+        return {"content": "", "tool_calls": [{"function": {"name": name, "arguments": arguments}}], "usage": {}}
+
+
+def test_agent_lists_the_workspace_again_only_after_writes(tmp_path):
+    """Three iterations, one read and one save: the listing is fetched twice."""
+    sandbox = ListingSandbox(str(tmp_path))
+    agent = fake_agent(tmp_path, ReadThenSaveLLM(), sandbox=sandbox)
+
+    result = asyncio.run(agent.run("Save the answer"))
+
+    assert result["status"] == "completed"
+    assert "answer.txt" in result["result"]["files"]
+    assert sandbox.listings == 2
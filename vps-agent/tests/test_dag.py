@@ -0,0 +1,119 @@
+"""
+Test running independent plan steps in parallel sub-agents
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.dag import DagExecutor, _merge_workspace, _seed_workspace, has_parallel_steps, plan_levels
+from src.core.planner import Planner
+from src.memory.event_stream import EventStream
+from src.memory.file_storage import FileStorage
+from src.runtime.sandbox_pool import SandboxPool
+from tests.fakes import FakeSandbox, fake_agent
+
+
+class PlanLLM:
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        return {
+            "content": "1. Analyze competitor A (after: none)\n"
+                       "2. Analyze competitor B (after: none)\n"
+                       "3. Analyze competitor C (after: none)\n"
+                       "4. Compare A and B (after: 1, 2)\n"
+                       "5. Write the report (after: 3, 4)",
+            "usage": {}
+        }
+
+
+class StepLLM:
+    """Saves one file per step and a shared notes.md; step 1 keeps running broken code."""
+
+    def __init__(self, name):
+        self.name = name
+        self.turn = 0
+
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        self.turn += 1
+        if self.name == "step-1":
+            call = ("execute_python", {"code": f"print(fib({self.turn}))"})
+        elif self.turn <= 2:
+            filename = f"{self.name}.md" if self.turn == 1 else "notes.md"
+            call = ("save_file", {"filename": filename, "content": f"Findings of {self.name}"})
+        else:
+            return {"content": "The task is complete.", "usage": {}}
+        return {"content": "", "tool_calls": [{"function": {"name": call[0], "arguments": call[1]}}], "usage": {}}
+
+
+class PooledSandbox(FakeSandbox):
+    """Records how many sandboxes of the pool run when it starts."""
+
+    def __init__(self, workspace_dir, pool, peaks):
+        super().__init__(workspace_dir)
+        self.pool = pool
+        self.peaks = peaks
+
+    async def start(self):
+        self.peaks.append(self.pool.in_use)
+        await asyncio.sleep(0.01)
+
+
+def test_plan_levels():
+    """Steps without dependencies share level 0; a plain list is sequential."""
+    steps = [{"depends_on": []}, {"depends_on": []}, {"depends_on": [0, 1]}, {"depends_on": [2]}]
+    assert plan_levels({"steps": steps}) == [0, 0, 1, 2]
+    assert has_parallel_steps({"steps": steps})
+    assert not has_parallel_steps({"steps": [{}, {}, {}]})
+
+
+def test_merge_keeps_conflicting_versions(tmp_path):
+    """A file changed both in the workspace and by the step is kept under a step name."""
+    parent, step_dir = tmp_path / "task", tmp_path / "task" / ".steps" / "step-2"
+    parent.mkdir()
+    (parent / "data.csv").write_text("a,b")
+    (parent / "report.md").write_text("draft")
+    seeded = _seed_workspace(parent, step_dir)
+
+    (parent / "report.md").write_text("draft by step 1")
+    (step_dir / "report.md").write_text("draft by step 2")
+    (step_dir / "chart.txt").write_text("bars")
+
+    merged = _merge_workspace(step_dir, parent, seeded, "step-2")
+
+    assert sorted(merged) == ["chart.txt", "report.step-2.md"]
+    assert (parent / "report.md").read_text() == "draft by step 1"
+    assert (parent / "report.step-2.md").read_text() == "draft by step 2"
+
+
+def test_dag_skips_dependents_of_failed_step_within_pool(tmp_path):
+    """Independent steps share the sandbox pool; steps after a failure are skipped."""
+    workspace = tmp_path / "task"
+    pool = SandboxPool(2)
+    peaks = []
+    parent = SimpleNamespace(
+        planner=Planner(PlanLLM()),
+        storage=FileStorage(str(workspace)),
+        events=EventStream(),
+    )
+
+    def spawn(name, step_workspace):
+        llm = StepLLM(name)
+        return fake_agent(step_workspace, llm, sandbox=PooledSandbox(step_workspace, pool, peaks), max_iterations=6)
+
+    executor = DagExecutor(parent, spawn, max_parallel=3, sandbox_pool=pool)
+
+    result = asyncio.run(executor.run("Analyze three competitors"))
+
+    statuses = [step["status"] for step in result["plan"]["steps"]]
+    assert statuses == ["failed", "completed", "completed", "failed", "failed"]
+    assert result["status"] == "partial"
+    assert max(peaks) == 2 and pool.in_use == 0
+
+    files = result["result"]["files"]
+    assert {"step-2.md", "step-3.md", "notes.md", "todo.md"} <= set(files)
+    assert any(name.startswith("notes.step-") for name in files)
+    assert not (workspace / ".steps" / "step-2").exists()
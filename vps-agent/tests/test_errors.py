@@ -0,0 +1,93 @@
+"""
+Test local error classification of failed agent actions
+"""
+
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.errors import ErrorClassifier
+
+PYTHON = {"type": "execute_python"}
+SHELL = {"type": "shell_command"}
+
+
+def test_successful_outcomes_are_not_errors():
+    """Exit code 0 or a missing exit code is a success, whatever stderr says."""
+    classifier = ErrorClassifier()
+
+    assert classifier.classify(PYTHON, {"exit_code": 0, "stderr": "DeprecationWarning: old"}) is None
+    assert classifier.classify(PYTHON, {"stdout": "done"}) is None
+
+
+def test_traceback_kind_and_known_fix():
+    """The last traceback line gives the kind; rule patterns fill in the fix."""
+    classifier = ErrorClassifier()
+    stderr = (
+        "Traceback (most recent call last):\n"
+        '  File "/tmp/run.py", line 1, in <module>\n'
+        "    import bs4\n"
+        "ModuleNotFoundError: No module named 'bs4'\n"
+    )
+
+    error = classifier.classify(PYTHON, {"exit_code": 1, "stderr": stderr})
+
+    assert error["kind"] == "ModuleNotFoundError"
+    assert error["message"] == "No module named 'bs4'"
+    assert error["source"] == "rule"
+    assert "pip install bs4" in error["fix"]
+
+
+def test_module_path_dropped_and_suffix_rules_match():
+    """`requests.exceptions.ReadTimeout` is kind ReadTimeout and matches the Timeout rule."""
+    classifier = ErrorClassifier()
+    stderr = "Traceback (most recent call last):\nrequests.exceptions.ReadTimeout: read timed out\n"
+
+    error = classifier.classify(PYTHON, {"exit_code": 1, "stderr": stderr})
+
+    assert error["kind"] == "ReadTimeout"
+    assert "timed out" in error["fix"]
+
+
+def test_structured_failures():
+    """Timeouts, missing commands, OOM kills and tool errors are recognized without a traceback."""
+    classifier = ErrorClassifier()
+
+    assert classifier.classify(SHELL, {"timed_out": True, "timeout": 30})["kind"] == "timeout"
+    assert classifier.classify(SHELL, {"exit_code": 127, "stderr": "sh: jq: not found"})["kind"] == "command_not_found"
+    assert classifier.classify(SHELL, {"exit_code": 137, "stderr": ""})["kind"] == "killed"
+    assert classifier.classify(SHELL, {"error": "Sandbox not started"})["kind"] == "tool_error"
+
+    unknown = classifier.classify(SHELL, {"exit_code": 2, "stderr": "grep: bad pattern"})
+    assert unknown == {
+        "kind": "exit_code", "message": "grep: bad pattern",
+        "signature": unknown["signature"], "fix": None, "source": None,
+    }
+
+
+def test_learned_fix_reused_for_same_signature():
+    """A fix learned for one error applies to the same error with other values, not to other actions."""
+    classifier = ErrorClassifier()
+    first = classifier.classify(PYTHON, {"exit_code": 1, "stderr": "ValueError: bad row 12 in '/workspace/a.csv'"})
+    assert first["fix"] is None
+
+    classifier.learn(first["signature"], "Skip malformed rows.")
+
+    again = classifier.classify(PYTHON, {"exit_code": 1, "stderr": "ValueError: bad row 40 in '/workspace/b.csv'"})
+    assert again["fix"] == "Skip malformed rows." and again["source"] == "learned"
+
+    other_action = classifier.classify(SHELL, {"exit_code": 1, "stderr": "ValueError: bad row 40 in '/workspace/b.csv'"})
+    assert other_action["fix"] is None
+
+
+def test_learned_fixes_are_bounded():
+    """The least recently used learned fix is evicted first."""
+    classifier = ErrorClassifier(max_learned=2)
+    classifier.learn("a", "fix a")
+    classifier.learn("b", "fix b")
+    classifier.learn("a", "fix a")
+    classifier.learn("c", "fix c")
+
+    assert list(classifier._learned) == ["a", "c"]
@@ -0,0 +1,79 @@
+"""
+Test the cached sandbox health probe
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import docker
+
+from src.runtime.health import HealthProber
+
+
+class FakeDockerClient:
+    """Answers ping, image and container lookups; `down` makes ping fail."""
+
+    def __init__(self):
+        self.down = False
+        self.images = self
+        self.containers = self
+
+    def ping(self):
+        if self.down:
+            raise ConnectionError("Docker daemon not running")
+
+    def get(self, image):
+        if image != "writgo-sandbox:latest":
+            raise docker.errors.ImageNotFound(image)
+
+    def list(self, filters=None):
+        return ["c1", "c2"]
+
+    def close(self):
+        pass
+
+
+def test_probe_caches_state_and_reuses_the_client(monkeypatch):
+    """Probes share one Docker client; a failed probe drops it and reports not ready."""
+    clients = []
+
+    def from_env():
+        clients.append(FakeDockerClient())
+        return clients[-1]
+
+    monkeypatch.setattr(docker, "from_env", from_env)
+    prober = HealthProber("writgo-sandbox:latest")
+
+    async def scenario():
+        await prober.probe()
+        ready = dict(prober.state)
+        await prober.probe()
+
+        clients[0].down = True
+        await prober.probe()
+        down = dict(prober.state)
+
+        await prober.probe()
+        return ready, down
+
+    ready, down = asyncio.run(scenario())
+
+    assert ready["sandbox_ready"] and ready["sandbox_image_ready"] and ready["active_sandboxes"] == 2
+    assert ready["checked_at"] is not None
+
+    assert not down["sandbox_ready"] and "not running" in down["error"]
+    assert len(clients) == 2
+    assert prober.state["sandbox_ready"]
+
+
+def test_missing_image_is_reported(monkeypatch):
+    monkeypatch.setattr(docker, "from_env", FakeDockerClient)
+    prober = HealthProber("writgo-sandbox:dev")
+
+    asyncio.run(prober.probe())
+
+    assert prober.state["sandbox_ready"] and not prober.state["sandbox_image_ready"]
@@ -0,0 +1,106 @@
+"""
+Test prompt caching: cache breakpoints only on the static system prompt, tools and task/plan prefix
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.llm import CACHE_CONTROL, ClaudeProvider, _claude_tools, _flatten_content
+from src.core.tools_definitions import TOOLS
+from tests.fakes import fake_agent
+
+
+class FakeMessages:
+    """Stands in for AsyncAnthropic().messages.with_raw_response and records each request."""
+
+    def __init__(self):
+        self.requests = []
+        self.with_raw_response = self
+
+    async def create(self, **request):
+        self.requests.append(request)
+        # Planning requests come without tools
+        text = "The task is complete." if request["tools"] else "1. Search for tomatoes\n2. Write the post"
+        usage = SimpleNamespace(input_tokens=50, output_tokens=10,
+                                cache_read_input_tokens=900, cache_creation_input_tokens=0)
+        response = SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], usage=usage)
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+def _provider():
+    provider = ClaudeProvider(api_key="test")
+    provider.client = SimpleNamespace(messages=FakeMessages())
+    return provider
+
+
+def _breakpoints(request):
+    """Where the request carries cache_control: system, tool names and user content blocks."""
+    system = request["system"]
+    return {
+        "system": isinstance(system, list) and all("cache_control" in block for block in system),
+        "tools": [tool["name"] for tool in request["tools"] if "cache_control" in tool],
+        "user": [
+            "cache_control" in block
+            for message in request["messages"] if isinstance(message["content"], list)
+            for block in message["content"]
+        ],
+    }
+
+
+def test_claude_tools_mark_only_the_last_tool():
+    """Tools are converted to Anthropic's schema; only the last one is a breakpoint."""
+    converted = _claude_tools(TOOLS, cache=True)
+
+    assert [tool["name"] for tool in converted] == [tool["function"]["name"] for tool in TOOLS]
+    assert converted[0]["input_schema"] == TOOLS[0]["function"]["parameters"]
+    assert [tool.get("cache_control") for tool in converted] == [None] * (len(TOOLS) - 1) + [CACHE_CONTROL]
+    assert all("cache_control" not in tool for tool in _claude_tools(TOOLS, cache=False))
+    assert all("cache_control" not in tool for tool in TOOLS)
+    assert _claude_tools(None, cache=True) == []
+
+
+def test_agent_request_caches_static_blocks_only(tmp_path):
+    """System prompt, tools and the task/plan prefix are cached; the per-iteration part is not."""
+    provider = _provider()
+    agent = fake_agent(tmp_path, provider)
+
+    result = asyncio.run(agent.run("Write about tomatoes"))
+
+    planning, turn = provider.client.messages.requests
+    assert _breakpoints(planning) == {"system": False, "tools": [], "user": []}
+    assert _breakpoints(turn) == {"system": True, "tools": [TOOLS[-1]["function"]["name"]], "user": [True, False]}
+
+    prefix, rest = turn["messages"][0]["content"]
+    assert "Write about tomatoes" in prefix["text"] and "Search for tomatoes" in prefix["text"]
+    assert "Write about tomatoes" not in rest["text"] and "Current Step" in rest["text"]
+    assert result["status"] == "completed"
+    assert result["usage"] == {"input": 50, "output": 10, "cache_read": 900, "cache_write": 0}
+
+
+def test_no_breakpoints_without_cache():
+    provider = _provider()
+
+    asyncio.run(provider.complete(
+        messages=[{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Plan a post"}],
+        tools=TOOLS
+    ))
+
+    request = provider.client.messages.requests[-1]
+    assert request["system"] == "Be brief."
+    assert _breakpoints(request) == {"system": False, "tools": [], "user": []}
+
+
+def test_openai_messages_are_flattened():
+    """OpenAI caches prefixes on its own; content blocks become plain strings."""
+    messages = [{"role": "user", "content": [
+        {"type": "text", "text": "## Task:\nWrite\n", "cache_control": CACHE_CONTROL},
+        {"type": "text", "text": "## Current Step:\nSearch"},
+    ]}]
+
+    assert _flatten_content(messages) == [{"role": "user", "content": "## Task:\nWrite\n## Current Step:\nSearch"}]
+    assert "cache_control" in messages[0]["content"][0]
@@ -0,0 +1,125 @@
+"""
+Test memoizing the results of pure agent actions
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.memo import ActionMemo
+from src.memory.file_storage import FileStorage
+from tests.fakes import fake_agent
+
+
+class CountingStorage(FileStorage):
+    def __init__(self, base_path):
+        super().__init__(base_path)
+        self.reads = 0
+
+    async def read_file(self, filename):
+        self.reads += 1
+        return await super().read_file(filename)
+
+
+def test_only_pure_actions_get_a_key():
+    """Side-effecting tools and browser actions outside pure_actions are never memoized."""
+    memo = ActionMemo()
+
+    assert memo.key_for({"type": "execute_python", "code": "print(1)"}, "task:t1", "project:p1") is None
+    assert memo.key_for({"type": "save_file", "filename": "a.md", "content": "x"}, "task:t1", "project:p1") is None
+    assert memo.key_for({"type": "browser_navigate", "action": "click", "selector": "#go"}, "task:t1", "project:p1") is None
+    assert memo.key_for({"type": "unknown_tool"}, "task:t1", "project:p1") is None
+
+    assert memo.key_for({"type": "browser_navigate", "action": "navigate", "url": "https://a.nl"}, "task:t1", "project:p1")
+    assert memo.key_for({"type": "read_file", "filename": "a.md"}, "task:t1", "project:p1").startswith("task:t1|")
+
+    # A TTL of 0 turns memoization off for that tool
+    assert ActionMemo(ttls={"web_search": 0}).key_for({"type": "web_search", "query": "x"}, "task:t1", "project:p1") is None
+
+
+def test_equivalent_searches_share_a_project_key():
+    """Case, whitespace and URL fragments do not split the memo; search results are shared per project."""
+    memo = ActionMemo()
+
+    search = memo.key_for({"type": "web_search", "query": "Tomaten  kweken"}, "task:t1", "project:p1")
+    assert search == memo.key_for({"type": "web_search", "query": "tomaten kweken"}, "task:t2", "project:p1")
+    assert search != memo.key_for({"type": "web_search", "query": "tomaten kweken"}, "task:t1", "project:p2")
+
+    page = {"type": "browser_navigate", "action": "navigate"}
+    assert (memo.key_for({**page, "url": "HTTPS://Example.nl#top"}, "task:t1", "project:p1")
+            == memo.key_for({**page, "url": "https://example.nl/"}, "task:t1", "project:p1"))
+
+
+def test_hits_failures_and_shared_execution():
+    """Successful outcomes are reused, failures are not stored, concurrent calls execute once."""
+    memo = ActionMemo()
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"observation": f"result {len(calls)}"}
+
+    async def scenario():
+        first, shared = await asyncio.gather(
+            memo.run("k", "web_search", execute, lambda outcome: True),
+            memo.run("k", "web_search", execute, lambda outcome: True),
+        )
+        assert first == {"observation": "result 1"}
+        assert shared == {"observation": "result 1", "memoized": True}
+
+        hit = await memo.run("k", "web_search", execute, lambda outcome: True)
+        assert hit["memoized"] and len(calls) == 1
+
+        # The stored copy is not changed through a returned outcome
+        hit["observation"] = "changed"
+        assert (await memo.run("k", "web_search", execute, lambda outcome: True))["observation"] == "result 1"
+
+        await memo.run("failing", "web_search", execute, lambda outcome: False)
+        await memo.run("failing", "web_search", execute, lambda outcome: False)
+        assert len(calls) == 3
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_and_are_bounded():
+    memo = ActionMemo(ttls={"web_search": 0.01}, max_entries=2)
+
+    async def execute():
+        return {"observation": "ok"}
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await memo.run(key, "web_search", execute, lambda outcome: True)
+        assert list(memo._entries) == ["b", "c"]
+
+        await asyncio.sleep(0.02)
+        assert "memoized" not in await memo.run("c", "web_search", execute, lambda outcome: True)
+
+    asyncio.run(scenario())
+
+
+def test_side_effect_invalidates_task_file_reads(tmp_path):
+    """A write drops the task's memoized file reads but keeps project-wide search results."""
+    memo = ActionMemo()
+    storage = CountingStorage(str(tmp_path))
+    agent = fake_agent(tmp_path, None, file_storage=storage, action_memo=memo, task_id="t1")
+    read = {"type": "read_file", "filename": "notes.md"}
+
+    async def scenario():
+        await storage.save_file("notes.md", "v1")
+        memo._entries["project:p1|web_search|{}"] = {"outcome": {"observation": "x"}, "expires_at": float("inf")}
+
+        assert (await agent._execute_action(read))["observation"] == "v1"
+        assert (await agent._execute_action(read)).get("memoized")
+        assert storage.reads == 1
+
+        await agent._execute_action({"type": "save_file", "filename": "notes.md", "content": "v2"})
+        assert (await agent._execute_action(read))["observation"] == "v2"
+        assert storage.reads == 2
+        assert "project:p1|web_search|{}" in memo._entries
+
+    asyncio.run(scenario())
@@ -0,0 +1,117 @@
+"""
+Test running the tool calls of one turn: pure actions in parallel, side effects one by one
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tests.fakes import FakeSandbox, fake_agent
+
+
+class SearchingSandbox(FakeSandbox):
+    """Records how many searches run at once and the order tools start and finish in."""
+
+    def __init__(self, workspace_dir):
+        super().__init__(workspace_dir)
+        self.running = 0
+        self.peak = 0
+        self.log = []
+
+    async def web_search(self, query):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.log.append(f"start {query}")
+        # Later queries finish first, so completion order differs from call order
+        await asyncio.sleep(0.05 / int(query.split()[-1]))
+        self.log.append(f"end {query}")
+        self.running -= 1
+        return {"exit_code": 0, "stdout": f"results for {query}", "stderr": "",
+                "timed_out": False, "timeout": 300, "error": None}
+
+    async def run_python(self, code):
+        self.log.append(f"python while {self.running} searches run")
+        return await super().run_python(code)
+
+
+def _search(n):
+    return {"type": "web_search", "query": f"query {n}"}
+
+
+def test_pure_actions_run_concurrently_up_to_the_limit(tmp_path):
+    """Five searches in one turn overlap, but never more than max_parallel_tools at once."""
+    sandbox = SearchingSandbox(str(tmp_path))
+    agent = fake_agent(tmp_path, None, sandbox=sandbox, max_parallel_tools=2)
+
+    outcomes = asyncio.run(agent._execute_actions([_search(n) for n in range(1, 6)]))
+
+    assert sandbox.peak == 2
+    assert [o["observation"] for o in outcomes] == [f"results for query {n}" for n in range(1, 6)]
+
+
+def test_side_effect_is_a_barrier(tmp_path):
+    """A non-pure action waits for the searches before it; the ones after it wait for it."""
+    sandbox = SearchingSandbox(str(tmp_path))
+    agent = fake_agent(tmp_path, None, sandbox=sandbox, max_parallel_tools=4)
+    actions = [
+        _search(1), _search(2), _search(3),
+        {"type": "execute_python", "code": "def fib(n): ...\nprint(fib(10))"},
+        _search(4), _search(5),
+    ]
+
+    outcomes = asyncio.run(agent._execute_actions(actions))
+
+    python = sandbox.log.index("python while 0 searches run")
+    assert set(sandbox.log[:python]) == {
+        f"{event} query {n}" for event in ("start", "end") for n in (1, 2, 3)
+    }
+    assert sandbox.log[python + 1:python + 3] == ["start query 4", "start query 5"]
+    assert sandbox.peak == 3
+
+    assert [o["observation"] for o in outcomes[:3]] == [f"results for query {n}" for n in (1, 2, 3)]
+    assert outcomes[3]["exit_code"] == 0
+    assert [o["observation"] for o in outcomes[4:]] == ["results for query 4", "results for query 5"]
+
+
+class ParallelLLM:
+    """Asks for three searches in one turn, then completes."""
+
+    def __init__(self):
+        self.turn = 0
+
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        if tools is None:
+            return {"content": "1. Search the web", "usage": {}}
+
+        self.turn += 1
+        if self.turn > 1:
+            return {"content": "The task is complete.", "usage": {}}
+        return {
+            "content": "",
+            "tool_calls": [
+                {"function": {"name": "web_search", "arguments": {"query": f"query {n}"}}} for n in (1, 2, 3)
+            ],
+            "usage": {},
+        }
+
+
+def test_observations_follow_call_order(tmp_path):
+    """Each action event is followed by its own observation, in the order the LLM called them."""
+    sandbox = SearchingSandbox(str(tmp_path))
+    agent = fake_agent(tmp_path, ParallelLLM(), sandbox=sandbox)
+
+    result = asyncio.run(agent.run("Search the web three times"))
+
+    assert result["status"] == "completed"
+    assert sandbox.peak == 3
+    assert sandbox.log.index("end query 3") < sandbox.log.index("end query 1")
+
+    turn = [e for e in agent.events.events if e["type"] in ("action", "observation")]
+    assert [(e["type"], e["content"]) for e in turn] == [
+        item
+        for n in (1, 2, 3)
+        for item in (("action", _search(n)), ("observation", f"results for query {n}"))
+    ]
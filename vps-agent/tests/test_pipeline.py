@@ -0,0 +1,133 @@
+"""
+Test the background pipeline for todo.md writes and checkpoint saves
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.pipeline import BookkeepingPipeline
+from src.memory.file_storage import FileStorage
+from src.runtime.checkpoints import CheckpointStore
+from tests.fakes import ScriptedLLM, fake_agent
+
+
+def test_pending_jobs_with_the_same_key_are_coalesced():
+    """While a write runs, newer writes of the same file replace each other; order is kept."""
+    done = []
+
+    async def scenario():
+        pipeline = BookkeepingPipeline()
+        release = asyncio.Event()
+
+        async def slow_write():
+            await release.wait()
+            done.append("todo.md v1")
+
+        def job(name):
+            async def run():
+                done.append(name)
+            return run
+
+        pipeline.submit("todo.md", slow_write)
+        await asyncio.sleep(0)  # v1 is running now
+        pipeline.submit("todo.md", job("todo.md v2"))
+        pipeline.submit("checkpoint", job("checkpoint 1"))
+        pipeline.submit("todo.md", job("todo.md v3"))
+        pipeline.submit("checkpoint", job("checkpoint 2"))
+
+        release.set()
+        await pipeline.flush()
+        await pipeline.close()
+
+    asyncio.run(scenario())
+    assert done == ["todo.md v1", "todo.md v3", "checkpoint 2"]
+
+
+def test_failed_job_does_not_stop_the_pipeline():
+    done = []
+
+    async def scenario():
+        pipeline = BookkeepingPipeline()
+
+        async def failing():
+            raise OSError("disk full")
+
+        async def write():
+            done.append("checkpoint")
+
+        pipeline.submit("todo.md", failing)
+        pipeline.submit("checkpoint", write)
+        await pipeline.flush()
+        await pipeline.close()
+
+    asyncio.run(scenario())
+    assert done == ["checkpoint"]
+
+
+def test_close_can_drop_pending_jobs():
+    """Cancellation finishes the running write but skips the queued ones."""
+    done = []
+
+    async def scenario():
+        pipeline = BookkeepingPipeline()
+
+        async def write(name):
+            await asyncio.sleep(0.01)
+            done.append(name)
+
+        pipeline.submit("todo.md", lambda: write("todo.md"))
+        await asyncio.sleep(0)
+        pipeline.submit("checkpoint", lambda: write("checkpoint"))
+        await pipeline.close(drop_pending=True)
+
+    asyncio.run(scenario())
+    assert done == ["todo.md"]
+
+
+class SlowStorage(FileStorage):
+    """A disk that takes a while per write and records what was written."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.writes = []
+
+    async def save_file(self, filename, content):
+        await asyncio.sleep(0.05)
+        self.writes.append(filename)
+        return await super().save_file(filename, content)
+
+
+def test_agent_flushes_bookkeeping_before_extracting_results(tmp_path):
+    """The result holds the final todo.md and the last checkpoint is saved, even on a slow disk."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    workspace = tmp_path / "workspace"
+    storage = SlowStorage(str(workspace))
+    agent = fake_agent(workspace, ScriptedLLM(), file_storage=storage, checkpoint_store=store, task_id="t1")
+
+    plans = []
+    refresh_plan = agent.context_builder.refresh_plan
+    agent.context_builder.refresh_plan = lambda plan: plans.append(refresh_plan(plan)) or plans[-1]
+
+    # What is on disk when the result is extracted
+    at_extraction = {}
+    extract_result = agent._extract_result
+
+    async def extract():
+        at_extraction["todo.md"] = (workspace / "todo.md").read_text()
+        at_extraction["checkpoint"] = store.load("t1")["state"]["iteration"]
+        at_extraction["progress"] = agent._progress["iteration"]
+        return await extract_result()
+
+    agent._extract_result = extract
+
+    result = asyncio.run(agent.run("Save the first 10 Fibonacci numbers"))
+
+    assert result["status"] == "completed"
+    assert at_extraction["todo.md"] == plans[-1] == result["result"]["result_data"]["todo.md"]
+    assert at_extraction["checkpoint"] == at_extraction["progress"]
+    assert storage.writes.count("todo.md") < len(plans)
+    store.close()
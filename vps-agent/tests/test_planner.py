@@ -0,0 +1,90 @@
+"""
+Test sharing one plan across a batch of prompts made from the same template
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.planner import SharedPlanner
+
+KEYWORDS = ("AI", "Python", "Rust")
+PROMPTS = [f"Write a blog post about {keyword} for beginners" for keyword in KEYWORDS]
+
+
+class PlanningLLM:
+    """Writes a plan about the keyword in the prompt; can leave it out or fail the first call."""
+
+    def __init__(self, mention_keyword=True, fail_first=False):
+        self.mention_keyword = mention_keyword
+        self.fail_first = fail_first
+        self.prompts = []
+
+    async def complete(self, messages, tools=None, model=None, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        if self.fail_first and len(self.prompts) == 1:
+            raise RuntimeError("planner overloaded")
+
+        keyword = next(k for k in KEYWORDS if f"about {k} for" in prompt)
+        if not self.mention_keyword:
+            return {"content": "1. Research the topic\n2. Write the post", "usage": {}}
+        return {
+            "content": f"1. Research {keyword} basics\n2. Compare {keyword} with AIOps and maintenance tools\n3. Write the post",
+            "usage": {},
+        }
+
+
+def _plan_all(planner):
+    async def scenario():
+        return await asyncio.gather(*(planner.create_plan(p) for p in PROMPTS), return_exceptions=True)
+
+    return asyncio.run(scenario())
+
+
+def test_one_planner_call_per_template():
+    """The batch plans once; the other prompts get the plan with their own keyword."""
+    llm = PlanningLLM()
+    planner = SharedPlanner(llm, PROMPTS)
+
+    plans = _plan_all(planner)
+
+    assert len(llm.prompts) == 1
+    assert planner.planner_calls == 1 and planner.shared_plans == 2
+    assert [p["task"] for p in plans] == PROMPTS
+    assert plans[1]["shared_from"] == PROMPTS[0]
+    assert [s["description"] for s in plans[1]["steps"]] == [
+        "Research Python basics",
+        "Compare Python with AIOps and maintenance tools",
+        "Write the post",
+    ]
+    assert plans[2]["steps"][0]["description"] == "Research Rust basics"
+    assert all(s["status"] == "pending" for s in plans[2]["steps"])
+
+
+def test_plan_without_the_keyword_is_not_shared():
+    """A plan that never names the keyword would be about the wrong prompt, so each one plans."""
+    llm = PlanningLLM(mention_keyword=False)
+    planner = SharedPlanner(llm, PROMPTS)
+
+    plans = _plan_all(planner)
+
+    assert len(llm.prompts) == 3
+    assert planner.planner_calls == 3 and planner.shared_plans == 0
+    assert all("shared_from" not in p for p in plans)
+
+
+def test_waiting_prompts_plan_alone_when_shared_planning_fails():
+    """The first prompt's error is raised; the prompts waiting on it plan for themselves."""
+    llm = PlanningLLM(fail_first=True)
+    planner = SharedPlanner(llm, PROMPTS)
+
+    first, *others = _plan_all(planner)
+
+    assert isinstance(first, RuntimeError)
+    assert planner.planner_calls == 3 and planner.shared_plans == 0
+    assert [p["steps"][0]["description"] for p in others] == ["Research Python basics", "Research Rust basics"]
@@ -0,0 +1,106 @@
+"""
+Test evicting finished tasks from the task registry by TTL and size
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.runtime import registry as registry_module
+from src.runtime.registry import TaskRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(registry_module.time, "monotonic", clock)
+    return clock
+
+
+def test_finished_entries_expire_after_ttl(monkeypatch):
+    """A sweep drops tasks that finished more than `ttl` seconds ago and keeps the rest."""
+    clock = _clock(monkeypatch)
+    registry = TaskRegistry(ttl=60, max_entries=10)
+
+    for task_id in ("old", "recent", "running"):
+        registry.register(task_id)
+    registry.finish("old", "completed", result_status="completed")
+    clock.now += 30
+    registry.finish("recent", "failed", error="boom")
+
+    clock.now += 31
+    assert registry.sweep() == 1
+    assert "old" not in registry
+    assert registry.get("recent")["status"] == "failed" and registry.get("recent")["error"] == "boom"
+    assert registry.get("running")["status"] == "queued"
+
+    clock.now += 3600
+    assert registry.sweep() == 1
+    assert list(registry._entries) == ["running"]
+
+
+def test_running_entries_are_never_swept(monkeypatch):
+    """Unfinished tasks survive any sweep, also after being re-submitted once finished."""
+    clock = _clock(monkeypatch)
+    registry = TaskRegistry(ttl=60, max_entries=10)
+
+    registry.register("long")
+    registry.update("long", status="running")
+    registry.register("retried")
+    registry.finish("retried", "failed")
+    registry.register("retried")
+
+    clock.now += 10_000
+    assert registry.sweep() == 0
+    assert registry.get("long")["status"] == "running"
+    assert registry.get("retried")["status"] == "queued"
+    assert not registry.is_finished("retried")
+
+
+def test_oldest_finished_entries_evicted_at_max_entries(monkeypatch):
+    """Registering past max_entries drops the earliest finished tasks, never running ones."""
+    _clock(monkeypatch)
+    registry = TaskRegistry(ttl=3600, max_entries=3)
+
+    registry.register("running")
+    for task_id in ("first", "second"):
+        registry.register(task_id)
+        registry.finish(task_id, "completed")
+
+    registry.register("new")
+    assert list(registry._entries) == ["running", "second", "new"]
+
+    registry.register("newer")
+    assert list(registry._entries) == ["running", "new", "newer"]
+
+    # Only running tasks left: the registry grows past the limit rather than lose them
+    registry.register("newest")
+    assert len(registry) == 4
+    assert "running" in registry and "newest" in registry
+
+
+def test_janitor_sweeps_in_the_background():
+    """The janitor removes expired tasks without anyone calling sweep()."""
+    async def scenario():
+        registry = TaskRegistry(ttl=0, max_entries=10, sweep_interval=0.01)
+        registry.register("done")
+        registry.finish("done", "completed")
+        registry.register("running")
+
+        await registry.start()
+        await asyncio.sleep(0.05)
+        await registry.stop()
+        return registry
+
+    registry = asyncio.run(scenario())
+    assert list(registry._entries) == ["running"]
@@ -0,0 +1,35 @@
+"""
+Test the result cache byte budget
+"""
+
+import random
+import string
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.runtime.result_cache import ResultCache
+
+
+def _result(seed, size):
+    # Random text barely compresses, so the budget is actually reached
+    content = "".join(random.Random(seed).choices(string.ascii_letters + string.digits, k=size))
+    return {"status": "completed", "result": {"files": ["post.md"], "result_data": {"post.md": content}}}
+
+
+def test_evicts_least_recently_used_by_bytes():
+    """Entries are stored compressed and evicted by total size, not count."""
+    cache = ResultCache(ttl=60, max_bytes=20_000)
+    for name in ("a", "b", "c"):
+        cache.put(name, _result(ord(name), 10_000))
+
+    assert cache.stored_bytes <= 20_000
+    assert cache.get("a") is None
+    assert cache.get("c") == _result(ord("c"), 10_000)
+
+    # Too large for the whole budget: not cached, and nothing else is evicted for it
+    cache.put("huge", _result(1, 100_000))
+    assert cache.get("huge") is None
+    assert cache.get("c") is not None
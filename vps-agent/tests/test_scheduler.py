@@ -0,0 +1,124 @@
+"""
+Test the task scheduler priority ordering and slot limits
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.runtime.scheduler import TaskScheduler
+
+
+def test_priority_order_and_slot_limit():
+    """High priority work runs before bulk work, one slot at a time."""
+    started = []
+    running = 0
+    peak = 0
+
+    async def handler(payload):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        started.append(payload["task_id"])
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def scenario():
+        scheduler = TaskScheduler(handler=handler, max_concurrent=1)
+        await scheduler.submit("bulk-1", {"task_id": "bulk-1"}, priority="low")
+        await scheduler.submit("normal-1", {"task_id": "normal-1"}, priority="normal")
+        await scheduler.submit("urgent-1", {"task_id": "urgent-1"}, priority="urgent")
+
+        assert (await scheduler.get_queue_info("urgent-1"))["queue_position"] == 1
+        assert (await scheduler.get_queue_info("bulk-1"))["queue_position"] == 3
+
+        await scheduler.start()
+        while len(started) < 3:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert started == ["urgent-1", "normal-1", "bulk-1"]
+    assert peak == 1
+
+
+def test_fair_share_between_tenants():
+    """A light tenant is not starved by a heavy tenant's backlog."""
+    from src.runtime.fairshare import FairSharePolicy
+    from src.runtime.queue import MemoryTaskQueue
+
+    started = []
+
+    async def handler(payload):
+        started.append(payload["user_id"])
+        await asyncio.sleep(0.01)
+
+    async def scenario():
+        policy = FairSharePolicy(weights={"starter": 1, "pro": 2})
+        scheduler = TaskScheduler(handler=handler, max_concurrent=1, queue=MemoryTaskQueue(policy))
+        for i in range(6):
+            await scheduler.submit(f"heavy-{i}", {"user_id": "heavy", "plan": "pro"})
+        for i in range(2):
+            await scheduler.submit(f"light-{i}", {"user_id": "light", "plan": "starter"})
+
+        # Two heavy tasks per light task, so light-0 is dispatched second
+        assert (await scheduler.get_queue_info("light-0"))["queue_position"] == 2
+
+        await scheduler.start()
+        while len(started) < 8:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert started[:6].count("light") == 2
+
+
+def test_redis_dead_letters_task_after_max_attempts(monkeypatch):
+    """A task whose node keeps dying is handed back once, then dead-lettered and can be resubmitted."""
+    import fakeredis
+    import redis.asyncio
+    from src.runtime.queue import RedisTaskQueue
+
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url, **kwargs: fakeredis.FakeAsyncRedis(**kwargs))
+
+    async def scenario():
+        # This node never heartbeats, so its claims look like a crashed node's
+        queue = RedisTaskQueue("redis://fake", max_attempts=1, poll_interval=0.01)
+        await queue.push("t2", {"task_id": "t2", "user_id": "u1"})
+
+        assert (await queue.pop(timeout=0.1))["task_id"] == "t2"
+        assert await queue.requeue_dead() == []
+        assert (await queue.pop(timeout=0.1))["attempts"] == 1
+
+        dead = await queue.requeue_dead()
+        assert dead == [{"task_id": "t2", "payload": {"task_id": "t2", "user_id": "u1"}}]
+        assert not await queue.contains("t2")
+        assert await queue.pop(timeout=0.05) is None
+
+        await queue.push("t2", {"task_id": "t2", "user_id": "u1"})
+        assert (await queue.get_entry("t2"))["queue_position"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_removed_then_pushed_task_keeps_new_priority():
+    """A task removed and queued again runs at its new priority, not from its old heap item."""
+    from src.runtime.queue import MemoryTaskQueue
+
+    async def scenario():
+        queue = MemoryTaskQueue()
+        await queue.push("a", {"user_id": "u1"}, priority="urgent")
+        await queue.push("b", {"user_id": "u1"}, priority="normal")
+        await queue.remove("a")
+        await queue.push("a", {"user_id": "u1"}, priority="low")
+
+        order = [(await queue.pop(timeout=0))["task_id"] for _ in range(2)]
+        assert order == ["b", "a"]
+        assert await queue.pop(timeout=0) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,215 @@
+"""
+Test the task endpoints of the API server (without workers, Docker or an LLM)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Keep the outbox and checkpoints out of the repository
+_state_dir = tempfile.mkdtemp(prefix="agent_server_test_")
+os.environ.setdefault("WEBHOOK_OUTBOX_PATH", os.path.join(_state_dir, "webhook_outbox.db"))
+os.environ.setdefault("CHECKPOINT_PATH", os.path.join(_state_dir, "checkpoints.db"))
+
+from src.api import server
+
+AUTH = f"Bearer {server.CONFIG['WRITGO_WEBHOOK_SECRET']}"
+
+
+def _task(task_id, **fields):
+    fields = {"title": "Blog", "prompt": "Write a post about tomatoes", "user_id": "u1", "cache": True, **fields}
+    return server.TaskRequest(task_id=task_id, **fields)
+
+
+def test_cancel_queued_cache_leader_promotes_follower():
+    """Cancelling a queued leader makes its first duplicate the in-flight run."""
+    server.health_prober.state["sandbox_ready"] = True
+
+    async def scenario():
+        await server.execute_task(_task("leader"), authorization=AUTH)
+        attached = await server.execute_task(_task("follower"), authorization=AUTH)
+        assert "attached to in-flight task leader" in attached["message"]
+
+        cancelled = await server.cancel_task("leader", authorization=AUTH)
+        assert cancelled["status"] == "cancelled"
+
+        key = server._cache_key(_task("leader"))
+        assert server.result_cache.leader(key) == "follower"
+        assert server.task_registry.get("follower")["attached_to"] is None
+        assert await server.scheduler.queue.contains("follower")
+
+        late = await server.execute_task(_task("late"), authorization=AUTH)
+        assert "attached to in-flight task follower" in late["message"]
+
+    asyncio.run(scenario())
+
+
+def test_event_stream_requires_auth():
+    """Task events are only streamed to callers with the webhook secret."""
+    from fastapi.testclient import TestClient
+
+    server.task_registry.register("private")
+    client = TestClient(server.app)
+
+    assert client.get("/tasks/private/events").status_code == 401
+    assert client.get("/tasks/private/events", headers={"Authorization": "Bearer guess"}).status_code == 401
+    assert client.get("/tasks/unknown/events", headers={"Authorization": AUTH}).status_code == 404
+
+
+def test_batch_without_accepted_tasks_is_finished():
+    """A batch whose tasks are all already scheduled elsewhere does not stay running."""
+    server.health_prober.state["sandbox_ready"] = True
+
+    async def scenario():
+        # Queued by another node on a shared queue, unknown to this node's registry
+        for task_id in ("b1", "b2"):
+            await server.scheduler.queue.push(task_id, {"task_id": task_id, "user_id": "u2"})
+
+        batch = server.BatchRequest(batch_id="batch-x", tasks=[
+            server.TaskRequest(task_id=task_id, title="Post", prompt=f"Write post {task_id}", user_id="u2")
+            for task_id in ("b1", "b2")
+        ])
+        return await server.execute_batch(batch, authorization=AUTH)
+
+    response = asyncio.run(scenario())
+
+    assert response["status"] == "rejected" and response["accepted"] == []
+    assert server.batch_registry.get("batch-x")["status"] == "rejected"
+    assert "batch-x" not in server.batch_planners
+
+
+def test_stalled_run_is_reported_failed(tmp_path, monkeypatch):
+    """A run stopped by the stall detector fails; its duplicate gets a run of its own."""
+    from tests.fakes import FakeSandbox, LoopingLLM
+
+    server.health_prober.state["sandbox_ready"] = True
+    monkeypatch.setattr(server, "llm_provider", LoopingLLM())
+    monkeypatch.setattr(server, "DockerSandbox", lambda image, timeout, workspace_dir: FakeSandbox(workspace_dir))
+    monkeypatch.setitem(server.CONFIG, "WORKSPACE_ROOT", str(tmp_path))
+    monkeypatch.setitem(server.CONFIG, "TRACE_DIR", "")
+
+    async def scenario():
+        task = _task("stuck", prompt="Compute the first 10 Fibonacci numbers")
+        await server.execute_task(task, authorization=AUTH)
+        await server.execute_task(_task("stuck-copy", prompt=task.prompt), authorization=AUTH)
+        await server.scheduler.queue.remove("stuck")
+
+        await server.run_agent_task(task)
+        return server._cache_key(task)
+
+    key = asyncio.run(scenario())
+
+    entry = server.task_registry.get("stuck")
+    assert entry["status"] == "failed" and entry["result_status"] == "stalled"
+    assert "re-plan" in entry["error"]
+
+    webhook = [d for d in server.webhooks.outbox.due(100) if d["task_id"] == "stuck"][-1]
+    assert webhook["payload"]["status"] == "failed"
+    assert webhook["payload"]["error_message"] == entry["error"]
+
+    assert server.result_cache.leader(key) == "stuck-copy"
+    assert server.result_cache.get(key) is None
+
+
+def test_health_serves_the_cached_probe(monkeypatch):
+    """/health reports the last background probe and never calls Docker itself."""
+    from fastapi.testclient import TestClient
+
+    def no_docker():
+        raise AssertionError("/health must not probe Docker")
+
+    monkeypatch.setattr(server.health_prober, "_probe_docker", no_docker)
+    client = TestClient(server.app)
+
+    for sandbox_ready in (False, True):
+        monkeypatch.setitem(server.health_prober.state, "sandbox_ready", sandbox_ready)
+        response = client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["sandbox_ready"] is sandbox_ready
+
+
+def test_ready_reports_503_without_capacity(monkeypatch):
+    """/ready fails while the sandbox is down or the backlog has reached MAX_QUEUED_TASKS."""
+    from fastapi.testclient import TestClient
+
+    client = TestClient(server.app)
+    monkeypatch.setitem(server.health_prober.state, "sandbox_ready", True)
+    queued = asyncio.run(server.scheduler.stats())["queued"]
+    monkeypatch.setattr(server.admission, "max_queue_depth", queued + 1)
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True and response.json()["queue_full"] is False
+
+    monkeypatch.setitem(server.health_prober.state, "sandbox_ready", False)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False and response.json()["sandbox_ready"] is False
+
+    monkeypatch.setitem(server.health_prober.state, "sandbox_ready", True)
+    asyncio.run(server.scheduler.queue.push("ready-filler", {"task_id": "ready-filler", "user_id": "u3"}))
+    try:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["queue_full"] is True and response.json()["queued"] == queued + 1
+    finally:
+        asyncio.run(server.scheduler.queue.remove("ready-filler"))
+
+
+def _scrape(client):
+    from prometheus_client.parser import text_string_to_metric_families
+
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+def test_metrics_render_task_llm_and_queue_metrics(tmp_path, monkeypatch):
+    """A finished run shows up in the task histograms and counters; gauges follow the live state."""
+    from fastapi.testclient import TestClient
+    from src.core.llm import _record_llm_metrics
+    from tests.fakes import FakeSandbox, ScriptedLLM
+
+    server.health_prober.state["sandbox_ready"] = True
+    monkeypatch.setattr(server, "llm_provider", ScriptedLLM())
+    monkeypatch.setattr(server, "DockerSandbox", lambda image, timeout, workspace_dir: FakeSandbox(workspace_dir))
+    monkeypatch.setitem(server.CONFIG, "WORKSPACE_ROOT", str(tmp_path))
+    monkeypatch.setitem(server.CONFIG, "TRACE_DIR", "")
+    client = TestClient(server.app)
+    before = _scrape(client)
+
+    async def scenario():
+        task = _task("measured", prompt="Save the first 10 Fibonacci numbers", cache=False)
+        await server.execute_task(task, authorization=AUTH)
+        await server.scheduler.queue.remove("measured")
+        await server.run_agent_task(task)
+
+    asyncio.run(scenario())
+    _record_llm_metrics("anthropic", "claude-test", 0.0, "ok", {"input": 120, "output": 30})
+    after = _scrape(client)
+
+    def delta(name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return after.get(key, 0) - before.get(key, 0)
+
+    assert server.task_registry.get("measured")["status"] == "completed"
+    assert delta("agent_task_duration_seconds_count", outcome="completed") == 1
+    assert delta("agent_task_duration_seconds_bucket", outcome="completed", le="+Inf") == 1
+    assert delta("agent_task_iterations_sum", outcome="completed") == 4
+    assert delta("agent_error_diagnoses_total", source="rule") == 1
+    assert delta("agent_llm_request_seconds_count", provider="anthropic", model="claude-test", outcome="ok") == 1
+    assert delta("agent_llm_tokens_total", provider="anthropic", model="claude-test", kind="input") == 120
+
+    stats = asyncio.run(server.scheduler.stats())
+    assert after[("agent_queue_depth", ())] == stats["queued"]
+    assert after[("agent_tasks_running", ())] == 0
+    assert after[("agent_webhook_outbox_pending", ())] == server.webhooks.outbox.pending_count()
@@ -0,0 +1,75 @@
+"""
+Test stall detection and the agent's bounded re-plan
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.stall import StallDetector
+from tests.fakes import LoopingLLM, fake_agent
+
+SEARCH = {"type": "web_search", "query": "tomaten kweken"}
+
+
+def _error(signature):
+    return {"signature": signature, "kind": "NameError", "message": "name 'fib' is not defined"}
+
+
+def test_repeated_turn_and_cycles():
+    """The same call with the same result stalls on the third time, also with other turns in between."""
+    detector = StallDetector(window=12, max_repeats=3)
+    other = {"type": "read_file", "filename": "notes.md"}
+
+    assert detector.observe([SEARCH], ["10 results (request 1f3a9c77e2)"], [None]) is None
+    assert detector.observe([other], ["notes"], [None]) is None
+    assert detector.observe([SEARCH], ["10 results (request 8b0d41aa93)"], [None]) is None
+    assert detector.observe([other], ["notes"], [None]) is None
+
+    stall = detector.observe([{**SEARCH, "query": "Tomaten  kweken"}], ["10 results (request 44c2e0b1f5)"], [None])
+    assert stall["reason"] == "repeated_turn" and stall["repeats"] == 3
+
+
+def test_repeated_error_with_changing_code():
+    """The same error signature counts across different code."""
+    detector = StallDetector(window=12, max_repeats=3)
+
+    for attempt in range(2):
+        action = {"type": "execute_python", "code": f"print(fib({attempt}))"}
+        assert detector.observe([action], ["NameError"], [_error("execute_python:NameError:x")]) is None
+
+    stall = detector.observe(
+        [{"type": "execute_python", "code": "x = fib(2)"}], ["NameError"], [_error("execute_python:NameError:x")]
+    )
+    assert stall["reason"] == "repeated_error"
+    assert "NameError" in stall["description"]
+
+
+def test_window_and_reset_forget_old_turns():
+    detector = StallDetector(window=3, max_repeats=2)
+
+    assert detector.observe([SEARCH], ["same"], [None]) is None
+    for page in range(3):
+        detector.observe([{"type": "read_file", "filename": f"{page}.md"}], ["x"], [None])
+    assert detector.observe([SEARCH], ["same"], [None]) is None
+
+    detector.reset()
+    assert detector.observe([SEARCH], ["same"], [None]) is None
+    assert detector.observe([SEARCH], ["same"], [None])["reason"] == "repeated_turn"
+
+
+def test_agent_replans_once_then_stops(tmp_path):
+    """A stuck loop is re-planned once; when it stalls again the run ends as stalled."""
+    llm = LoopingLLM()
+    agent = fake_agent(tmp_path, llm, max_iterations=20, stall_repeats=3, max_replans=1)
+
+    result = asyncio.run(agent.run("Compute the first 10 Fibonacci numbers"))
+
+    assert result["status"] == "stalled"
+    assert result["iterations"] == 6
+    assert llm.plans == 2
+    assert result["plan"]["steps"][-1]["description"].endswith("for plan 2")
+    assert [e["type"] for e in agent.events.events].count("replan") == 1
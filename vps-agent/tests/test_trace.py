@@ -0,0 +1,76 @@
+"""
+Test recording an agent run and replaying it offline
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.agent import AgentLoop
+from src.core.llm import ModelRouter
+from src.core.trace import COMPONENTS, TraceRecorder, TraceReplayer
+from src.core.errors import ErrorClassifier
+from src.core.memo import ActionMemo
+from src.core.planner import Planner
+from src.memory.event_stream import EventStream
+from src.memory.file_storage import FileStorage
+from tests.fakes import FakeSandbox, ScriptedLLM
+
+
+def _record(tmp_path):
+    workspace = tmp_path / "workspace"
+    llm = ScriptedLLM()
+    components = {
+        "llm_provider": llm,
+        "planner": Planner(llm),
+        "sandbox": FakeSandbox(str(workspace)),
+        "file_storage": FileStorage(str(workspace)),
+        "action_memo": ActionMemo(),
+        "error_classifier": ErrorClassifier(),
+    }
+    recorder = TraceRecorder("Save the first 10 Fibonacci numbers", {"user_id": "u1"}, config={"max_iterations": 10})
+    agent = AgentLoop(
+        model_router=ModelRouter({}),
+        event_stream=EventStream(),
+        **{argument: recorder.wrap(kind, components[argument]) for kind, argument in COMPONENTS.items()},
+        max_iterations=10
+    )
+
+    result = asyncio.run(agent.run(recorder.header["task"], recorder.header["context"]))
+    path = str(tmp_path / "trace.jsonl.gz")
+    recorder.save(path)
+    return result, path, components["sandbox"]
+
+
+def test_replay_matches_recorded_run(tmp_path):
+    """A replay needs no LLM or sandbox and reproduces the recorded run exactly."""
+    recorded, path, sandbox = _record(tmp_path)
+    assert recorded["status"] == "completed"
+    assert sandbox.calls == 2
+
+    replayer = TraceReplayer.load(path)
+    replayed = asyncio.run(replayer.run())
+
+    assert sandbox.calls == 2
+    assert replayed["status"] == recorded["status"]
+    assert replayed["iterations"] == recorded["iterations"]
+    assert replayed["usage"] == recorded["usage"]
+    assert replayed["result"]["files"] == ["fibonacci.txt", "todo.md"]
+    assert [e["content"] for e in replayed["events"]] == [e["content"] for e in recorded["events"]]
+    # Background todo.md writes are coalesced by timing; everything else must match
+    assert set(replayer.divergent_calls) <= {"storage.save_file"}
+    assert set(replayer.unused_calls()) <= {"storage.save_file"}
+
+
+def test_replay_reports_divergence(tmp_path):
+    """A change that alters the prompts still replays, but is counted."""
+    recorded, path, _ = _record(tmp_path)
+
+    replayer = TraceReplayer.load(path)
+    replayed = asyncio.run(replayer.run(context_budgets={"default": 60}))
+
+    assert replayed["status"] == recorded["status"]
+    assert "llm.complete" in replayer.divergent_calls
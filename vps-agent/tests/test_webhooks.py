@@ -0,0 +1,115 @@
+"""
+Test webhook delivery through the outbox: coalescing, ordering, retries, chunks and dead letters
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.runtime.result_delivery import build_result_deliveries
+from src.runtime.webhooks import WebhookDispatcher, WebhookOutbox
+
+
+def _dispatch(tmp_path, respond, deliveries, **options):
+    """Run a dispatcher against `respond(request) -> status` until its outbox is empty."""
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(respond(request))
+
+    async def scenario():
+        dispatcher = WebhookDispatcher(
+            "https://writgo.test/api/agent/webhook", "secret", str(tmp_path / "outbox.db"),
+            base_delay=0.01, **options
+        )
+        await dispatcher.start()
+        await dispatcher.client.aclose()
+        dispatcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        for task_id, delivery in deliveries:
+            await dispatcher.enqueue(task_id, **delivery)
+
+        for _ in range(500):
+            if not await asyncio.to_thread(dispatcher.outbox.pending_count) and not dispatcher._in_flight:
+                break
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    return sent
+
+
+def test_manifest_given_up_when_a_chunk_died(tmp_path):
+    """A chunk rejected for good makes its manifest dead and reports the task failed."""
+    payload = {"task_id": "t1", "status": "completed", "result_data": {"result_data": {"post.md": "x" * 5000}}}
+    deliveries = build_result_deliveries("t1", payload, inline_limit=100, chunk_size=1024)
+
+    sent = _dispatch(
+        tmp_path,
+        lambda request: 400 if request.url.path.endswith("/upload") else 200,
+        [("t1", delivery) for delivery in deliveries]
+    )
+
+    assert [request.url.path for request in sent] == ["/api/agent/webhook/upload", "/api/agent/webhook"]
+    assert json.loads(sent[-1].content)["status"] == "failed"
+
+
+def test_status_updates_are_coalesced(tmp_path):
+    """A task's undelivered status update is replaced by any newer delivery of that task."""
+    outbox = WebhookOutbox(str(tmp_path / "outbox.db"))
+    outbox.add("t1", "status", {"status": "queued"}, set())
+    outbox.add("t1", "status", {"status": "running"}, set())
+    outbox.add("t2", "status", {"status": "running"}, set())
+    assert [(d["task_id"], d["payload"]["status"]) for d in outbox.due(10)] == [("t1", "running"), ("t2", "running")]
+
+    outbox.add("t1", "result", {"status": "completed"}, set())
+    assert [(d["task_id"], d["kind"]) for d in outbox.due(10)] == [("t2", "status"), ("t1", "result")]
+
+    # A status update being sent right now is not deleted under the dispatcher
+    in_flight = outbox.due(1)[0]["id"]
+    outbox.add("t2", "status", {"status": "completed"}, {in_flight})
+    assert [d["payload"]["status"] for d in outbox.due(10) if d["task_id"] == "t2"] == ["running", "completed"]
+    outbox.close()
+
+
+def test_retries_with_backoff_then_dead_letters(tmp_path):
+    """Server errors are retried until max_attempts; other client errors are given up at once."""
+    sent = _dispatch(
+        tmp_path,
+        lambda request: 503 if json.loads(request.content)["task_id"] == "t1" else 400,
+        [("t1", {"kind": "result", "payload": {"task_id": "t1"}}),
+         ("t2", {"kind": "error", "payload": {"task_id": "t2"}})],
+        max_attempts=3
+    )
+
+    attempts = [json.loads(request.content)["task_id"] for request in sent]
+    assert attempts.count("t1") == 3
+    assert attempts.count("t2") == 1
+
+
+def test_delivery_order_per_task(tmp_path):
+    """A task's later delivery waits until its earlier one has gone out, even through retries."""
+    failures = {"result": 2}
+
+    def respond(request):
+        kind = json.loads(request.content)["kind"]
+        if failures.get(kind):
+            failures[kind] -= 1
+            return 429
+        return 200
+
+    sent = _dispatch(
+        tmp_path,
+        respond,
+        [("t1", {"kind": "result", "payload": {"task_id": "t1", "kind": "result"}}),
+         ("t1", {"kind": "cancelled", "payload": {"task_id": "t1", "kind": "cancelled"}})]
+    )
+
+    assert [json.loads(request.content)["kind"] for request in sent] == ["result"] * 3 + ["cancelled"]